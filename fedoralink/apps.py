@@ -5,6 +5,7 @@ from django.utils.translation import ugettext_lazy as _
 
 def do_index(sender, **kwargs):
 
+    from fedoralink.fedorans import FEDORA
     from fedoralink.indexer.models import IndexableFedoraObject
     from django.db import connections
     from django.conf import settings
@@ -15,6 +16,13 @@ def do_index(sender, **kwargs):
     # print("do_index called", db, instance, settings.DATABASES[db].get('USE_INTERNAL_INDEXER', False))
 
     if settings.DATABASES[db].get('USE_INTERNAL_INDEXER', False) and isinstance(instance, IndexableFedoraObject):
+        queue = connections[db].indexing_queue
+        if queue is not None:
+            queue.enqueue(instance.id)
+            return
+        if not instance.metadata[FEDORA.lastModified]:
+            # the server did not return Last-Modified, server managed values are known only after a fetch
+            instance = type(instance).objects.fetch_child_metadata(False).get(pk=instance.id)
         indexer = connections[db].indexer
         indexer.reindex(instance)
 
@@ -31,10 +39,30 @@ def delete_from_index(sender, **kwargs):
     # print("do_index called", db, instance, settings.DATABASES[db].get('USE_INTERNAL_INDEXER', False))
 
     if settings.DATABASES[db].get('USE_INTERNAL_INDEXER', False) and isinstance(instance, IndexableFedoraObject):
+        queue = connections[db].indexing_queue
+        if queue is not None:
+            from fedoralink.indexer.indexing_queue import OPERATION_DELETE
+            queue.enqueue(instance.id, OPERATION_DELETE)
+            return
         indexer = connections[db].indexer
         indexer.delete(instance)
 
 
+def invalidate_metadata_cache(sender, **kwargs):
+
+    from fedoralink.models import FedoraObject
+    from django.db import connections
+    from django.db.models.signals import post_delete
+
+    instance = kwargs['instance']
+    if not isinstance(instance, FedoraObject) or not instance.id:
+        return
+
+    metadata_cache = connections[kwargs['using']].metadata_cache
+    if metadata_cache is not None:
+        metadata_cache.invalidate(instance.id, subtree=kwargs.get('signal') is post_delete)
+
+
 def upload_binary_files(sender, **kwargs):
 
     from fedoralink.models import UploadedFileStream
@@ -87,3 +115,5 @@ class ApplicationConfig(AppConfig):
         post_save.connect(do_index, dispatch_uid='indexer', weak=False)
         post_save.connect(upload_binary_files, dispatch_uid='upload_binary_files', weak=False)
         post_delete.connect(delete_from_index, dispatch_uid='indexer_delete', weak=False)
+        post_save.connect(invalidate_metadata_cache, dispatch_uid='metadata_cache', weak=False)
+        post_delete.connect(invalidate_metadata_cache, dispatch_uid='metadata_cache_delete', weak=False)
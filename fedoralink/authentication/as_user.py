@@ -1,7 +1,8 @@
 import threading
 
 from fedoralink.authentication.Credentials import Credentials
-from fedoralink.middleware import FedoraUserDelegationMiddleware
+from fedoralink.identity_map import identity_map_local
+from fedoralink.middleware import FedoraUserDelegationMiddleware, FedoraProfillingMiddleware
 
 fedora_auth_local = threading.local()
 
@@ -61,3 +62,50 @@ class as_admin:
         if self.original_username:
             FedoraUserDelegationMiddleware.thread_local_storage.fedora_on_behalf_of = self.original_username
             FedoraUserDelegationMiddleware.thread_local_storage.fedora_on_behalf_of_groups = self.original_groups
+
+
+class as_thread_of:
+    """
+    Captures credentials, user delegation, profiling state and identity map of the creating thread. Entering
+    the instance in another (worker) thread makes the requests issued there run on behalf of the same user:
+
+        context = as_thread_of()
+
+        def worker():
+            with context:
+                ...
+
+        executor.submit(worker)
+    """
+
+    _captured = (
+        (fedora_auth_local, ('Credentials',)),
+        (FedoraUserDelegationMiddleware.thread_local_storage, ('fedora_on_behalf_of', 'fedora_on_behalf_of_groups')),
+        (FedoraProfillingMiddleware.thread_local_storage, ('requests', 'profiling_enabled')),
+        (identity_map_local, ('identity_map',)),
+    )
+
+    def __init__(self):
+        self.values = [
+            {name: getattr(storage, name) for name in names if hasattr(storage, name)}
+            for storage, names in as_thread_of._captured
+        ]
+        self.original_values = None
+
+    def __enter__(self):
+        self.original_values = []
+        for (storage, names), values in zip(as_thread_of._captured, self.values):
+            self.original_values.append({name: getattr(storage, name) for name in names if hasattr(storage, name)})
+            self._set(storage, names, values)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for (storage, names), values in zip(as_thread_of._captured, self.original_values):
+            self._set(storage, names, values)
+
+    @staticmethod
+    def _set(storage, names, values):
+        for name in names:
+            if name in values:
+                setattr(storage, name, values[name])
+            elif hasattr(storage, name):
+                delattr(storage, name)
@@ -1,50 +1,237 @@
+import atexit
+import functools
+import heapq
 import logging
-import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import closing
+from email.utils import parsedate_to_datetime
 from urllib.error import HTTPError
 from urllib.parse import urljoin, quote
 
 import io
 import os.path
 import rdflib
+from rdflib import XSD
 # import requests
 from .engine import delegated_requests as requests
 from requests.auth import HTTPBasicAuth
 
 from fedoralink.query import DoesNotExist
 from .fedorans import FEDORA
+from .identity_map import get_identity_map
+from .middleware import FedoraUserDelegationMiddleware
 from .rdfmetadata import RDFMetadata
-from .authentication.as_user import fedora_auth_local
+from .utils import UploadBody
+from .authentication.as_user import fedora_auth_local, as_thread_of, as_user, as_delegated_user, as_admin
 
 log = logging.getLogger('fedoralink.connection')
 
 # TODO: transactions
 
+# format name -> (mimetype requested from fedora, rdflib parser format)
+RDF_FORMATS = {
+    'xml':      ('application/rdf+xml; encoding=utf-8', 'xml'),
+    'turtle':   ('text/turtle; encoding=utf-8',         'turtle'),
+    'nt':       ('application/n-triples',               'nt'),
+}
+
+PARSER_BUFFER_SIZE = 64 * 1024
+
+# versioning policies, see FedoraConnection.__init__
+VERSIONING_ALWAYS    = 'always'
+VERSIONING_NEVER     = 'never'
+VERSIONING_ON_COMMIT = 'commit'
+VERSIONING_COALESCE  = 'coalesce'
+
+
 
 class RepositoryException(HTTPError):
     pass
 
 
+class StaleObjectException(Exception):
+    """
+    Raised when metadata are written with an ETag that does not match the resource on the server, i.e. the resource
+    has been modified since its metadata were fetched. Nothing has been written; apply the changes to
+    current_metadata and save again.
+    """
+
+    def __init__(self, object_id, current_metadata):
+        """
+        :param object_id:           id of the resource
+        :param current_metadata:    RDFMetadata of the resource as they are on the server now
+        """
+        super().__init__('Resource %s has been modified on the server since its metadata were fetched' % object_id)
+        self.object_id        = object_id
+        self.current_metadata = current_metadata
+
+
+class BulkWriteException(Exception):
+    """
+    Raised when some of the items in create_objects/update_objects could not be written
+    """
+
+    def __init__(self, results, errors):
+        """
+        :param results:     list of RDFMetadata in the order of the written items, None where the write failed
+        :param errors:      list of tuples (index of the item, exception)
+        """
+        super().__init__('Error writing %s of %s items: %s' % (len(errors), len(results),
+                                                              '; '.join('%s: %s' % e for e in errors)))
+        self.results = results
+        self.errors  = errors
+
+
+class CoalescedVersions:
+    """
+    Objects written with VERSIONING_COALESCE policy that are waiting for their version. The version is made
+    when the versioning window that started with the first unversioned write of the object ends, so that it
+    captures the state after all writes made within the window. Versions are made by a background thread
+    on behalf of the user that wrote the object; versions still pending when the process exits are made at exit.
+    """
+
+    def __init__(self):
+        # object id -> (connection, credentials, (delegated user, groups) or None) of the write
+        self._pending = {}
+        # heap of (deadline, object id)
+        self._deadlines = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, connection, object_id, window):
+        """
+        Makes a version of the object window seconds from now unless it is already scheduled
+
+        :param connection:  connection used to make the version
+        :param object_id:   id of the written object, without transaction
+        :param window:      versioning window in seconds
+        """
+        # only the user is taken from the writing thread, its request (identity map, profiling) will be gone
+        # by the time the version is made
+        credentials = getattr(fedora_auth_local, 'Credentials', None)
+        delegation = None
+        if FedoraUserDelegationMiddleware.is_enabled():
+            delegation = (list(FedoraUserDelegationMiddleware.get_on_behalf_of()),
+                          list(FedoraUserDelegationMiddleware.get_on_behalf_of_groups()))
+
+        with self._condition:
+            if object_id in self._pending:
+                return
+            self._pending[object_id] = (connection, credentials, delegation)
+            heapq.heappush(self._deadlines, (time.time() + window, object_id))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fedoralink-coalesced-versions',
+                                                daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def flush(self):
+        """
+        Makes all pending versions now. The background thread is stopped (after it has made the versions it is
+        just making, so that they are not lost when the interpreter exits) and started again by the next schedule.
+        """
+        with self._condition:
+            thread, self._thread = self._thread, None
+            pending = list(self._pending.items())
+            self._pending.clear()
+            self._deadlines = []
+            self._condition.notify()
+        if thread is not None:
+            thread.join()
+        self._make_versions(pending)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if self._thread is not threading.current_thread():
+                    return
+                now = time.time()
+                due = []
+                while self._deadlines and self._deadlines[0][0] <= now:
+                    object_id = heapq.heappop(self._deadlines)[1]
+                    if object_id in self._pending:
+                        due.append((object_id, self._pending.pop(object_id)))
+                if not due:
+                    self._condition.wait(self._deadlines[0][0] - now if self._deadlines else None)
+                    continue
+            self._make_versions(due)
+
+    @staticmethod
+    def _make_versions(pending):
+        version = time.time()
+        for object_id, (connection, credentials, delegation) in pending:
+            try:
+                with as_user(credentials), (as_delegated_user(*delegation) if delegation else as_admin()):
+                    connection.make_version(object_id, version)
+            except Exception:
+                log.exception('Could not make version of %s', object_id)
+
+
+coalesced_versions = CoalescedVersions()
+atexit.register(coalesced_versions.flush)
+
+
 class FedoraConnection:
     """
     A connection to fedora server
     """
 
-    def __init__(self, fedora_url, username=None, password=None):
+    def __init__(self, fedora_url, username=None, password=None, pool_size=None, timeout=None,
+                 refetch_after_write=False, versioning=VERSIONING_ALWAYS, versioning_window=300,
+                 write_parallelism=1, rdf_format='xml', metadata_cache=None):
         """
         creates a new connection
 
         :param fedora_url: url of fedora REST api
+        :param pool_size:  max number of keep-alive http connections to fedora per thread
+        :param timeout:    timeout of http requests to fedora, seconds or a (connect, read) tuple
+        :param refetch_after_write: if True, metadata are fetched from the server after each create/update.
+                           Otherwise they are built from the sent data and the ETag and Last-Modified headers of
+                           the response. If the server rejects a write because of a stale ETag,
+                           StaleObjectException with the current metadata is raised
+        :param versioning: when to make a version snapshot of created/updated objects:
+                                VERSIONING_ALWAYS       after every write
+                                VERSIONING_NEVER        never
+                                VERSIONING_ON_COMMIT    once per object when the transaction is committed or,
+                                                        outside transactions, at the end of FedoraManager.save
+                                VERSIONING_COALESCE     once per versioning_window seconds for each object, at the
+                                                        end of the window that started with the first write
+        :param versioning_window: number of seconds for VERSIONING_COALESCE
+        :param write_parallelism: max number of objects written concurrently by create_objects/update_objects
+        :param rdf_format: serialization requested from fedora in get_object, one of RDF_FORMATS keys. 'nt' is
+                           the fastest one to parse
+        :param metadata_cache: fedoralink.metadata_cache.MetadataCache shared by all connections. If set, get_object
+                           revalidates cached metadata with the server instead of transferring and parsing them again.
+                           Only metadata fetched without child metadata are cached
         """
+        if versioning not in (VERSIONING_ALWAYS, VERSIONING_NEVER, VERSIONING_ON_COMMIT, VERSIONING_COALESCE):
+            raise ValueError('Unknown versioning policy %s' % versioning)
+        if rdf_format not in RDF_FORMATS:
+            raise ValueError('Unknown rdf format %s' % rdf_format)
+
         self._fedora_url      = fedora_url
         if not self._fedora_url.endswith('/'):
             self._fedora_url += '/'
 
+        requests.configure(self._fedora_url, pool_size=pool_size, timeout=timeout)
+
         self._in_transaction  = False
         self._transaction_url = ''
         self._username = username
         self._password = password
+        self._refetch_after_write = refetch_after_write
+        self._versioning = versioning
+        self._versioning_window = versioning_window
+        # object ids waiting for a version with VERSIONING_ON_COMMIT policy, in order of writes
+        self._pending_versions = OrderedDict()
+        self._pending_versions_lock = threading.Lock()
+        self._write_parallelism = write_parallelism
+        self._executor = None
+        self._rdf_format = rdf_format
+        self._metadata_cache = metadata_cache
 
     def create_objects(self, data):
         """
@@ -58,32 +245,39 @@ class FedoraConnection:
         :return: list of modified metadata received from server.
                  Each is of type RDFMetadata and has 'id' property filled
         """
-        metadata_from_server = []
-        for item in data:
-            metadata = item['metadata']
-            parent_url = metadata[FEDORA.hasParent]
-            if not parent_url:
-                parent_url = ''
-            else:
-                parent_url = str(parent_url[0])
-                del metadata[FEDORA.hasParent]
-            parent_url = self._get_request_url(parent_url)
-
-            if item['bitstream'] is not None:
-                created_object_meta = self._create_object_from_bitstream(parent_url, item['bitstream'], item['slug'])
-                self._update_single_resource(created_object_meta.id, metadata)
-            else:
-                created_object_meta = self._create_object_from_metadata(parent_url, metadata, item['slug'])
-
-            metadata_from_server.append(created_object_meta)
+        # parents get a new child, so they must not be taken from the identity map any more
+        parents = [str(item['metadata'][FEDORA.hasParent][0]) if item['metadata'][FEDORA.hasParent] else ''
+                   for item in data]
+        try:
+            return self._write_all(self._create_single_object, data)
+        finally:
+            self.invalidate_cached(parents)
 
-        return metadata_from_server
+    def _create_single_object(self, item):
+        metadata = item['metadata']
+        parent = metadata[FEDORA.hasParent]
+        if not parent:
+            parent_url = ''
+        else:
+            parent = parent[0]
+            parent_url = str(parent)
+            del metadata[FEDORA.hasParent]
+        parent_url = self._get_request_url(parent_url)
+
+        if item['bitstream'] is not None:
+            bitstream_meta = self._create_object_from_bitstream(parent_url, item['bitstream'], item['slug'],
+                                                                parent)
+            metadata.set_id(bitstream_meta.id)
+            return self._update_single_resource(
+                self._get_request_url(bitstream_meta.id), metadata,
+                server_managed={p: bitstream_meta[p] for p in (FEDORA.hasParent, FEDORA.created)})
+        else:
+            return self._create_object_from_metadata(parent_url, metadata, item['slug'], parent)
 
-    def _create_object_from_bitstream(self, parent_url, bitstream, slug):
+    def _create_object_from_bitstream(self, parent_url, bitstream, slug, parent=None):
         log.info('Creating child from bitstream in %s', parent_url)
         try:
-            # TODO: this is because of Content-Length header, need to handle it more intelligently
-            data = bitstream.stream.read()
+            data = UploadBody(bitstream).body
             headers = {'Content-Type' : bitstream.mimetype}
             if bitstream.filename:
                 filename_header = 'filename="%s"' % quote(os.path.basename(bitstream.filename).encode('utf-8'))
@@ -95,11 +289,9 @@ class FedoraConnection:
 
             # do not make a version as this will be done after metadata are uploaded ...
 
-            # need to get the metadata from the server as otherwise we would not be able to update the resource
-            # later (Fedora mandates that last modification time in sent data is the same as last modification
-            # time in the metadata on server)
-            created_object_meta = list(self.get_object(created_object_id))[0]
-            return created_object_meta
+            # ETag of the binary is not the ETag of its metadata, so do not use it
+            return self._get_written_metadata(created_object_id, RDFMetadata(created_object_id), None,
+                                               self._get_server_managed(resp, parent, created=True))
 
         except HTTPError as e:
             log.error("%s : %s", e.msg, e.fp.read())
@@ -107,9 +299,8 @@ class FedoraConnection:
 
     def _update_object_bitstream(self, url, bitstream):
         try:
-            # TODO: this is because of Content-Length header, need to handle it more intelligently
-            data = bitstream.stream.read()
-            headers = {'Content-Type': bitstream.mimetype}
+            data = UploadBody(bitstream).body
+            headers = {'Content-Type' : bitstream.mimetype}
             if bitstream.filename:
                 filename_header = 'filename="%s"' % quote(os.path.basename(bitstream.filename).encode('utf-8'))
                 headers['Content-Disposition'] = 'attachment; ' + filename_header
@@ -119,7 +310,7 @@ class FedoraConnection:
             log.error("%s : %s", e.msg, e.fp.read())
             raise
 
-    def _create_object_from_metadata(self, parent_url, metadata, slug):
+    def _create_object_from_metadata(self, parent_url, metadata, slug, parent=None):
         payload = str(metadata)
         log.info('Creating child in %s', parent_url)
         log.debug("    payload %s", payload)
@@ -134,13 +325,11 @@ class FedoraConnection:
             created_object_id = resp.text
 
             # make a version
-            self.make_version(created_object_id, time.time())
+            self._version_after_write(created_object_id)
 
-            # need to get the metadata from the server as otherwise we would not be able to update the resource
-            # later (Fedora mandates that last modification time in sent data is the same as last modification
-            # time in the metadata on server)
-            created_object_meta = list(self.get_object(created_object_id))[0]
-            return created_object_meta
+            metadata.set_id(created_object_id)
+            return self._get_written_metadata(created_object_id, metadata, resp.headers.get('ETag'),
+                                              self._get_server_managed(resp, parent, created=True))
 
         except HTTPError as e:
             log.error("%s : %s", e.msg, e.fp.read())
@@ -154,15 +343,68 @@ class FedoraConnection:
         :return:     list of modified metadata received from server.
                      Each is of type RDFMetadata and has 'id' property filled
         """
+        try:
+            return self._write_all(
+                lambda item: self._update_single_resource(self._get_request_url(item['metadata'].id),
+                                                          item['metadata'], item['bitstream']),
+                data)
+        finally:
+            self.invalidate_cached([item['metadata'].id for item in data])
+
+    def _write_all(self, write_function, data):
+        """
+        Calls write_function on each item of data. If write_parallelism is greater than 1, the items are
+        written concurrently on behalf of the calling user. All items are written even if some of them fail.
+
+        :param write_function:  function that writes an item and returns its RDFMetadata
+        :param data:            list of items
+        :return:                list of RDFMetadata, in the same order as data
+        :raise BulkWriteException if writing of any of the items failed. If data contain only a single item
+                                  (i.e. a single object is saved), its exception is propagated instead
+        """
+        if len(data) == 1:
+            return [write_function(data[0])]
+
+        if self._write_parallelism <= 1:
+            results = [functools.partial(write_function, item) for item in data]
+        else:
+            context = as_thread_of()
+
+            def write_in_context(item):
+                with context:
+                    return write_function(item)
+
+            results = [self._get_executor().submit(write_in_context, item).result for item in data]
+
         metadata_from_server = []
-        for item in data:
-            metadata = item['metadata']
-            url = self._get_request_url(metadata.id)
-            metadata_from_server.append(self._update_single_resource(url, metadata, item['bitstream']))
+        errors = []
+        for index, result in enumerate(results):
+            try:
+                metadata_from_server.append(result())
+            except Exception as e:
+                log.error('Error writing item %s: %s', index, e)
+                metadata_from_server.append(None)
+                errors.append((index, e))
+
+        if errors:
+            raise BulkWriteException(metadata_from_server, errors)
 
         return metadata_from_server
 
-    def _update_single_resource(self, url, metadata, bitstream=None):
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._write_parallelism)
+        return self._executor
+
+    def close(self):
+        """
+        Releases resources held by the connection, i.e. stops the threads used for concurrent writes
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _update_single_resource(self, url, metadata, bitstream=None, server_managed=None):
         payload = metadata.serialize_sparql()
         log.info("Updating object %s", url)
         log.debug("      payload %s", payload.decode('utf-8'))
@@ -171,28 +413,83 @@ class FedoraConnection:
             if bitstream is not None:
                 self._update_object_bitstream(url, bitstream)
 
-            resp = requests.patch(url + "/fcr:metadata", data=payload,
-                                  headers={'Content-Type': 'application/sparql-update; encoding=utf-8'},
-                                  auth=self._get_auth())
-            log.debug('Response: ', resp.content)
+            resp = self._patch_metadata(url, payload, metadata.etag)
+            if resp.status_code == 412:
+                # resource was modified on the server after the metadata had been fetched. Writing the changes
+                # anyway would overwrite the concurrent modification, so give the caller the current metadata
+                log.info('Stale ETag %s on %s, refetching metadata', metadata.etag, url)
+                self.invalidate_cached([metadata.id])
+                raise StaleObjectException(metadata.id, list(self.get_object(metadata.id))[0])
+            log.debug('Response: %s', resp.content)
             if resp.status_code // 100 != 2:
                 raise Exception('Error updating resource in Fedora: %s' % resp.content)
-            self.make_version(metadata.id, time.time())
+            self._version_after_write(metadata.id)
 
-            # need to get the metadata from the server as otherwise we would not be able to update the resource
-            # later (Fedora mandates that last modification time in sent data is the same as last modification
-            # time in the metadata on server)
-            created_object_meta = list(self.get_object(metadata.id))[0]
-
-            return created_object_meta
+            managed = self._get_server_managed(resp)
+            if server_managed:
+                managed.update(server_managed)
+            return self._get_written_metadata(metadata.id, metadata, resp.headers.get('ETag'), managed)
 
         except HTTPError as e:
             log.error("%s : %s", e.msg, e.fp.read())
             raise
 
+    def _patch_metadata(self, url, payload, etag):
+        headers = {'Content-Type': 'application/sparql-update; encoding=utf-8'}
+        if etag:
+            # fedora returns weak ETags on rdf resources but compares If-Match against the strong value
+            if etag.startswith('W/'):
+                etag = etag[2:]
+            headers['If-Match'] = etag
+        return requests.patch(url + "/fcr:metadata", data=payload, headers=headers, auth=self._get_auth())
+
+    def _get_written_metadata(self, object_id, metadata, etag, server_managed):
+        """
+        Returns metadata of a resource that has just been written to the server
+
+        :param object_id:       id of the written resource
+        :param metadata:        metadata that were sent to the server
+        :param etag:            ETag header returned by the server
+        :param server_managed:  server managed triplets, see RDFMetadata.mark_as_saved
+        :return:                RDFMetadata
+        """
+        if self._refetch_after_write:
+            # Fedora mandates that last modification time in sent data is the same as last modification
+            # time in the metadata on server, so get the full metadata from the server
+            self.invalidate_cached([object_id])
+            return list(self.get_object(object_id))[0]
+
+        metadata.mark_as_saved(etag, server_managed)
+        return metadata
+
+    @staticmethod
+    def _get_server_managed(resp, parent=None, created=False):
+        """
+        Gets server managed triplets from the response of a write operation. fedora:lastModified (and
+        fedora:created of a created resource) are taken from the Last-Modified header, which has only a second
+        precision, so they are replaced by the precise values when the metadata are fetched again
+
+        :param resp:        the response
+        :param parent:      uri of the parent if the resource has just been created
+        :param created:     True if the resource has just been created
+        :return:            dictionary predicate -> list of values
+        """
+        ret = {FEDORA.lastModified: []}
+        last_modified = resp.headers.get('Last-Modified')
+        if last_modified:
+            ret[FEDORA.lastModified] = [rdflib.Literal(parsedate_to_datetime(last_modified), datatype=XSD.dateTime)]
+        if created:
+            ret[FEDORA.created] = list(ret[FEDORA.lastModified])
+        if parent:
+            ret[FEDORA.hasParent] = [rdflib.URIRef(parent)]
+        return ret
+
     def get_object(self, object_id, fetch_child_metadata=True):
         """
-        Fetches the resource with the given object_id parameter
+        Fetches the resource with the given object_id parameter. Within fedoralink.identity_map.identity_map block
+        the metadata are fetched only once and each call returns a copy of them, so that changes made by one
+        caller are not seen by the others. If metadata
+        cache is configured, metadata are transferred and parsed only if they have changed since they were cached.
 
         :param object_id: id of the object. Might be full url or a fragment which will be appended after repository_url
         :param fetch_child_metadata: if True, fetch also basic metadata about children. If False, do not fetch them,
@@ -201,36 +498,71 @@ class FedoraConnection:
         """
         try:
             req_url = self._get_request_url(object_id)
+
+            identity_map = get_identity_map()
+            # the ETag does not change when only children change, so metadata with embedded children can not
+            # be revalidated
+            metadata_cache = self._metadata_cache if not fetch_child_metadata else None
+            if identity_map is not None or metadata_cache is not None:
+                cache_key = (self.get_principal(), fetch_child_metadata)
+
+            if identity_map is not None:
+                metadata = identity_map.get(req_url, cache_key)
+                if metadata is not None:
+                    yield metadata.copy()
+                    return
+
             log.info('Requesting url %s' % req_url)
+            mimetype, parser_format = RDF_FORMATS[self._rdf_format]
             headers = {
-                'Accept' : 'application/rdf+xml; encoding=utf-8',
+                'Accept' : mimetype,
             }
             if fetch_child_metadata:
                 headers['Prefer'] = 'return=representation; ' + \
                                     'include="http://fedora.info/definitions/v4/repository#EmbedResources"'
 
-            with closing(requests.get(req_url + "/fcr:metadata",
+            cached = None
+            if metadata_cache is not None:
+                cached = metadata_cache.get(req_url, cache_key)
+                if cached is not None:
+                    if cached.etag:
+                        headers['If-None-Match'] = cached.etag
+                    if cached.last_modified:
+                        headers['If-Modified-Since'] = cached.last_modified
+
+            with closing(requests.get(req_url + "/fcr:metadata", stream=True,
                                       headers=headers, auth=self._get_auth())) as r:
 
-                g = rdflib.Graph()
                 log.debug("making request to %s", req_url)
                 log.debug(r.headers)
-                log.debug(r.raw)
-                # for chunk in r.iter_content(chunk_size=1024):
-                #     if chunk:
-                #         print("chunk")
-                #         print(chunk)
-                #         r.content += chunk
-                data = r.content.decode('utf-8')
-                if r.status_code // 100 != 2:
-                    raise RepositoryException(url=req_url, code=r.status_code,
-                                              msg='Error accessing repository: %s' % data,
-                                              hdrs=r.headers, fp=None)
-
-            log.debug("   ... data %s", data)
-            sys.stdout.flush()
-            g.parse(io.StringIO(data))
-            yield RDFMetadata(req_url, g)
+                if r.status_code == 304 and cached is not None:
+                    log.debug("metadata of %s not modified, using cached ones", req_url)
+                    etag = r.headers.get('ETag', cached.etag)
+                    g = cached.to_graph()
+                else:
+                    if r.status_code // 100 != 2:
+                        if self._metadata_cache is not None:
+                            self._metadata_cache.invalidate(req_url)
+                        data = r.content.decode('utf-8')
+                        raise RepositoryException(url=req_url, code=r.status_code,
+                                                  msg='Error accessing repository: %s' % data,
+                                                  hdrs=r.headers, fp=None)
+
+                    etag = r.headers.get('ETag')
+
+                    # parse the response while it is being received, without keeping the whole payload in memory
+                    r.raw.decode_content = True
+                    g = rdflib.Graph()
+                    g.parse(source=io.BufferedReader(r.raw, buffer_size=PARSER_BUFFER_SIZE), format=parser_format)
+
+                    if metadata_cache is not None:
+                        metadata_cache.put(req_url, cache_key, etag, r.headers.get('Last-Modified'), g)
+
+            metadata = RDFMetadata(req_url, g)
+            metadata.etag = etag
+            if identity_map is not None:
+                identity_map.put(req_url, cache_key, metadata.copy())
+            yield metadata
 
         except HTTPError as e:
             # log.error("%s: %s : %s", e.code, e.msg, e.fp.read() if e.fp else '')
@@ -244,9 +576,19 @@ class FedoraConnection:
             return r.content
 
     def get_bitstream(self, object_id):
+        return self.open_bitstream(object_id).raw
+
+    def open_bitstream(self, object_id, headers=None):
+        """
+        Starts downloading the bitstream of the given object
+
+        :param object_id:   id of the object
+        :param headers:     additional request headers, for example Range or If-None-Match
+        :return:            streamed requests.Response, caller is responsible for closing it
+        """
         req_url = self._get_request_url(object_id)
         log.info("Bitstream request url %s", req_url)
-        return requests.get(req_url, stream=True, auth=self._get_auth()).raw
+        return requests.get(req_url, stream=True, headers=dict(headers or {}), auth=self._get_auth())
 
     def _remove_transactions_from_paths(self, data):
         # remove transaction from data ... let's do it the simple way even though it is not kosher
@@ -274,7 +616,10 @@ class FedoraConnection:
         """
         req_url = self._get_request_url(object_id)
         log.info('Deleting resource with url %s', req_url)
-        requests.delete(req_url, auth=self._get_auth())
+        try:
+            requests.delete(req_url, auth=self._get_auth())
+        finally:
+            self.invalidate_cached([object_id], subtree=True)
 
     def make_version(self, object_id, version):
         """
@@ -287,6 +632,38 @@ class FedoraConnection:
         requests.post(self._get_request_url(object_id) + '/fcr:versions',
                       headers={'Slug': 'snapshot_at_%s' % version}, auth=self._get_auth())
 
+    def _version_after_write(self, object_id):
+        """
+        Called after an object has been written, makes a version according to the versioning policy
+
+        :param object_id:       id of the written object
+        """
+        if self._versioning == VERSIONING_ALWAYS:
+            self.make_version(object_id, time.time())
+        elif self._versioning == VERSIONING_ON_COMMIT:
+            with self._pending_versions_lock:
+                self._pending_versions[object_id] = True
+        elif self._versioning == VERSIONING_COALESCE:
+            coalesced_versions.schedule(self, self._remove_transactions_from_paths(object_id),
+                                        self._versioning_window)
+
+    def make_pending_versions(self):
+        """
+        Makes versions of objects written with VERSIONING_ON_COMMIT policy. Called when a transaction is committed;
+        outside of a transaction called by FedoraManager.save after all objects have been saved.
+        """
+        if self._in_transaction:
+            return
+        self._flush_pending_versions()
+
+    def _flush_pending_versions(self):
+        with self._pending_versions_lock:
+            pending = list(self._pending_versions)
+            self._pending_versions.clear()
+        version = time.time()
+        for object_id in pending:
+            self.make_version(object_id, version)
+
     def begin_transaction(self):
         tx_prefix = "fcr:tx"
         url = self.dumb_concatenate_url(self._fedora_url, tx_prefix)
@@ -309,6 +686,9 @@ class FedoraConnection:
     def _end_transaction(self, do_commit):
         try:
             if self._in_transaction:
+                if do_commit:
+                    # make versions while still inside the transaction so that they are committed with it
+                    self._flush_pending_versions()
                 url = self.dumb_concatenate_url(self._transaction_url,
                                                 'fcr:tx/' + ('fcr:commit' if do_commit else 'fcr:rollback'))
                 log.info('Finishing transaction, url %s', url)
@@ -316,6 +696,8 @@ class FedoraConnection:
         finally:
             self._in_transaction = False
             self._transaction_url = ''
+            with self._pending_versions_lock:
+                self._pending_versions.clear()
 
     def _get_request_url(self, object_id):
         if ':' in object_id and not object_id.startswith('http'):
@@ -349,6 +731,8 @@ class FedoraConnection:
             log.debug(req.text)
         except HTTPError as e:
             log.error("Error when calling direct_put at {0}: {1}".format(url, e.fp.read()))
+        finally:
+            self.invalidate_cached([url])
 
     def __eq__(self, other):
         if not hasattr(other, '_fedora_url'):
@@ -366,6 +750,35 @@ class FedoraConnection:
         else:
             return None
 
+    def get_principal(self):
+        """
+        :return: hashable identification of the user on whose behalf requests are made: the username of
+                 the connection (or of fedoralink.authentication.as_user.as_user) and delegated user and groups
+        """
+        credentials = getattr(fedora_auth_local, 'Credentials', None)
+        username = credentials.username if credentials is not None else self._username
+        if FedoraUserDelegationMiddleware.is_enabled():
+            return (username,
+                    tuple(FedoraUserDelegationMiddleware.get_on_behalf_of()),
+                    tuple(FedoraUserDelegationMiddleware.get_on_behalf_of_groups()))
+        return username, None, None
+
+    def invalidate_cached(self, object_ids, subtree=False):
+        """
+        Removes the written objects (and their parents) from the identity map of the current request
+        and from the metadata cache
+
+        :param object_ids:  ids of the objects
+        :param subtree:     if True, remove also all objects below them
+        """
+        identity_map = get_identity_map()
+        for object_id in object_ids:
+            req_url = self._get_request_url(object_id)
+            if identity_map is not None:
+                identity_map.invalidate(req_url, subtree)
+            if self._metadata_cache is not None:
+                self._metadata_cache.invalidate(req_url, subtree)
+
     def get_local_id(self, object_id):
         if object_id.startswith(self._fedora_url):
             object_id = object_id[len(self._fedora_url):]
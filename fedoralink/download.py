@@ -0,0 +1,119 @@
+import logging
+from urllib.parse import quote, urlencode
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+from fedoralink.manager import get_bitstream_mimetype, get_bitstream_filename
+from fedoralink.middleware import FedoraUserDelegationMiddleware
+
+log = logging.getLogger('fedoralink.download')
+
+# django META key -> header sent to fedora
+FORWARDED_REQUEST_HEADERS = (
+    ('HTTP_RANGE',              'Range'),
+    ('HTTP_IF_RANGE',           'If-Range'),
+    ('HTTP_IF_NONE_MATCH',      'If-None-Match'),
+    ('HTTP_IF_MODIFIED_SINCE',  'If-Modified-Since'),
+)
+
+# headers from fedora's response that are passed to the client
+FORWARDED_RESPONSE_HEADERS = ('Content-Length', 'Content-Range', 'Content-Encoding', 'Accept-Ranges', 'ETag',
+                              'Last-Modified')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def bitstream_response(request, obj, disposition='inline', filename=None, using='repository'):
+    """
+    Returns a response with the bitstream of the given object. Range and conditional headers of the request are
+    forwarded to Fedora so that partial (206) and not modified (304) responses are returned as well.
+
+    If DOWNLOAD_OFFLOAD_HEADER (for example X-Accel-Redirect) is set in DATABASES[using], the bytes are not
+    proxied through python. The response contains only the header with the value DOWNLOAD_OFFLOAD_PREFIX + local
+    id of the object and the front-end server is expected to serve the content from Fedora. If user delegation
+    is enabled, the delegated user and groups are appended to the internal location as on_behalf_of and
+    on_behalf_of_groups query parameters. The internal location is never sent to the client, so the front-end
+    server must consume the header, forward the parameters to Fedora as On-Behalf-Of and
+    On-Behalf-Of-Django-Groups headers and add Fedora credentials itself. With nginx::
+
+        location ~ ^/fedora-internal/(.*)$ {
+            internal;
+            proxy_set_header Authorization "Basic <base64 of USERNAME:PASSWORD>";
+            proxy_set_header On-Behalf-Of $arg_on_behalf_of;
+            proxy_set_header On-Behalf-Of-Django-Groups $arg_on_behalf_of_groups;
+            proxy_pass http://fedora:8080/fcrepo/rest/$1;
+        }
+
+    The location must be ``internal`` so that clients can not request it directly. As proxy_pass contains
+    a variable, the query parameters are not passed to Fedora.
+
+    :param request:         django request
+    :param obj:             FedoraObject whose bitstream should be returned
+    :param disposition:     'inline' or 'attachment'
+    :param filename:        filename in Content-Disposition, if not set taken from the object's metadata
+    :param using:           the repository
+    :return:                django response
+    """
+    if filename is None:
+        filename = get_bitstream_filename(obj)
+    mimetype = get_bitstream_mimetype(obj)
+
+    repo_conf = settings.DATABASES[using]
+    offload_header = repo_conf.get('DOWNLOAD_OFFLOAD_HEADER', None)
+    if offload_header:
+        resp = HttpResponse(content_type=mimetype)
+        location = repo_conf.get('DOWNLOAD_OFFLOAD_PREFIX', '') + quote(obj.local_id)
+        if FedoraUserDelegationMiddleware.is_enabled():
+            # urns are already escaped, keep them as they are so that nginx's $arg_ variables contain the exact value
+            location += '?' + urlencode((
+                ('on_behalf_of', ','.join(FedoraUserDelegationMiddleware.get_on_behalf_of())),
+                ('on_behalf_of_groups', ','.join(FedoraUserDelegationMiddleware.get_on_behalf_of_groups()))
+            ), safe=':/,%+@', quote_via=quote)
+        resp[offload_header] = location
+        _set_content_disposition(resp, disposition, filename)
+        return resp
+
+    headers = {header: request.META[key] for key, header in FORWARDED_REQUEST_HEADERS if key in request.META}
+
+    fedora_resp = type(obj).objects.open_bitstream(obj, headers)
+    status = fedora_resp.status_code
+
+    if status in (200, 206):
+        resp = StreamingHttpResponse(_stream_content(fedora_resp), status=status, content_type=mimetype)
+        _set_content_disposition(resp, disposition, filename)
+    else:
+        fedora_resp.close()
+        if status == 304:
+            resp = HttpResponseNotModified()
+        elif status == 416:
+            resp = HttpResponse(status=416)
+        elif status == 404:
+            raise Http404('Bitstream %s not found' % obj.id)
+        elif status in (401, 403):
+            raise PermissionDenied()
+        else:
+            raise Exception('Error downloading bitstream %s, status code %s' % (obj.id, status))
+
+    for header in FORWARDED_RESPONSE_HEADERS:
+        if header in fedora_resp.headers:
+            resp[header] = fedora_resp.headers[header]
+
+    return resp
+
+
+def _stream_content(fedora_resp):
+    try:
+        # pass the bytes as they are, Content-Length and Content-Encoding are forwarded from fedora
+        for chunk in fedora_resp.raw.stream(CHUNK_SIZE, decode_content=False):
+            yield chunk
+    finally:
+        fedora_resp.close()
+
+
+def _set_content_disposition(resp, disposition, filename):
+    if filename:
+        resp['Content-Disposition'] = '%s; filename="%s"' % (disposition, filename)
+    else:
+        resp['Content-Disposition'] = disposition
@@ -1,9 +1,23 @@
+import threading
+
+from django.core.signals import setting_changed
 from django.db.backends.base.base import BaseDatabaseWrapper
 from django.db.backends.base.features import BaseDatabaseFeatures
-from ..connection import FedoraConnection
+from django.dispatch import receiver
+
+from ..connection import FedoraConnection, VERSIONING_ALWAYS
+from ..metadata_cache import create_metadata_cache
 
 __author__ = 'simeki'
 
+# connection alias -> indexer. Django creates a DatabaseWrapper per thread, indexers are shared among all of them
+_indexers = {}
+# connection alias -> IndexingQueue
+_indexing_queues = {}
+# connection alias -> MetadataCache, None if the cache is not configured
+_metadata_caches = {}
+_indexers_lock = threading.Lock()
+
 
 class DatabaseFeatures(BaseDatabaseFeatures):
     pass
@@ -40,7 +54,15 @@ class DatabaseWrapper(BaseDatabaseWrapper):
     def get_new_connection(self, conn_params):
         return FedoraConnection(self.settings_dict['REPO_URL'],
                                 self.settings_dict.get('USERNAME', None),
-                                self.settings_dict.get('PASSWORD', None))
+                                self.settings_dict.get('PASSWORD', None),
+                                pool_size=self.settings_dict.get('CONNECTION_POOL_SIZE', None),
+                                timeout=self.settings_dict.get('TIMEOUT', None),
+                                refetch_after_write=self.settings_dict.get('REFETCH_AFTER_WRITE', False),
+                                versioning=self.settings_dict.get('VERSIONING', VERSIONING_ALWAYS),
+                                versioning_window=self.settings_dict.get('VERSIONING_WINDOW', 300),
+                                write_parallelism=self.settings_dict.get('WRITE_PARALLELISM', 1),
+                                rdf_format=self.settings_dict.get('RDF_FORMAT', 'xml'),
+                                metadata_cache=self.metadata_cache)
 
     def _set_autocommit(self, autocommit):
         pass
@@ -55,7 +77,7 @@ class DatabaseWrapper(BaseDatabaseWrapper):
         self.connection.rollback()
 
     def _close(self):
-        pass # does nothing
+        self.connection.close()
 
     @property
     def commit_on_exit(self):
@@ -72,13 +94,82 @@ class DatabaseWrapper(BaseDatabaseWrapper):
 
     @property
     def indexer(self):
-        return import_class(self.settings_dict['SEARCH_ENGINE'])(self.settings_dict)
+        """
+        Returns the indexer for this connection alias. The indexer is created (and the index checked) on the first
+        access and then shared by all threads, so it must be thread safe. The check is not made in
+        AppConfig.ready, as django discourages database access there and management commands and tests
+        must work without a running search engine.
+        """
+        indexer = _indexers.get(self.alias)
+        if indexer is None:
+            with _indexers_lock:
+                indexer = _indexers.get(self.alias)
+                if indexer is None:
+                    indexer = import_class(self.settings_dict['SEARCH_ENGINE'])(self.settings_dict)
+                    _indexers[self.alias] = indexer
+        return indexer
+
+    @property
+    def indexing_queue(self):
+        """
+        Returns the queue of objects waiting for indexing if INDEXING_QUEUE (path to the queue database) is set,
+        otherwise None and objects are indexed synchronously. Unless INDEXING_QUEUE_WORKER is False, the queue
+        is processed by a background thread started together with the queue.
+        """
+        path = self.settings_dict.get('INDEXING_QUEUE', None)
+        if not path:
+            return None
+        queue = _indexing_queues.get(self.alias)
+        if queue is None:
+            with _indexers_lock:
+                queue = _indexing_queues.get(self.alias)
+                if queue is None:
+                    from fedoralink.indexer.indexing_queue import IndexingQueue
+                    from fedoralink.models import FedoraObject
+                    queue = IndexingQueue(path, FedoraObject.objects, using=self.alias,
+                                          batch_size=self.settings_dict.get('INDEXING_QUEUE_BATCH_SIZE', 100))
+                    if self.settings_dict.get('INDEXING_QUEUE_WORKER', True):
+                        queue.start()
+                    _indexing_queues[self.alias] = queue
+        return queue
+
+    @property
+    def metadata_cache(self):
+        """
+        Returns the cache of metadata fetched from Fedora configured by METADATA_CACHE, shared by all threads,
+        or None if metadata are not cached
+        """
+        if self.alias not in _metadata_caches:
+            with _indexers_lock:
+                if self.alias not in _metadata_caches:
+                    _metadata_caches[self.alias] = create_metadata_cache(self.settings_dict)
+        return _metadata_caches[self.alias]
+
+    def reinitialize_indexer(self):
+        """
+        Drops the cached indexer, the next access to the indexer property creates a new one. Call this after
+        the search engine settings have changed or the index has been recreated.
+        """
+        with _indexers_lock:
+            _indexers.pop(self.alias, None)
 
     @property
     def validation(self):
         return FakeValidation()
 
 
+@receiver(setting_changed)
+def _reinitialize_indexers(setting, **kwargs):
+    if setting == 'DATABASES':
+        with _indexers_lock:
+            _indexers.clear()
+            _metadata_caches.clear()
+            queues = list(_indexing_queues.values())
+            _indexing_queues.clear()
+        for queue in queues:
+            queue.stop()
+
+
 def import_class( kls ):
     parts = kls.split('.')
     module = ".".join(parts[:-1])
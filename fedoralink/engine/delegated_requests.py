@@ -1,17 +1,97 @@
+import threading
 import traceback
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
 
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 
 from fedoralink.middleware import FedoraUserDelegationMiddleware, FedoraProfillingMiddleware
 
 HTTPError = requests.HTTPError
 
+log = logging.getLogger('fedoralink.engine.delegated_requests')
 
-def wrapper(func):
+DEFAULT_POOL_SIZE = 10
+
+
+class SessionPool:
+    """
+    Keeps keep-alive requests.Session instances, one per (thread, scheme://host:port). Sessions are never shared
+    between threads as requests.Session is not guaranteed to be thread safe. A session is used for requests of
+    all delegated users, so it does not store any cookies. Sessions (and their connections) are released when
+    their thread ends.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # scheme://host:port -> dict(pool_size=..., timeout=...)
+        self._host_options = {}
+
+    def configure(self, url, pool_size=None, timeout=None):
+        """
+        Sets connection options for the host the url points to. The timeout is used by all subsequent requests,
+        the pool size only by sessions created afterwards
+
+        :param url:         any url on the host
+        :param pool_size:   max number of keep-alive connections to the host kept by each thread
+        :param timeout:     default timeout, either number of seconds or a (connect, read) tuple
+        """
+        if isinstance(timeout, list):
+            timeout = tuple(timeout)
+        with self._lock:
+            self._host_options[self._host_key(url)] = {
+                'pool_size': pool_size or DEFAULT_POOL_SIZE,
+                'timeout': timeout
+            }
+
+    def get_session(self, url):
+        """
+        Returns the session for the current thread and the host of the given url
+
+        :param url:     url that is going to be requested
+        :return:        tuple (requests.Session, host options)
+        """
+        key = self._host_key(url)
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        session = sessions.get(key)
+        if session is None:
+            options = self._get_options(key)
+            session = requests.Session()
+            # cookies set by the server for one user must not be sent with requests of another one
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=options['pool_size'])
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            log.debug('Created http session for %s in thread %s', key, threading.current_thread().name)
+            sessions[key] = session
+        return session, self._get_options(key)
+
+    def _get_options(self, key):
+        return self._host_options.get(key, {'pool_size': DEFAULT_POOL_SIZE, 'timeout': None})
+
+    @staticmethod
+    def _host_key(url):
+        parts = urlsplit(url)
+        return '%s://%s' % (parts.scheme, parts.netloc)
+
+
+session_pool = SessionPool()
+
+
+def configure(url, pool_size=None, timeout=None):
+    session_pool.configure(url, pool_size=pool_size, timeout=timeout)
+
+
+def wrapper(method):
     import time
     def wrapped(*args, **kwargs):
         kwargs = dict(kwargs)
+        url = args[0] if args else kwargs['url']
         do_debug = FedoraProfillingMiddleware.profilling_enabled()
         if do_debug:
             t1 = time.time()
@@ -23,17 +103,20 @@ def wrapper(func):
                 groups = ','.join(FedoraUserDelegationMiddleware.get_on_behalf_of_groups())
                 if groups:
                     kwargs['headers']['On-Behalf-Of-Django-Groups'] = groups
-            return func(*args, **kwargs)
+            session, options = session_pool.get_session(url)
+            if 'timeout' not in kwargs and options['timeout'] is not None:
+                kwargs['timeout'] = options['timeout']
+            return getattr(session, method)(*args, **kwargs)
         finally:
             if do_debug:
                 t2 = time.time()
                 # noinspection PyUnboundLocalVariable
-                FedoraProfillingMiddleware.log_time(args[0] + ' - ' + repr(args[1:]) + repr(kwargs), t2-t1)
+                FedoraProfillingMiddleware.log_time(url + ' - ' + repr(args[1:]) + repr(kwargs), t2-t1)
     return wrapped
 
 
-post = wrapper(requests.post)
-put = wrapper(requests.put)
-get = wrapper(requests.get)
-patch = wrapper(requests.patch)
-delete = wrapper(requests.delete)
+post = wrapper('post')
+put = wrapper('put')
+get = wrapper('get')
+patch = wrapper('patch')
+delete = wrapper('delete')
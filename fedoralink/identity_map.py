@@ -0,0 +1,93 @@
+import threading
+
+identity_map_local = threading.local()
+
+
+class IdentityMap:
+    """
+    Resources already fetched from Fedora, used so that a resource is fetched only once within a request.
+    Entries are stored by url of the resource and a key (for example the principal the resource was fetched for
+    and whether child metadata were fetched as well).
+    """
+
+    def __init__(self):
+        self.__entries = {}
+        self.__lock = threading.Lock()
+
+    def get(self, url, key):
+        """
+        :param url:     url of the resource
+        :param key:     key within the url
+        :return:        the remembered value or None
+        """
+        with self.__lock:
+            return self.__entries.get(IdentityMap._normalize(url), {}).get(key)
+
+    def put(self, url, key, value):
+        """
+        Remembers a value for the given url and key
+
+        :param url:     url of the resource
+        :param key:     key within the url
+        :param value:   the value
+        """
+        with self.__lock:
+            self.__entries.setdefault(IdentityMap._normalize(url), {})[key] = value
+
+    def invalidate(self, url, subtree=False):
+        """
+        Forgets all values of the resource and of its parent, as the parent's metadata contain the resource
+        as its child
+
+        :param url:         url of the resource
+        :param subtree:     if True, forget also all resources below the resource (used when it is deleted)
+        """
+        url = IdentityMap._normalize(url)
+        with self.__lock:
+            self.__entries.pop(url, None)
+            self.__entries.pop(url.rsplit('/', 1)[0], None)
+            if subtree:
+                prefix = url + '/'
+                for entry_url in [x for x in self.__entries if x.startswith(prefix)]:
+                    del self.__entries[entry_url]
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    @staticmethod
+    def _normalize(url):
+        return str(url).rstrip('/')
+
+
+def get_identity_map():
+    """
+    :return: IdentityMap of the current request (or identity_map block), None if there is none
+    """
+    return getattr(identity_map_local, 'identity_map', None)
+
+
+class identity_map:
+    """
+    Within the block, metadata fetched by FedoraConnection.get_object (and thus by FedoraObject.objects.get(pk=...))
+    are fetched from Fedora only once, each call gets its own copy. Saving or deleting an object forgets it.
+
+        with identity_map():
+            ...
+
+    Nested blocks share the identity map of the outermost block. For the whole django request use
+    fedoralink.middleware.FedoraIdentityMapMiddleware.
+    """
+
+    def __init__(self):
+        self.original_identity_map = None
+
+    def __enter__(self):
+        self.original_identity_map = get_identity_map()
+        if self.original_identity_map is None:
+            identity_map_local.identity_map = IdentityMap()
+        return identity_map_local.identity_map
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        identity_map_local.identity_map = self.original_identity_map
+
@@ -5,4 +5,58 @@ log = logging.getLogger('fedoralink.indexer')
 class Indexer:
     # abstract method
     def search(self, query, model_class, start, end, facets, ordering, values):
-        raise Exception("Please reimplement this method in inherited classes")
\ No newline at end of file
+        raise Exception("Please reimplement this method in inherited classes")
+
+    # abstract method
+    def iterate(self, query, model_class, ordering, chunk_size):
+        """
+        Returns all documents matching the query, not limited by the max page size of the search engine
+
+        :return: generator of lists of (metadata, highlighting) tuples, each list at most chunk_size long
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def reindex(self, obj):
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def reindex_bulk(self, objects):
+        """
+        Indexes multiple objects. Inherited classes should override this with a single round trip to the index.
+
+        :param objects: iterable of fedora objects
+        :return:        list of (object id, error) for objects that could not be indexed
+        """
+        failed = []
+        for obj in objects:
+            try:
+                self.reindex(obj)
+            except Exception as e:
+                failed.append((obj.id, e))
+        return failed
+
+    def diff_children(self, parent_id, children_last_modified):
+        """
+        Compares children of a container with the documents indexed with this container as their parent
+
+        :param parent_id:               id of the container
+        :param children_last_modified:  dictionary child id -> list of fedora:lastModified values in the repository
+        :return:                        tuple (ids of changed or not indexed children, ids of indexed documents
+                                        whose resources are no longer in the container)
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def delete_documents(self, ids):
+        """
+        Deletes documents with the given ids, documents of their descendants are kept
+
+        :param ids: ids of the documents
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def delete_subtrees(self, ids):
+        """
+        Deletes documents with the given ids and all documents of their descendants
+
+        :param ids: ids of the root documents
+        """
+        raise Exception("Please reimplement this method in inherited classes")
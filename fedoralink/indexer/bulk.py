@@ -0,0 +1,208 @@
+import collections
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from fedoralink.authentication.as_user import as_thread_of
+from fedoralink.fedorans import LDP, FEDORA
+
+log = logging.getLogger('fedoralink.indexer.bulk')
+
+
+class BulkReindexer:
+    """
+    Reindexes a subtree of the repository. The tree is crawled breadth-first, fetching up to `concurrency`
+    resources at the same time. Containers are fetched together with the metadata of their children. Children
+    that are leaves (their embedded metadata have no ldp:contains) are built from the embedded metadata and are
+    not fetched at all; only children that are containers themselves or binaries (whose full description is
+    needed) are fetched. Objects are sent to the indexer in batches of `batch_size` via indexer.reindex_bulk.
+
+    The crawl never has more than 2 * concurrency fetches in flight and waits for each batch to be indexed
+    before fetching more, so a slow index slows down the crawler instead of filling memory.
+
+    In incremental mode the embedded fedora:lastModified of each child is compared with the indexed value
+    (indexer.diff_children) and only new or modified children are indexed. Unchanged leaves are skipped
+    without being fetched; containers are still crawled to find modified descendants. Indexed documents
+    whose resources are no longer in the container are deleted together with their descendants.
+
+    If checkpoint_file is set, the urls still to be crawled are written there after each indexed batch. Running
+    the reindexer again with the same checkpoint file continues where the interrupted run stopped. The file is
+    removed when the crawl finishes.
+    """
+
+    def __init__(self, manager, indexer, batch_size=500, concurrency=4, checkpoint_file=None, progress=None,
+                 incremental=False):
+        """
+        :param manager:         manager used to fetch the objects, for example FedoraObject.objects
+        :param indexer:         the indexer
+        :param batch_size:      number of objects sent to the indexer in one request
+        :param concurrency:     number of resources fetched from fedora in parallel
+        :param checkpoint_file: path to the file with the crawl state, None for non-resumable crawl
+        :param progress:        callable(indexed, failed, pending) called after each batch
+        :param incremental:     if True, reindex only new and modified resources and delete removed ones
+        """
+        self.manager = manager
+        self.indexer = indexer
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.checkpoint_file = checkpoint_file
+        self.progress = progress
+        self.incremental = incremental
+
+        self.indexed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.deleted = 0
+
+    def reindex(self, root_id=''):
+        """
+        Reindexes the root and all its descendants
+
+        :param root_id: id of the root of the reindexed subtree, '' for the whole repository
+        :return:        tuple (number of indexed objects, number of objects that could not be fetched or indexed)
+        """
+        pending = self._load_checkpoint()
+        if pending is None:
+            pending = [(root_id, True)]
+        # (object id, True if the object should be indexed)
+        frontier = collections.deque(pending)
+        in_flight = {}
+        batch = []
+        processed = 0
+
+        context = as_thread_of()
+
+        def fetch(object_id):
+            with context:
+                return self._fetch(object_id)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            while frontier or in_flight:
+                while frontier and len(in_flight) < 2 * self.concurrency:
+                    item = frontier.popleft()
+                    in_flight[executor.submit(fetch, item[0])] = item
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    object_id, needs_index = in_flight.pop(future)
+                    processed += 1
+                    try:
+                        obj, children, leaves, changed, unchanged_leaves, deleted = future.result()
+                    except Exception as e:
+                        log.error('Could not fetch %s: %s', object_id, e)
+                        self.failed += 1
+                        continue
+
+                    if needs_index:
+                        batch.append(obj)
+                    else:
+                        self.skipped += 1
+                    self.skipped += unchanged_leaves
+                    self.deleted += deleted
+                    batch.extend(leaves)
+                    for child in children:
+                        frontier.append((child, child in changed))
+
+                if len(batch) >= self.batch_size or processed >= self.batch_size:
+                    self._flush(batch, frontier, in_flight)
+                    batch = []
+                    processed = 0
+
+            self._flush(batch, frontier, in_flight)
+
+        if self.checkpoint_file and os.path.exists(self.checkpoint_file):
+            os.unlink(self.checkpoint_file)
+
+        return self.indexed, self.failed
+
+    def _fetch(self, object_id):
+        """
+        Fetches the object and decides which of its children should be fetched and indexed. Called in worker
+        threads.
+
+        :return: tuple (object, ids of children to fetch, leaf children built from the embedded metadata,
+                 ids of children to index, number of unchanged leaves, number of deleted documents)
+        """
+        obj = self.manager.fetch_child_metadata(True).get(pk=object_id)
+        children = {
+            str(x): obj.metadata.clone_for(x) for x in obj[LDP.contains] if 'fedora:' not in x
+        }
+
+        removed = []
+        if self.incremental:
+            changed, removed = self.indexer.diff_children(
+                obj.id, {child: child_metadata[FEDORA.lastModified] for child, child_metadata in children.items()})
+            changed = set(changed)
+            if removed:
+                log.info('Deleting %s from index, resources no longer exist', removed)
+                self.indexer.delete_subtrees(removed)
+        else:
+            changed = set(children)
+
+        to_fetch = []
+        leaves = []
+        unchanged_leaves = 0
+        for child, child_metadata in children.items():
+            if self._needs_fetch(child_metadata):
+                # containers are crawled even if not modified, their descendants might have been
+                to_fetch.append(child)
+            elif child in changed:
+                leaves.append(self.manager.construct(child_metadata))
+            else:
+                unchanged_leaves += 1
+        return obj, to_fetch, leaves, changed, unchanged_leaves, len(removed)
+
+    @staticmethod
+    def _needs_fetch(child_metadata):
+        """
+        :param child_metadata:  metadata of a child embedded in its parent's metadata
+        :return:                True if the child must be fetched - it is a container whose children must
+                                be crawled, a binary, or the server did not embed its metadata
+        """
+        return LDP.contains in child_metadata or child_metadata.has_type(FEDORA.Binary) or \
+            FEDORA.lastModified not in child_metadata
+
+    def _flush(self, batch, frontier, in_flight):
+        for start in range(0, len(batch), self.batch_size):
+            chunk = batch[start:start + self.batch_size]
+            t1 = time.time()
+            failed = self.indexer.reindex_bulk(chunk)
+            for object_id, error in failed:
+                log.error('Could not index %s: %s', object_id, error)
+            self.indexed += len(chunk) - len(failed)
+            self.failed += len(failed)
+            log.debug('Indexed batch of %s objects in %.3f s', len(chunk), time.time() - t1)
+
+        # everything fetched so far is indexed, so the crawl can restart from urls not yet fetched
+        self._save_checkpoint(list(frontier) + list(in_flight.values()))
+
+        if self.progress:
+            self.progress(self.indexed, self.failed, len(frontier) + len(in_flight))
+
+    def _load_checkpoint(self):
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return None
+        with open(self.checkpoint_file) as f:
+            checkpoint = json.load(f)
+        self.indexed = checkpoint['indexed']
+        self.failed = checkpoint['failed']
+        self.skipped = checkpoint.get('skipped', 0)
+        self.deleted = checkpoint.get('deleted', 0)
+        log.info('Resuming reindex from %s, %s urls pending', self.checkpoint_file, len(checkpoint['pending']))
+        return [tuple(x) for x in checkpoint['pending']]
+
+    def _save_checkpoint(self, pending):
+        if not self.checkpoint_file:
+            return
+        tmp_file = self.checkpoint_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({
+                'indexed': self.indexed,
+                'failed': self.failed,
+                'skipped': self.skipped,
+                'deleted': self.deleted,
+                'pending': pending
+            }, f)
+        os.replace(tmp_file, self.checkpoint_file)
@@ -7,11 +7,15 @@ import urllib.parse
 import base64
 
 import time
+from collections import OrderedDict
 from dateutil.parser import parse
 from django.conf import settings
 from django.core.mail import mail_admins
+from django.core.signals import setting_changed
 from django.db.models import Q
+from django.dispatch import receiver
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import scan
 from elasticsearch.serializer import JSONSerializer
 from rdflib import Literal, URIRef, RDF
 
@@ -21,7 +25,7 @@ from fedoralink.indexer.fields import IndexedTextField, IndexedLanguageField, In
 from fedoralink.indexer.models import IndexableFedoraObject, fedoralink_classes
 from fedoralink.middleware import FedoraProfillingMiddleware
 from fedoralink.models import FedoraObject
-from fedoralink.rdfmetadata import RDFMetadata
+from fedoralink.rdfmetadata import CompactRDFMetadata
 from fedoralink.utils import url2id, id2url
 
 
@@ -45,6 +49,22 @@ FEDORA_CREATED_FIELD = _IDF(FEDORA.created, name='_fedora_created')
 FEDORA_LAST_MODIFIED_FIELD = _IDF(FEDORA.lastModified, name='_fedora_last_modified')
 CESNET_RDF_TYPES = _IDF(CESNET.rdf_types, name='_collection_child_types')
 
+# queries whose score depends on the matched document
+SCORING_QUERIES = ('match', 'multi_match', 'match_phrase', 'match_phrase_prefix', 'query_string',
+                   'simple_query_string', 'more_like_this')
+
+# model class -> (fld2id, id2fld, id2fldlang)
+_field_mappings_cache = {}
+# model class -> list of (field, elasticsearch field)
+_document_fields_cache = {}
+
+
+@receiver(setting_changed)
+def _clear_field_mappings_cache(setting, **kwargs):
+    if setting == 'LANGUAGES':
+        _field_mappings_cache.clear()
+
+
 class ElasticIndexer(Indexer):
     def __init__(self, repo_conf):
         urls = repo_conf['SEARCH_URL']
@@ -87,24 +107,142 @@ class ElasticIndexer(Indexer):
         self.es.delete(index=self.index_name, doc_type=doc_type, id=encoded_fedora_id)
 
     def reindex(self, obj):
+        document = self._build_document(obj)
+        if document is None:
+            # can not reindex something which does not have a mapping
+            return
+        doc_type, encoded_fedora_id, indexer_data = document
+
+        # noinspection PyBroadException
+        try:
+            self.es.index(index=self.index_name, doc_type=doc_type, body=indexer_data, id=encoded_fedora_id)
+        except:
+            print("Exception in indexing, data", indexer_data)
+            mail_admins('Exception reindexing object %s' % obj.id, traceback.format_exc())
+            print("Exception reindexing object %s" % obj.id, traceback.format_exc())
+            traceback.print_exc()
+        # print("reindexing single object ok")
+
+    def reindex_bulk(self, objects):
+        """
+        Indexes the objects with a single call to elasticsearch bulk api
+
+        :param objects: iterable of fedora objects, objects without mapping are skipped
+        :return:        list of (object id, error) for objects that could not be indexed
+        """
+        body = []
+        for obj in objects:
+            document = self._build_document(obj)
+            if document is None:
+                continue
+            doc_type, encoded_fedora_id, indexer_data = document
+            body.append({'index': {'_index': self.index_name, '_type': doc_type, '_id': encoded_fedora_id}})
+            body.append(indexer_data)
+
+        if not body:
+            return []
+
+        resp = self.es.bulk(body=body)
+        if not resp.get('errors'):
+            return []
+
+        failed = []
+        for item in resp['items']:
+            result = item['index']
+            if 'error' in result:
+                failed.append((base64.b64decode(result['_id']).decode('utf-8'), result['error']))
+        return failed
 
+    @staticmethod
+    def _get_document_fields(clz):
+        """
+        :return: list of (field, elasticsearch field), cached per model class
+        """
+        fields = _document_fields_cache.get(clz)
+        if fields is None:
+            fields = [(field, url2id(field.rdf_name)) for field in clz._meta.fields]
+            _document_fields_cache[clz] = fields
+        return fields
+
+    def diff_children(self, parent_id, children_last_modified):
+        """
+        Compares children of a container with the documents indexed with this container as their parent
+
+        :param parent_id:               id of the container
+        :param children_last_modified:  dictionary child id -> list of fedora:lastModified values in the repository
+        :return:                        tuple (ids of children that are not indexed or have been modified since,
+                                        ids of indexed documents whose resources are no longer in the container)
+        """
+        indexed = {}
+        for hit in scan(self.es, index=self.index_name,
+                        query={
+                            "query": {"bool": {"filter": {"term": {"_fedora_parent": parent_id}}}},
+                            "_source": ["_fedora_id", "_fedora_last_modified"]
+                        }):
+            indexed[hit['_source']['_fedora_id']] = hit['_source'].get('_fedora_last_modified')
+
+        changed = []
+        for child_id, last_modified in children_last_modified.items():
+            if child_id not in indexed or \
+                    indexed[child_id] != [convert(x, FEDORA_LAST_MODIFIED_FIELD) for x in last_modified]:
+                changed.append(child_id)
+
+        removed = [x for x in indexed if x not in children_last_modified]
+        return changed, removed
+
+    def delete_documents(self, ids):
+        """
+        Deletes documents with the given ids, documents of their descendants are kept
+
+        :param ids: fedora ids of the documents
+        """
+        self.es.delete_by_query(index=self.index_name, body={
+            "query": {
+                "ids": {
+                    "values": [base64.b64encode(str(x).encode('utf-8')).decode('utf-8') for x in ids]
+                }
+            }
+        })
+
+    def delete_subtrees(self, ids):
+        """
+        Deletes documents with the given ids and all documents of their descendants
+
+        :param ids: fedora ids of the root documents
+        """
+        while ids:
+            descendants = [hit['_source']['_fedora_id'] for hit in
+                           scan(self.es, index=self.index_name,
+                                query={
+                                    "query": {"bool": {"filter": {"terms": {"_fedora_parent": ids}}}},
+                                    "_source": ["_fedora_id"]
+                                })]
+            self.delete_documents(ids)
+            ids = descendants
+
+    def _build_document(self, obj):
+        """
+        Converts the object into an elasticsearch document
+
+        :param obj: the fedora object
+        :return:    tuple (doc_type, document id, document body) or None if obj's class has no mapping
+        """
         # get the fedoralink's original class from the obj.
         clz = fedoralink_classes(obj)[0]
 
         if not issubclass(clz, IndexableFedoraObject):
-            # can not reindex something which does not have a mapping
-            return
+            return None
 
         doc_type = self._get_elastic_class(clz)
 
         indexer_data = {}
-        for field in clz._meta.fields:
+        for field, id_in_elasticsearch in self._get_document_fields(clz):
             data = getattr(obj, field.name)
             if data is None:
                 continue
 
             converted_value = convert(data, field)
-            indexer_data[url2id(field.rdf_name)] = converted_value
+            indexer_data[id_in_elasticsearch] = converted_value
 
         encoded_fedora_id = base64.b64encode(str(obj.pk).encode('utf-8')).decode('utf-8')
 
@@ -119,15 +257,7 @@ class ElasticIndexer(Indexer):
         indexer_data['_fedora_last_modified'] = [convert(x, FEDORA_LAST_MODIFIED_FIELD) for x in
                                                  obj[FEDORA.lastModified]]
 
-        # noinspection PyBroadException
-        try:
-            self.es.index(index=self.index_name, doc_type=doc_type, body=indexer_data, id=encoded_fedora_id)
-        except:
-            print("Exception in indexing, data", indexer_data)
-            mail_admins('Exception reindexing object %s' % obj.id, traceback.format_exc())
-            print("Exception reindexing object %s" % obj.id, traceback.format_exc())
-            traceback.print_exc()
-        # print("reindexing single object ok")
+        return doc_type, encoded_fedora_id, indexer_data
 
     def _flatten_query(self, q):
         if not is_q(q):
@@ -391,11 +521,21 @@ class ElasticIndexer(Indexer):
             for c in q.children:
                 self._get_all_fields(c, fields, fld2id)
 
-    # noinspection PyProtectedMember
-    def search(self, query, model_class, start, end, facets, ordering, values):
-        self._de_morgan(query)
-        self._flatten_query(query)
+    @staticmethod
+    def _get_field_mappings(model_class):
+        """
+        :return: tuple of dictionaries (field name -> elasticsearch field, elasticsearch field -> field name,
+                 elasticsearch field -> field name with @language). The dictionaries are cached per model class
+                 and must not be modified
+        """
+        mappings = _field_mappings_cache.get(model_class)
+        if mappings is None:
+            mappings = ElasticIndexer._compute_field_mappings(model_class)
+            _field_mappings_cache[model_class] = mappings
+        return mappings
 
+    @staticmethod
+    def _compute_field_mappings(model_class):
         fld2id = {}
         id2fld = {}
         id2fldlang = {}
@@ -419,6 +559,15 @@ class ElasticIndexer(Indexer):
             id2fld[extra_fld] = extra_fld
             id2fldlang[extra_fld] = extra_fld
 
+        return fld2id, id2fld, id2fldlang
+
+    def _build_search_query(self, query, model_class, fld2id):
+        """
+        :return: tuple (elasticsearch query restricted to model_class, set of elasticsearch fields used in query)
+        """
+        self._de_morgan(query)
+        self._flatten_query(query)
+
         all_fields = set()
         self._get_all_fields(query, all_fields, fld2id)
 
@@ -437,6 +586,145 @@ class ElasticIndexer(Indexer):
                 self._build_query(Q(_fedoralink_model=self._get_elastic_class(model_class)), fld2id, None)
             ]
         }}
+        return self._plan_query(query_tree), all_fields
+
+    def _plan_query(self, query_tree):
+        """
+        Rewrites the query built by _build_query so that elasticsearch does not score clauses that can not
+        influence the score and can cache them: non-scoring clauses of bool.must are moved to bool.filter,
+        term clauses on the same field within non-scoring bool.should are merged into a single terms clause
+        and a query without any scoring clause is wrapped in constant_score. The matched documents do not change.
+
+        :param query_tree:  the query
+        :return:            the planned query
+        """
+        query_tree = self._plan_clause(query_tree)
+        if not self._is_scoring(query_tree):
+            query_tree = {
+                "constant_score": {
+                    "filter": self._unwrap_filter(query_tree)
+                }
+            }
+        return query_tree
+
+    def _plan_clause(self, clause):
+        if 'bool' not in clause or len(clause) != 1:
+            return clause
+        bool_clause = clause['bool']
+
+        must = [self._plan_clause(x) for x in _as_list(bool_clause.get('must'))]
+        should = [self._plan_clause(x) for x in _as_list(bool_clause.get('should'))]
+        filters = [self._unwrap_filter(self._plan_clause(x)) for x in _as_list(bool_clause.get('filter'))]
+
+        if not should:
+            # with should present, moving must clauses to filter would make the should clauses optional
+            scoring_must = []
+            for c in must:
+                if self._is_scoring(c):
+                    scoring_must.append(c)
+                elif c not in ({'match_all': {}}, {'bool': {}}):
+                    filters.append(self._unwrap_filter(c))
+            must = scoring_must
+        elif not self._is_scoring(should):
+            should = self._merge_terms([self._unwrap_filter(x) for x in should])
+
+        ret = {}
+        if must:
+            ret['must'] = must
+        if should:
+            ret['should'] = should
+        if filters:
+            ret['filter'] = filters
+        if 'must_not' in bool_clause:
+            ret['must_not'] = bool_clause['must_not']
+        return {'bool': ret}
+
+    @staticmethod
+    def _unwrap_filter(clause):
+        """
+        {"bool": {"filter": X}} or {"bool": {"filter": [X]}} -> X, in filter context X is not scored anyway
+        """
+        while list(clause.keys()) == ['bool'] and list(clause['bool'].keys()) == ['filter']:
+            inner = clause['bool']['filter']
+            if isinstance(inner, list):
+                if len(inner) != 1:
+                    break
+                inner = inner[0]
+            clause = inner
+        return clause
+
+    @staticmethod
+    def _merge_terms(clauses):
+        """
+        Merges alternatives (should clauses) {"term": {f: v1}}, {"term": {f: v2}} into {"terms": {f: [v1, v2]}}
+        """
+        ret = []
+        merged = OrderedDict()
+        for c in clauses:
+            if len(c) == 1 and ('term' in c or 'terms' in c) and len(next(iter(c.values()))) == 1:
+                field, value = next(iter(next(iter(c.values())).items()))
+                values = merged.setdefault(field, [])
+                for v in (value if isinstance(value, list) else [value]):
+                    if v not in values:
+                        values.append(v)
+            else:
+                ret.append(c)
+        for field, values in merged.items():
+            if len(values) == 1:
+                ret.append({'term': {field: values[0]}})
+            else:
+                ret.append({'terms': {field: values}})
+        return ret
+
+    @staticmethod
+    def _is_scoring(clause):
+        """
+        Returns True if the clause contains a query that contributes to the score outside of filter context
+        """
+        if isinstance(clause, list):
+            return any(ElasticIndexer._is_scoring(x) for x in clause)
+        if not isinstance(clause, dict):
+            return False
+        for k, v in clause.items():
+            if k in SCORING_QUERIES:
+                return True
+            if k in ('filter', 'must_not', 'constant_score'):
+                continue
+            if ElasticIndexer._is_scoring(v):
+                return True
+        return False
+
+    def iterate(self, query, model_class, ordering, chunk_size):
+        """
+        Returns all the matching documents in chunks, using search_after so that the result is not limited
+        by the max result window of elasticsearch. _fedora_id is added to the ordering to make it unique.
+
+        :return: generator of lists of (metadata, highlighting) tuples, each list at most chunk_size long
+        """
+        fld2id, id2fld, id2fldlang = self._get_field_mappings(model_class)
+
+        query_tree, all_fields = self._build_search_query(query, model_class, fld2id)
+
+        built_query = {
+            "sort": self._generate_ordering_clause(fld2id, ordering) + [{"_fedora_id": {"order": "asc"}}],
+            "query": query_tree,
+            "size": chunk_size
+        }
+
+        while True:
+            resp = self.es.search(index=self.index_name, body=built_query)
+            hits = resp['hits']['hits']
+            if hits:
+                yield [self.build_instance(doc, id2fld) for doc in hits]
+            if len(hits) < chunk_size:
+                return
+            built_query['search_after'] = hits[-1]['sort']
+
+    # noinspection PyProtectedMember
+    def search(self, query, model_class, start, end, facets, ordering, values):
+        fld2id, id2fld, id2fldlang = self._get_field_mappings(model_class)
+
+        query_tree, all_fields = self._build_search_query(query, model_class, fld2id)
 
         ordering_clause = self._generate_ordering_clause(fld2id, ordering)
 
@@ -457,6 +745,12 @@ class ElasticIndexer(Indexer):
             "size": (end - (start if start else 0)) if end is not None else 10000
         }
 
+        if values is not None:
+            # return only the requested fields, no need for highlighting
+            source_fields = self._get_source_fields(values, fld2id)
+            built_query['_source'] = list(source_fields.values())
+            del built_query['highlight']
+
         print(json.dumps(built_query, ensure_ascii=False))
         do_profile = FedoraProfillingMiddleware.profilling_enabled()
         if do_profile:
@@ -474,6 +768,9 @@ class ElasticIndexer(Indexer):
         for doc in resp['hits']['hits']:
             if values is None:
                 instances.append(self.build_instance(doc, id2fld))
+            else:
+                # noinspection PyUnboundLocalVariable
+                instances.append(self._build_values(doc, source_fields))
 
         facets = []
         for k, v in resp.get('aggregations', {}).items():
@@ -501,6 +798,38 @@ class ElasticIndexer(Indexer):
         }
 
 
+    @staticmethod
+    def _get_source_fields(values, fld2id):
+        """
+        :param values:  field names as passed to values(), language can be selected as field@lang
+        :return:        ordered dictionary field name -> path of the field in elasticsearch _source
+        """
+        source_fields = OrderedDict()
+        for v in values:
+            if v in ('id', 'pk'):
+                source_fields[v] = '_fedora_id'
+            else:
+                source_fields[v] = fld2id[v.replace('@', '.')]
+        return source_fields
+
+    @staticmethod
+    def _build_values(doc, source_fields):
+        """
+        Converts a hit returned for values() query to a dictionary field name -> value. Values of language fields
+        are dictionaries language -> value (language None for values without language) unless the field has
+        been requested as field@lang.
+        """
+        source = doc['_source']
+        ret = {}
+        for name, path in source_fields.items():
+            value = source
+            for part in path.split('.'):
+                value = value.get(part) if isinstance(value, dict) else None
+            if isinstance(value, dict):
+                value = {None if lang == 'null' else lang: val for lang, val in value.items() if lang != 'all'}
+            ret[name] = value
+        return ret
+
     @staticmethod
     def _generate_facet_clause(facets, fld2id):
         facets_clause = {}
@@ -580,18 +909,17 @@ class ElasticIndexer(Indexer):
     @staticmethod
     def build_instance(doc, id2fld):
         source = doc['_source']
-        metadata = RDFMetadata(source['_fedora_id'])
-
-        metadata.rdf_metadata.set((metadata.id, FEDORA.hasParent, URIRef(source['_fedora_parent'])))
-        for x in source['_fedora_type']:
-            metadata.rdf_metadata.add((metadata.id, RDF.type, URIRef(x)))
+        data = {
+            FEDORA.hasParent: [URIRef(source['_fedora_parent'])],
+            RDF.type: [URIRef(x) for x in source['_fedora_type']]
+        }
 
         for fld, field_value in source.items():
             if fld in ('_fedora_type', '_fedora_parent', '_fedora_id', '_fedoralink_model', '_fedora_created',
                        '_fedora_last_modified'):
                 continue
 
-            fld = id2url(fld)
+            values = data.setdefault(URIRef(id2url(fld)), [])
             if isinstance(field_value, dict):
                 # TODO: nested !!!
                 for lang, val in field_value.items():
@@ -599,12 +927,14 @@ class ElasticIndexer(Indexer):
                         continue
                     if lang == 'null':
                         lang = None
-                    metadata.rdf_metadata.add((metadata.id, URIRef(fld), Literal(val, lang=lang)))
+                    values.append(Literal(val, lang=lang))
             elif isinstance(field_value, list) or isinstance(field_value, tuple):
                 for val in field_value:
-                    metadata.rdf_metadata.add((metadata.id, URIRef(fld), Literal(val)))
+                    values.append(Literal(val))
             else:
-                metadata.rdf_metadata.add((metadata.id, URIRef(fld), Literal(field_value)))
+                values.append(Literal(field_value))
+
+        metadata = CompactRDFMetadata(source['_fedora_id'], data)
 
         highlight = {}
         for k, v in doc.get('highlight', {}).items():
@@ -625,6 +955,14 @@ def is_q(x):
     return isinstance(x, Q)
 
 
+def _as_list(x):
+    if x is None:
+        return []
+    if isinstance(x, list):
+        return x
+    return [x]
+
+
 def convert(data, field):
     if isinstance(data, Literal):
         data = data.value
@@ -1,4 +1,5 @@
 import datetime
+import logging
 import traceback
 
 import django.db.models
@@ -14,6 +15,8 @@ from fedoralink.forms import LangFormTextField, LangFormTextAreaField, MultiValu
     FedoraChoiceField, LinkedField
 from fedoralink.utils import StringLikeList, TypedStream
 
+log = logging.getLogger('fedoralink.indexer.fields')
+
 
 class IndexedField:
     __global_order = 0
@@ -71,6 +74,23 @@ class IndexedField:
 
             object_instance.metadata[self.rdf_name] = value
 
+        _get_field_values(object_instance).pop(self, None)
+
+    def _cached_getter(self, object_instance):
+        """
+        Returns the value of _getter, the value is remembered in object_instance until its metadata change.
+        Each call returns a new copy of multi-valued values, so modifying the returned list does not change
+        the remembered value.
+        """
+        metadata = object_instance.metadata
+        field_values = _get_field_values(object_instance)
+        cached = field_values.get(self)
+        if cached is not None and cached[0] is metadata and cached[1] == metadata.version:
+            return _copy_field_value(cached[2])
+        value = self._getter(object_instance)
+        field_values[self] = (metadata, metadata.version, value)
+        return _copy_field_value(value)
+
     def __convert_to_rdf(self, data):
         if data is None:
             return []
@@ -91,7 +111,7 @@ class IndexedField:
         fld = self
 
         def getter(inst):
-            return fld._getter(inst)
+            return fld._cached_getter(inst)
 
         def setter(inst, value):
             fld._setter(inst, value)
@@ -335,6 +355,98 @@ def register_model_lookup(field, related_model):
         field.related_model = related_model
 
 
+def _get_field_values(object_instance):
+    """
+    :return: dictionary field -> (metadata, metadata version, converted value) of already read fields
+    """
+    return object_instance.__dict__.setdefault('_field_values', {})
+
+
+def _copy_field_value(value):
+    """
+    :return: copy of lists within the value (for example StringLikeList of language field values),
+             other values are immutable or shared on purpose (linked objects) and are returned as they are
+    """
+    if isinstance(value, list):
+        return type(value)(_copy_field_value(x) for x in value)
+    return value
+
+
+def invalidate_field_values(object_instance):
+    """
+    Forgets converted values of all fields of object_instance
+    """
+    object_instance.__dict__.pop('_field_values', None)
+
+
+def _get_linked_objects(object_instance):
+    """
+    :return: dictionary url -> already resolved object referenced from object_instance via IndexedLinkedField
+    """
+    return object_instance.__dict__.setdefault('_linked_objects', {})
+
+
+PREFETCH_PARALLELISM = 8
+
+
+def prefetch_linked(instances, fields):
+    """
+    Resolves objects referenced by the given IndexedLinkedFields of all instances at once, so that reading the
+    fields does not fetch the objects one by one. The references are first looked up in the indexer with a single
+    pk__in query per related model, those not found there are fetched from Fedora in parallel.
+
+    Objects found in the indexer contain only the indexed metadata and are marked with is_incomplete (the same
+    as search results), so that they can not be saved. Objects fetched from Fedora are complete.
+
+    :param instances:   list of FedoraObject instances
+    :param fields:      list of IndexedLinkedField instances
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from fedoralink.authentication.as_user import as_thread_of
+
+    for field in fields:
+        urls = set()
+        for inst in instances:
+            linked_objects = _get_linked_objects(inst)
+            for ref in _filter_accessible_references(inst.metadata[field.rdf_name]):
+                if str(ref) not in linked_objects:
+                    urls.add(str(ref))
+        if not urls:
+            continue
+
+        resolved = {}
+        try:
+            for obj in field.related_model.objects.filter(pk__in=list(urls))[:len(urls)]:
+                obj.is_incomplete = True
+                resolved[str(obj.id)] = obj
+        except Exception:
+            log.exception('Could not look up %s in the indexer, fetching them from the repository', field.name)
+
+        missing = [url for url in urls if url not in resolved]
+        if missing:
+            context = as_thread_of()
+
+            def fetch(url):
+                with context:
+                    try:
+                        return field.convert_from_rdf(url)
+                    except Exception:
+                        # will be fetched (and the error raised) when the property is read
+                        log.exception('Could not prefetch %s', url)
+                        return None
+
+            with ThreadPoolExecutor(max_workers=min(PREFETCH_PARALLELISM, len(missing))) as executor:
+                for url, obj in zip(missing, executor.map(fetch, missing)):
+                    if obj is not None:
+                        resolved[url] = obj
+
+        for inst in instances:
+            linked_objects = _get_linked_objects(inst)
+            for ref in inst.metadata[field.rdf_name]:
+                if str(ref) in resolved:
+                    linked_objects[str(ref)] = resolved[str(ref)]
+
+
 def _filter_accessible_references(refs):
     if not refs:
         return refs
@@ -369,7 +481,32 @@ class IndexedLinkedField(IndexedField, django.db.models.Field):
     def convert_from_rdf(self, value):
         if not value:
             return None
-        return self.related_model.objects.get(pk=value)
+        return self.related_model.objects.fetch_child_metadata(False).get(pk=value)
+
+    def _getter(self, object_instance):
+        ret = object_instance.metadata[self.rdf_name]
+
+        if not self.multi_valued:
+            if len(ret):
+                return self._get_linked_object(object_instance, ret[0])
+            else:
+                return None
+
+        return StringLikeList([self._get_linked_object(object_instance, x) for x in ret])
+
+    def _get_linked_object(self, object_instance, value):
+        """
+        Returns the object referenced by value. The object is remembered in object_instance, so that reading
+        the property again does not fetch it again. prefetch_linked fills the remembered objects in advance,
+        objects it found in the indexer are incomplete (see prefetch_linked).
+        """
+        if not value:
+            return None
+        linked_objects = _get_linked_objects(object_instance)
+        key = str(value)
+        if key not in linked_objects:
+            linked_objects[key] = self.convert_from_rdf(value)
+        return linked_objects[key]
 
     def formfield(self, **kwargs):
         defaults = {'form_class': LinkedField,
@@ -415,7 +552,7 @@ class IndexedBinaryField(IndexedField, django.db.models.Field):
     def convert_from_rdf(self, value):
         if not value:
             return None
-        return self.related_model.objects.get(pk=value)
+        return self.related_model.objects.fetch_child_metadata(False).get(pk=value)
 
     def instrument(self, model_class, name):
         super().instrument(model_class, name)
@@ -0,0 +1,191 @@
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from django.db import connections
+
+log = logging.getLogger('fedoralink.indexer.indexing_queue')
+
+OPERATION_INDEX = 'index'
+OPERATION_DELETE = 'delete'
+OPERATION_DELETE_SUBTREE = 'delete_subtree'
+
+
+class IndexingQueue:
+    """
+    Durable queue of objects waiting to be (re)indexed or deleted from the index, stored in a sqlite database.
+
+    Each object is present in the queue at most once - enqueueing an object that is already waiting replaces
+    the waiting operation, so repeated saves of the same object are indexed only once. process_batch()
+    takes up to batch_size waiting objects, fetches the current state of the objects to index from the repository
+    and sends them to the indexer in one bulk request. Failed objects stay in the queue and are retried after
+    backoff * 2^attempts seconds (at most max_backoff). An object to index that can not be fetched (for example
+    because its transaction has not been committed yet) is retried as well; if it has been deleted, the delete
+    operation enqueued by post_delete replaces the waiting index operation.
+
+    The queue can be processed by a background thread in the web process (start()) or in a separate process
+    by the process_indexing_queue management command.
+    """
+
+    def __init__(self, path, manager, using='repository', batch_size=100, backoff=1, max_backoff=600,
+                 poll_interval=5):
+        """
+        :param path:            path to the sqlite database file, created if it does not exist
+        :param manager:         manager used to fetch the objects, for example FedoraObject.objects
+        :param using:           connection alias whose indexer is used
+        :param batch_size:      max number of objects sent to the indexer in one request
+        :param backoff:         delay in seconds before the first retry of a failed object
+        :param max_backoff:     max delay between retries
+        :param poll_interval:   how often the background thread looks for retried objects, in seconds
+        """
+        self.path = path
+        self.manager = manager
+        self.using = using
+        self.batch_size = batch_size
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._stop_event = None
+        self._worker_lock = threading.Lock()
+
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS indexing_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    object_id TEXT NOT NULL UNIQUE,
+                    operation TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL
+                )
+            """)
+
+    @property
+    def indexer(self):
+        return connections[self.using].indexer
+
+    def _connect(self):
+        # sqlite connections can not be shared between threads, so every call gets its own connection
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, object_id, operation=OPERATION_INDEX):
+        """
+        Puts the object to the queue, replacing the operation that might be already waiting for the object
+
+        :param object_id:   id of the object
+        :param operation:   OPERATION_INDEX, OPERATION_DELETE or OPERATION_DELETE_SUBTREE (deletes also
+                            documents of all descendants of the object)
+        """
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT OR REPLACE INTO indexing_queue (object_id, operation, next_attempt) '
+                         'VALUES (?, ?, ?)', (str(object_id), operation, time.time()))
+        self._wakeup.set()
+
+    @property
+    def depth(self):
+        """
+        Number of objects waiting in the queue, including those waiting for a retry
+        """
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM indexing_queue').fetchone()[0]
+
+    def process_batch(self):
+        """
+        Indexes one batch of objects whose time has come
+
+        :return: number of objects taken from the queue
+        """
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT id, object_id, operation, attempts FROM indexing_queue '
+                                'WHERE next_attempt <= ? ORDER BY id LIMIT ?',
+                                (time.time(), self.batch_size)).fetchall()
+        if not rows:
+            return 0
+
+        done = []
+        failed = []
+
+        to_index = []
+        for row in rows:
+            if row[2] != OPERATION_INDEX:
+                continue
+            try:
+                to_index.append((row, self.manager.fetch_child_metadata(False).get(pk=row[1])))
+            except Exception as e:
+                failed.append((row, e))
+
+        if to_index:
+            try:
+                errors = dict(self.indexer.reindex_bulk([obj for row, obj in to_index]))
+                for row, obj in to_index:
+                    if str(obj.id) in errors:
+                        failed.append((row, errors[str(obj.id)]))
+                    else:
+                        done.append(row)
+            except Exception as e:
+                failed.extend((row, e) for row, obj in to_index)
+
+        for operation, delete in ((OPERATION_DELETE, self.indexer.delete_documents),
+                                  (OPERATION_DELETE_SUBTREE, self.indexer.delete_subtrees)):
+            to_delete = [row for row in rows if row[2] == operation]
+            if to_delete:
+                try:
+                    delete([row[1] for row in to_delete])
+                    done.extend(to_delete)
+                except Exception as e:
+                    failed.extend((row, e) for row in to_delete)
+
+        with closing(self._connect()) as conn, conn:
+            # rows that were enqueued again while being processed have got a new id and are kept
+            conn.executemany('DELETE FROM indexing_queue WHERE id = ?', [(row[0],) for row in done])
+            for row, error in failed:
+                attempts = row[3] + 1
+                delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+                log.error('Indexing %s of %s failed (attempt %s), retrying in %s s: %s',
+                          row[2], row[1], attempts, delay, error)
+                conn.execute('UPDATE indexing_queue SET attempts = ?, next_attempt = ? WHERE id = ?',
+                             (attempts, time.time() + delay, row[0]))
+
+        return len(rows)
+
+    def process(self, stop_event=None):
+        """
+        Processes the queue until stop_event is set (or forever if it is None)
+        """
+        while stop_event is None or not stop_event.is_set():
+            self._wakeup.clear()
+            try:
+                processed = self.process_batch()
+            except Exception:
+                log.exception('Error processing indexing queue')
+                processed = 0
+            if not processed:
+                self._wakeup.wait(self.poll_interval)
+
+    def start(self):
+        """
+        Starts a daemon thread processing the queue, if it is not already running
+        """
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop_event = threading.Event()
+                self._worker = threading.Thread(target=self.process, args=(self._stop_event,),
+                                                name='fedoralink-indexing-queue', daemon=True)
+                self._worker.start()
+
+    def stop(self):
+        """
+        Stops the thread started by start(), waits until it finishes the batch it is processing
+        """
+        with self._worker_lock:
+            worker, self._worker = self._worker, None
+            if worker is not None:
+                self._stop_event.set()
+                self._wakeup.set()
+        if worker is not None:
+            worker.join()
@@ -206,6 +206,66 @@ class SOLRIndexer(Indexer):
         return re.sub(r'([+&|!(){}[]^"~*?:/\-])', r'\$1', s)
 
     def search(self, query, model, start, end, facets, ordering, values):
+        mapper, params, extra_params, solr_facets = self._prepare_search(query, model, facets, ordering, values)
+
+        if end is not None:
+            rows = end - start
+        else:
+            rows = MAX_PAGE_SIZE
+
+        params['start'] = start
+        params['rows'] = rows
+
+        resp = self._call_solr(params, extra_params)
+
+        data = self._parse_docs(resp, mapper, values, solr_facets)
+
+        returned_facets = [
+                (
+                    concat_lang(mapper.search_to_field(solr_name)),
+                    [
+                        (val, count) for val, count in zip(values[::2], values[1::2])
+                    ]
+                )
+                for solr_name, values in resp.get('facet_counts', {}).get('facet_fields', {}).items()
+            ]
+
+        returned_facets.sort(key=lambda x: facets.index(x[0]))
+
+        return {
+            'count': resp['response']['numFound'],
+            'data' : iter(data),
+            'facets' : returned_facets
+        }
+
+    def iterate(self, query, model, ordering, chunk_size):
+        """
+        Returns all the matching documents in chunks, using cursorMark deep paging. id is added to the ordering
+        as solr requires the uniqueKey to be part of the sort when cursor is used.
+
+        :return: generator of lists of (metadata, highlighting) tuples, each list at most chunk_size long
+        """
+        mapper, params, extra_params, solr_facets = self._prepare_search(query, model, None, ordering, None)
+        params['rows'] = chunk_size
+        params['sort'] = ','.join([x for x in (params['sort'], 'id asc') if x])
+
+        cursor = '*'
+        while True:
+            params['cursorMark'] = cursor
+            resp = self._call_solr(params, extra_params)
+            data = self._parse_docs(resp, mapper, None, solr_facets)
+            if data:
+                yield data
+            next_cursor = resp['nextCursorMark']
+            if next_cursor == cursor:
+                return
+            cursor = next_cursor
+
+    def _prepare_search(self, query, model, facets, ordering, values):
+        """
+        :return: tuple (mapper, dictionary of solr parameters, facet and field list parameters already encoded,
+                 set of solr facet fields)
+        """
         mapper = self.get_search_mapper(model)
         qs = []
         self._build_query(query, mapper, qs)
@@ -224,11 +284,6 @@ class SOLRIndexer(Indexer):
                 solr_facets.add(solr_facet)
                 facet_q += '&facet.field=' + quote(solr_facet)
 
-        if end is not None:
-            rows = end - start
-        else:
-            rows = MAX_PAGE_SIZE
-
         sort = []
         if ordering:
             for o in ordering:
@@ -252,26 +307,29 @@ class SOLRIndexer(Indexer):
             for val in values:
                 values_q += ',' + quote(mapper.field_to_search(val))
 
-        # call solr
-        url = self.solr_url + "/select?" + urlencode({
+        params = {
             'q' : qs,
             'fq' : fq,
             'wt': 'json',
             'indent': 'true',
-            'start' : start,
-            'rows' : rows,
             'sort' : ','.join(sort),
             'hl': 'true',
             'hl.fl': '*',
             'hl.requireFieldMatch' : 'true'
-        }) + facet_q + values_q
+        }
+
+        return mapper, params, facet_q + values_q, solr_facets
+
+    def _call_solr(self, params, extra_params):
+        url = self.solr_url + "/select?" + urlencode(params) + extra_params
 
         log.info('Calling SOLR, url %s', url)
 
         req = Request(url)
         data = urlopen(req).read().decode('utf-8')
-        resp = json.loads(data)
+        return json.loads(data)
 
+    def _parse_docs(self, resp, mapper, values, solr_facets):
         data = []
 
         for doc in resp['response']['docs']:
@@ -321,23 +379,7 @@ class SOLRIndexer(Indexer):
             else:
                 data.append(fields)
 
-        returned_facets = [
-                (
-                    concat_lang(mapper.search_to_field(solr_name)),
-                    [
-                        (val, count) for val, count in zip(values[::2], values[1::2])
-                    ]
-                )
-                for solr_name, values in resp.get('facet_counts', {}).get('facet_fields', {}).items()
-            ]
-
-        returned_facets.sort(key=lambda x: facets.index(x[0]))
-
-        return {
-            'count': resp['response']['numFound'],
-            'data' : iter(data),
-            'facets' : returned_facets
-        }
+        return data
 
     # noinspection PyMethodMayBeStatic
     def reindex(self, obj):
@@ -0,0 +1,34 @@
+# encoding: utf-8
+
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from fedoralink.indexer.indexing_queue import IndexingQueue
+from fedoralink.models import FedoraObject
+
+
+class Command(BaseCommand):
+    help = 'Processes the queue of objects waiting for indexing (see INDEXING_QUEUE setting)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--using', default='repository')
+        parser.add_argument('--drain', action='store_true',
+                            help='exit when there is no object ready for indexing instead of waiting for more')
+
+    def handle(self, *args, **options):
+        settings_dict = connections[options['using']].settings_dict
+        if not settings_dict.get('INDEXING_QUEUE', None):
+            raise CommandError('INDEXING_QUEUE is not set for %s' % options['using'])
+
+        queue = IndexingQueue(settings_dict['INDEXING_QUEUE'], FedoraObject.objects, using=options['using'],
+                              batch_size=settings_dict.get('INDEXING_QUEUE_BATCH_SIZE', 100))
+
+        self.stdout.write('%s objects in the queue' % queue.depth)
+        if options['drain']:
+            while queue.process_batch():
+                pass
+            self.stdout.write('%s objects left in the queue' % queue.depth)
+        else:
+            queue.process()
@@ -1,36 +1,44 @@
 # encoding: utf-8
 
 from __future__ import unicode_literals
-from django.core.management import call_command
 
 from django.core.management.base import BaseCommand
 from django.db import connections
 
-from fedoralink.authentication.Credentials import Credentials
-from fedoralink.authentication.as_user import as_user
+from fedoralink.indexer.bulk import BulkReindexer
 from fedoralink.models import FedoraObject
 
 
 class Command(BaseCommand):
-    args = ''
+    args = '[root id]'
     help = 'Reindexuje cely obsah repozitare'
 
+    def add_arguments(self, parser):
+        parser.add_argument('root_id', nargs='?', default='',
+                            help='id of the resource whose subtree should be reindexed, whole repository if not set')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='number of objects sent to the index in one bulk request')
+        parser.add_argument('--concurrency', type=int, default=4,
+                            help='number of resources fetched from fedora in parallel')
+        parser.add_argument('--checkpoint',
+                            help='file with the crawl state; if it exists, the interrupted reindex is resumed')
+        parser.add_argument('--incremental', action='store_true',
+                            help='reindex only resources modified since they were indexed, delete removed ones')
+
     def handle(self, *args, **options):
-        obj = FedoraObject.objects.get(pk='')
         indexer = connections['repository'].indexer
-        self.reindex(indexer, obj)
-
-    def reindex(self, indexer, obj, level=0):
-
-        if 'fedora:' in obj.id:
-            return
-
-        print(obj.id)
-        obj.update()
 
-        indexer.reindex(obj)
+        def progress(indexed, failed, pending):
+            self.stdout.write('indexed %s, unchanged %s, deleted %s, failed %s, pending %s' %
+                              (indexed, reindexer.skipped, reindexer.deleted, failed, pending))
 
-        print("   " * level, obj.id, type(obj))
+        reindexer = BulkReindexer(FedoraObject.objects, indexer,
+                                  batch_size=options['batch_size'],
+                                  concurrency=options['concurrency'],
+                                  checkpoint_file=options['checkpoint'],
+                                  progress=progress,
+                                  incremental=options['incremental'])
 
-        for c in obj.children:
-            self.reindex(indexer, c, level+1)
\ No newline at end of file
+        indexed, failed = reindexer.reindex(options['root_id'])
+        self.stdout.write('Reindex finished, %s objects indexed, %s unchanged, %s deleted, %s failed' %
+                          (indexed, reindexer.skipped, reindexer.deleted, failed))
@@ -1,12 +1,27 @@
 from django.db import connections
 from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 
+from .connection import BulkWriteException
 from .utils import TypedStream
 from .fedorans import LDP, EBUCORE
 from .type_manager import FedoraTypeManager
 from .query import LazyFedoraQuery
 
 
+def get_bitstream_mimetype(fedora_object):
+    ret = fedora_object[EBUCORE.hasMimeType]
+    if ret:
+        return ret[0].value
+    return 'application/binary'
+
+
+def get_bitstream_filename(fedora_object):
+    ret = fedora_object[EBUCORE.filename]
+    if ret:
+        return ret[0].value
+    return None
+
+
 class FedoraManager:
     """
         An object manager, responsible for:
@@ -96,20 +111,32 @@ class FedoraManager:
                 objects_to_create.append(o)
                 pre_save.send(sender=o.__class__, instance=o, raw=False, using='repository', update_fields=None)
 
-        if objects_to_update:
-            metadata = connection.update_objects([_serialize_object(o) for o in objects_to_update])
-            for md, obj in zip(metadata, objects_to_update):
+        def _write(write_function, objects_to_write):
+            try:
+                metadata = write_function([_serialize_object(o) for o in objects_to_write])
+            except BulkWriteException as e:
+                # objects that were written successfully get their new metadata even if others failed
+                for md, obj in zip(e.results, objects_to_write):
+                    if md is not None:
+                        obj.metadata = md
+                raise
+            for md, obj in zip(metadata, objects_to_write):
                 obj.metadata = md
 
+        if objects_to_update:
+            _write(connection.update_objects, objects_to_update)
+
         if objects_to_create:
-            metadata = connection.create_objects([_serialize_object(o) for o in objects_to_create])
-            for md, obj in zip(metadata, objects_to_create):
-                obj.metadata = md
+            _write(connection.create_objects, objects_to_create)
+
+        connection.make_pending_versions()
 
         for o in objects:
             post_save.send(sender=o.__class__, instance=o, created=None, raw=False, using='repository', update_fields=None)
 
     def update(self, obj, fetch_child_metadata=True):
+        # the object must be fetched from the server, not taken from the identity map
+        self.connection.invalidate_cached([obj.id])
         return self.get_query().fetch_child_metadata(fetch_child_metadata).get(pk=obj.id)
 
     def get_bitstream(self, obj):
@@ -119,22 +146,19 @@ class FedoraManager:
         :param obj:     the object
         :return:        TypedStream with object's data
         """
+        return TypedStream(self.connection.get_bitstream(obj.id),
+                           mimetype=get_bitstream_mimetype(obj),
+                           filename=get_bitstream_filename(obj))
 
-        def get_mimetype(fedora_object):
-            ret = fedora_object[EBUCORE.hasMimeType]
-            if ret:
-                return ret[0].value
-            return 'application/binary'
-
-        def get_filename(fedora_object):
-            ret = fedora_object[EBUCORE.filename]
-            if ret:
-                return ret[0].value
-            return None
+    def open_bitstream(self, obj, headers=None):
+        """
+        Starts downloading a bitstream associated with the object
 
-        return TypedStream(self.connection.get_bitstream(obj.id),
-                           mimetype=get_mimetype(obj),
-                           filename=get_filename(obj))
+        :param obj:     the object
+        :param headers: additional request headers (Range, If-None-Match, ...)
+        :return:        streamed requests.Response, caller is responsible for closing it
+        """
+        return self.connection.open_bitstream(obj.id, headers)
 
     def construct(self, rdf_metadata):
         """
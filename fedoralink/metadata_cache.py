@@ -0,0 +1,188 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import rdflib
+
+
+def _copy_graph(graph):
+    ret = rdflib.Graph()
+    ret += graph
+    return ret
+
+
+class CachedMetadata:
+    """
+    Metadata of a resource stored in a MetadataCache together with the validators returned by the server
+    """
+
+    def __init__(self, etag, last_modified, graph=None, serialized=None):
+        """
+        :param etag:            ETag header of the response
+        :param last_modified:   Last-Modified header of the response
+        :param graph:           rdflib.Graph with the metadata, not shared with anyone else
+        :param serialized:      the graph serialized in N-Triples if graph is not given
+        """
+        self.etag          = etag
+        self.last_modified = last_modified
+        self.__graph       = graph
+        self.__serialized  = serialized
+
+    def to_graph(self):
+        """
+        :return: new rdflib.Graph with the cached metadata that can be freely modified by the caller
+        """
+        if self.__graph is not None:
+            return _copy_graph(self.__graph)
+        graph = rdflib.Graph()
+        graph.parse(data=self.__serialized, format='nt')
+        return graph
+
+
+class MetadataCache:
+    """
+    Cache of metadata fetched by FedoraConnection.get_object, shared by all threads and requests. Entries are
+    stored by url of the resource and a key (the principal and fetch_child_metadata flag). The cached metadata
+    are always revalidated with the server via If-None-Match/If-Modified-Since, so they are used only if
+    the server returns 304 Not Modified. Metadata with embedded children are not cached, as their ETag does not
+    change when the children change.
+    """
+
+    def get(self, url, key):
+        """
+        :param url:     url of the resource
+        :param key:     key within the url
+        :return:        CachedMetadata or None
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def put(self, url, key, etag, last_modified, graph):
+        """
+        Stores metadata of a resource
+
+        :param url:             url of the resource
+        :param key:             key within the url
+        :param etag:            ETag header of the response
+        :param last_modified:   Last-Modified header of the response
+        :param graph:           rdflib.Graph with the metadata. The cache keeps its own copy
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def invalidate(self, url, subtree=False):
+        """
+        Forgets the metadata of the resource and of its parent (whose metadata contain the resource as a child)
+
+        :param url:         url of the resource
+        :param subtree:     if True, forget also all resources below the resource if the cache supports it
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    @staticmethod
+    def _normalize(url):
+        return str(url).rstrip('/')
+
+
+class LocalMetadataCache(MetadataCache):
+    """
+    In-process cache keeping parsed metadata of at most max_size least recently used resources
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, url, key):
+        url = self._normalize(url)
+        with self.__lock:
+            entries = self.__entries.get(url)
+            if entries is None:
+                return None
+            self.__entries.move_to_end(url)
+            return entries.get(key)
+
+    def put(self, url, key, etag, last_modified, graph):
+        if not etag and not last_modified:
+            return
+        cached = CachedMetadata(etag, last_modified, graph=_copy_graph(graph))
+        url = self._normalize(url)
+        with self.__lock:
+            self.__entries.setdefault(url, {})[key] = cached
+            self.__entries.move_to_end(url)
+            while len(self.__entries) > self.max_size:
+                self.__entries.popitem(last=False)
+
+    def invalidate(self, url, subtree=False):
+        url = self._normalize(url)
+        with self.__lock:
+            self.__entries.pop(url, None)
+            self.__entries.pop(url.rsplit('/', 1)[0], None)
+            if subtree:
+                prefix = url + '/'
+                for entry_url in [x for x in self.__entries if x.startswith(prefix)]:
+                    del self.__entries[entry_url]
+
+
+class DjangoMetadataCache(MetadataCache):
+    """
+    Cache storing metadata in a django cache (CACHES setting), so that it can be shared by more processes.
+    Metadata are stored serialized in N-Triples and are parsed on each hit. All entries of a resource (for all
+    principals) are stored under a single cache key, so that invalidation removes all of them. Subtrees are not
+    invalidated, resources that do not exist any more are removed when the server returns an error.
+    """
+
+    KEY_PREFIX = 'fedoralink.metadata:'
+
+    def __init__(self, cache_name, timeout=None):
+        """
+        :param cache_name:  name of the cache in django CACHES
+        :param timeout:     timeout of the cached entries in seconds, None to use the default of the cache
+        """
+        self.cache_name = cache_name
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        from django.core.cache import caches
+        return caches[self.cache_name]
+
+    def _cache_key(self, url):
+        return DjangoMetadataCache.KEY_PREFIX + hashlib.sha1(self._normalize(url).encode('utf-8')).hexdigest()
+
+    def get(self, url, key):
+        entries = self.cache.get(self._cache_key(url))
+        if not entries or key not in entries:
+            return None
+        etag, last_modified, serialized = entries[key]
+        return CachedMetadata(etag, last_modified, serialized=serialized)
+
+    def put(self, url, key, etag, last_modified, graph):
+        if not etag and not last_modified:
+            return
+        cache_key = self._cache_key(url)
+        cache = self.cache
+        entries = cache.get(cache_key) or {}
+        entries[key] = (etag, last_modified, graph.serialize(format='nt'))
+        if self.timeout is None:
+            cache.set(cache_key, entries)
+        else:
+            cache.set(cache_key, entries, self.timeout)
+
+    def invalidate(self, url, subtree=False):
+        url = self._normalize(url)
+        self.cache.delete_many([self._cache_key(url), self._cache_key(url.rsplit('/', 1)[0])])
+
+
+def create_metadata_cache(settings_dict):
+    """
+    Creates the cache configured in METADATA_CACHE of the connection settings
+
+    :param settings_dict:   settings of the connection (DATABASES[alias])
+    :return:                MetadataCache or None if caching is not configured
+    """
+    cache = settings_dict.get('METADATA_CACHE', None)
+    if not cache:
+        return None
+    if cache == 'local':
+        return LocalMetadataCache(settings_dict.get('METADATA_CACHE_SIZE', 1000))
+    return DjangoMetadataCache(cache, settings_dict.get('METADATA_CACHE_TIMEOUT', None))
@@ -1,6 +1,8 @@
 import threading
 from urllib.parse import quote_plus
 
+from fedoralink.identity_map import IdentityMap, identity_map_local
+
 
 class FedoraUserDelegationMiddleware:
 
@@ -71,3 +73,16 @@ class FedoraProfillingMiddleware:
     def profilling_enabled():
         return hasattr(FedoraProfillingMiddleware.thread_local_storage, 'profiling_enabled') and \
                FedoraProfillingMiddleware.thread_local_storage.profiling_enabled
+
+
+class FedoraIdentityMapMiddleware:
+    """
+    Within a request, each resource is fetched from Fedora only once, see fedoralink.identity_map.identity_map
+    """
+
+    def process_request(self, request):
+        identity_map_local.identity_map = IdentityMap()
+
+    def process_response(self, request, response):
+        identity_map_local.identity_map = None
+        return response
@@ -3,7 +3,6 @@ import logging
 
 import django.dispatch
 import rdflib
-from io import BytesIO
 
 from django.apps import apps
 from rdflib import Literal
@@ -287,8 +286,12 @@ class FedoraObject(metaclass=FedoraObjectMetaclass):
         """
         Fetches new data from server and overrides this object's metadata with them
         """
+        # fields import fedoralink.forms which imports this module
+        from .indexer.fields import invalidate_field_values
+
         self.metadata = getattr(type(self), 'objects').update(self, fetch_child_metadata).metadata
         self.__is_incomplete = False
+        invalidate_field_values(self)
 
     def set_acl(self, acl_collection):
         if isinstance(acl_collection, str):
@@ -330,16 +333,17 @@ class FedoraObject(metaclass=FedoraObjectMetaclass):
 
 
 class UploadedFileStream:
+    """
+    Stream reading directly from django's UploadedFile (for large files its temporary file on disk)
+    """
 
     def __init__(self, file):
         self.file = file
-        self.content = BytesIO()
-        for c in self.file.chunks():
-            self.content.write(c)
-        self.content.seek(0)
+        self.size = file.size
+        self.file.seek(0)
 
-    def read(self):
-        return self.content.read()
+    def read(self, size=-1):
+        return self.file.read(size)
 
     def close(self):
         pass
@@ -0,0 +1,34 @@
+from django.core.paginator import Paginator, PageNotAnInteger
+
+from fedoralink.query import LazyFedoraQuery
+
+
+class FedoraPaginator(Paginator):
+    """
+    Paginator for LazyFedoraQuery. The objects on the page, the total count and the facets of the query
+    (query.facets) are all taken from a single call to the indexer. Django's Paginator would call the indexer
+    once for count() and once more for the page slice.
+    """
+
+    def page(self, number):
+        if not isinstance(self.object_list, LazyFedoraQuery):
+            return super().page(number)
+
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+
+        data = []
+        if number >= 1:
+            bottom = (number - 1) * self.per_page
+            # the orphans might be added to the last page, fetch them as well
+            data = self.object_list.execute_slice(bottom, bottom + self.per_page + self.orphans)
+
+        # count is now known without calling the indexer again
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        return self._get_page(data[:top - bottom], number, self)
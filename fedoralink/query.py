@@ -27,6 +27,9 @@ class LazyFedoraQuery:
         self.__request_facets = None
         self.__orderby = None
         self.__values = None
+        self.__values_list = None
+        self.__prefetch_linked = None
+        self.__sliced_data = None
         self.model = manager._model_class
         self.model.DoesNotExist = DoesNotExist
 
@@ -39,8 +42,12 @@ class LazyFedoraQuery:
         :raise MultipleObjectsReturned   if multiple objects would have been returned
         :raise DoesNotExist              if there is no such object
         """
-        query = self.filter(**kwargs)
-        answer = query.execute()
+        # within fedoralink.identity_map.identity_map block the metadata are fetched only once
+        # (see FedoraConnection.get_object), each call still returns a new instance
+        return self.filter(**kwargs)._get_single()
+
+    def _get_single(self):
+        answer = self.execute()
         ret = None
         for a in answer:
             if ret is None:
@@ -150,7 +157,18 @@ class LazyFedoraQuery:
             ret.__end   = item + 1
         return ret
 
+    def __copy__(self):
+        ret = self.__class__.__new__(self.__class__)
+        ret.__dict__.update(self.__dict__)
+        # the copy is usually further filtered, so it can not reuse the results of a slice of this query
+        ret.__sliced_data = None
+        return ret
+
     def count(self):
+        if self.__executed_data is not None:
+            return self.__executed_data.count()
+        if self.__sliced_data is not None:
+            return self.__sliced_data.count()
         return self[0:0].execute().count()
 
     def first(self):
@@ -167,6 +185,8 @@ class LazyFedoraQuery:
 
     @property
     def facets(self):
+        if self.__sliced_data is not None and self.__executed_data is None:
+            return self.__sliced_data.facets
         if self.__executed_data or self.__end is not None:
             return self.execute().facets
         else:
@@ -190,7 +210,8 @@ class LazyFedoraQuery:
                 raise Exception('values() are not yet implemented on .get(pk=)/.filter(pk=)')
 
             self.__executed_data = QueryData(self.manager, 1, [(x, {}) for x in self.current_connection.get_object(repository_pk,
-                                                fetch_child_metadata=self.__fetch_child_metadata)])
+                                                fetch_child_metadata=self.__fetch_child_metadata)],
+                                             prefetch_linked=self.__prefetch_linked)
         else:
             # call search engine
             search_response = self.manager.get_indexer(self.__using).search(self.__filter_set,
@@ -200,18 +221,109 @@ class LazyFedoraQuery:
                                                                             self.__orderby,
                                                                             self.__values)
 
+            data = search_response['data']
+            if self.__values is not None and self.__values_list is not None:
+                data = self._to_values_list(data)
+
             self.__executed_data = QueryData(self.manager, search_response['count'],
-                                             search_response['data'], incomplete=True,
+                                             data, incomplete=True,
                                              facets = search_response['facets'],
-                                             values=self.__values)
+                                             values=self.__values,
+                                             prefetch_linked=self.__prefetch_linked)
 
         return self.__executed_data
 
+    def iterator(self, chunk_size=1000):
+        """
+        Iterates over all objects matching the query, regardless of their number. Objects are fetched from the
+        indexer in chunks of chunk_size and constructed only when the iteration reaches their chunk, so that
+        the whole result set is never held in memory. Slicing of the query is ignored.
+
+        :param chunk_size:  number of objects fetched from the indexer at once
+        :return:            generator of objects
+        """
+        repository_pk = self._get_repository_pk()
+        if repository_pk is not None and not self.__force_via_indexer:
+            yield from self.execute()
+            return
+
+        for chunk in self.manager.get_indexer(self.__using).iterate(self.__filter_set, self.model,
+                                                                    self.__orderby, chunk_size):
+            yield from QueryData(self.manager, None, chunk, incomplete=True, prefetch_linked=self.__prefetch_linked)
+
+    def execute_slice(self, start, end):
+        """
+        Executes the query for objects [start:end] with a single call to the indexer. The response contains also
+        the total count and facets of the whole query, they are remembered so that subsequent count() and facets
+        of this query do not call the indexer again. Used by FedoraPaginator.
+
+        :param start:   index of the first object
+        :param end:     index after the last object
+        :return:        QueryData with the objects in the slice
+        """
+        self.__sliced_data = self[start:end].execute()
+        return self.__sliced_data
+
+    def prefetch_linked(self, *field_names):
+        """
+        When the query is executed, objects referenced by the given IndexedLinkedFields are resolved for all
+        returned objects at once (see fedoralink.indexer.fields.prefetch_linked) instead of one Fedora request
+        each time a field is read.
+
+        :param field_names: names of IndexedLinkedFields of the queried model
+        :return:            new query
+        """
+        from fedoralink.indexer.fields import IndexedLinkedField
+
+        fields = []
+        for name in field_names:
+            field = None
+            for fld in self.model._meta.fields:
+                if fld.name == name:
+                    field = fld
+                    break
+            if not isinstance(field, IndexedLinkedField):
+                raise AttributeError('%s is not a linked field of %s' % (name, self.model))
+            fields.append(field)
+
+        ret = copy.copy(self)
+        ret.__prefetch_linked = (self.__prefetch_linked or ()) + tuple(fields)
+        return ret
+
     def values(self, *_values):
+        """
+        The query will return dictionaries field name -> value instead of objects. Only the requested fields
+        are fetched from the indexer.
+
+        :param _values: names of the fields, field@lang selects a single language of a multi-lang field
+        :return:        new query
+        """
         ret = copy.copy(self)
         ret.__values = _values
+        ret.__values_list = None
+        return ret
+
+    def values_list(self, *_values, flat=False):
+        """
+        Same as values(), but the query returns tuples of values in the order of the requested fields.
+
+        :param _values: names of the fields
+        :param flat:    if True, return the values themselves instead of 1-tuples. Only one field can be requested
+        :return:        new query
+        """
+        if flat and len(_values) != 1:
+            raise TypeError('values_list() with flat=True can be called only with a single field')
+        ret = self.values(*_values)
+        ret.__values_list = flat
         return ret
 
+    def _to_values_list(self, data):
+        for row in data:
+            if self.__values_list:
+                yield row[self.__values[0]]
+            else:
+                yield tuple(row[v] for v in self.__values)
+
     def _get_repository_pk(self):
         """
         Internal method. If the query contains only pk, returns it (can call repository directly), otherwise
@@ -258,33 +370,70 @@ class MultipleObjectsReturned(Exception):
 
 
 class QueryData:
+    """
+    Result of an executed query. Keeps the raw data returned from the repository or the indexer
+    and constructs the model instances only when they are accessed (by index, slice or iteration).
+    """
 
-    def __init__(self, manager, count, raw_data, incomplete=False, facets=None, values=None):
+    def __init__(self, manager, count, raw_data, incomplete=False, facets=None, values=None, prefetch_linked=None):
         if not facets:
             facets = {}
         self.manager   = manager
         self._count    = count
         self._incomplete = incomplete
         self.facets = facets
-        self.data = []
-        if values is None:
-            for x in raw_data:
-                d = self._construct(x[0])
-                d._highlighted = x[1]
-                self.data.append(d)
-        else:
-            self.data.extend(raw_data)
+        self._values = values
+        # list of (metadata, highlighted) tuples or, for values() queries, the values themselves
+        self._raw_data = list(raw_data)
+        self._constructed = [None] * len(self._raw_data)
+        self._prefetch_linked = prefetch_linked
 
     def _construct(self, x):
         x = self.manager.construct(x)
         x.is_incomplete = self._incomplete
         return x
 
+    def _get(self, index):
+        if self._values is not None:
+            return self._raw_data[index]
+        if self._prefetch_linked:
+            self._prefetch()
+        ret = self._constructed[index]
+        if ret is None:
+            raw = self._raw_data[index]
+            ret = self._construct(raw[0])
+            ret._highlighted = raw[1]
+            self._constructed[index] = ret
+        return ret
+
+    def _prefetch(self):
+        # linked objects are resolved for all items at once, so all of them must be constructed
+        from fedoralink.indexer.fields import prefetch_linked
+
+        fields = self._prefetch_linked
+        self._prefetch_linked = None
+        instances = [self._get(i) for i in range(len(self._raw_data))]
+        prefetch_linked(instances, fields)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._get(i) for i in range(*item.indices(len(self._raw_data)))]
+        if item < 0:
+            item += len(self._raw_data)
+        if not 0 <= item < len(self._raw_data):
+            raise IndexError('QueryData index out of range')
+        return self._get(item)
+
+    @property
+    def data(self):
+        return self[:]
+
     def __iter__(self):
-        return iter(self.data)
+        for i in range(len(self._raw_data)):
+            yield self._get(i)
 
     def count(self):
         return self._count
 
     def __len__(self):
-        return len(self.data)
\ No newline at end of file
+        return len(self._raw_data)
@@ -9,50 +9,51 @@ from .fedorans import NAMESPACES, RDF, FEDORA
 log = logging.getLogger('fedoralink.rdfmetadata')
 
 
-class RDFMetadata:
-    """
-    Represents a rdf:Description within a rdf:RDF
-    """
+# namespaces from fedorans.NAMESPACES, bound to each graph created by _new_graph
+_NAMESPACE_BINDINGS = tuple((k, rdflib.URIRef(v)) for k, v in NAMESPACES.items())
 
-    def __init__(self, self_id, metadata=None):
-        """
-        the metadata element might contains descriptions about more elements than this.
-         self_id is used to filter out the triplets with subject=self_id
 
-        :param self_id:     will look for rdf:about with this id
-        :param metadata:    instance of rdflib.Graph
-        """
-        self.__id = rdflib.term.URIRef(self_id)
-
-        if metadata is None:
-            metadata = rdflib.Graph()
-        else:
-            if not len(list(metadata[self.__id])):
-                if self_id.endswith('/'):
-                    test_id = self_id[:-1]
-                else:
-                    test_id = self_id + '/'
-                test_id = rdflib.term.URIRef(test_id)
+def _new_graph():
+    """
+    Creates an empty graph with namespaces from fedorans.NAMESPACES. The namespaces are bound directly in the
+    graph's store, which is much cheaper than rdflib.Graph.bind. Each graph has its own bindings, so that
+    prefixes generated during serialization of one graph do not leak to the others.
+    """
+    graph = rdflib.Graph()
+    for prefix, namespace in _NAMESPACE_BINDINGS:
+        graph.store.bind(prefix, namespace)
+    return graph
 
-                if len(list(metadata[test_id])):
-                    self.__id = test_id
-                else:
-                    log.warning('Strange thing happened - REST call did not return metadata for %s', self.id)
 
-        for k, v in NAMESPACES.items():
-            metadata.bind(k, rdflib.URIRef(v), override=False)
+class BaseRDFMetadata:
+    """
+    Common part of RDFMetadata and CompactRDFMetadata: tracking of added/removed triplets, etag and version.
+    Subclasses implement the storage of the triplets with subject=id.
+    """
 
-        self.__metadata = metadata
+    __slots__ = ('_id', '_added_triplets', '_removed_triplets', '_etag', '_version')
 
-        self.__added_triplets    = {}
-        self.__removed_triplets  = {}
+    def __init__(self, self_id):
+        self._id = rdflib.term.URIRef(self_id)
+        self._added_triplets    = {}
+        self._removed_triplets  = {}
+        self._etag = None
+        self._version = 0
 
     @property
     def id(self):
         """
         Identifier (URL) of resource that has these metadata
         """
-        return self.__id
+        return self._id
+
+    @property
+    def version(self):
+        """
+        Counter incremented on each change of the metadata. Used to invalidate values derived from the metadata,
+        such as converted values of model fields. Changes made directly on rdf_metadata are not counted.
+        """
+        return self._version
 
     def set_id(self, id):
         """
@@ -62,11 +63,41 @@ class RDFMetadata:
         :param id: the new id
         """
         id = rdflib.term.URIRef(id)
-        for p, o in self.__metadata[self.__id]:
-            # change the subject of the triplet
-            self.__metadata.remove((self.__id, p, o))
-            self.__metadata.add((id, p, o))
-        self.__id = id
+        self._change_subject(id)
+        self._id = id
+        self._version += 1
+
+    @property
+    def etag(self):
+        """
+        ETag of the resource as returned by the server when the metadata were fetched or saved, None if not known
+        """
+        return self._etag
+
+    @etag.setter
+    def etag(self, etag):
+        self._etag = etag
+
+    def mark_as_saved(self, etag=None, server_managed=None):
+        """
+        Called after the metadata were written to the server. Forgets the tracked changes so that next
+        serialize_sparql() contains only changes made after the save.
+
+        :param etag:            ETag returned by the server
+        :param server_managed:  dictionary predicate -> list of values that the server generated (for example
+                                fedora:lastModified). These replace the current values and are not tracked
+                                as changes
+        """
+        self._added_triplets   = {}
+        self._removed_triplets = {}
+        self._etag = etag
+        if server_managed:
+            for predicate, values in server_managed.items():
+                for value in list(self._values(predicate)):
+                    self._remove_value(predicate, value)
+                for value in values:
+                    self._add_value(predicate, value)
+            self._version += 1
 
     def add(self, predicate, value):
         """
@@ -75,13 +106,11 @@ class RDFMetadata:
         :param predicate:   the predicate
         :param value:       the value, must be rdflib.URIRef or rdflib.Literal
         """
-        self.__add_to_metadata_only(predicate, value)
-        if predicate not in self.__added_triplets:
-            self.__added_triplets[predicate] = []
-        self.__added_triplets[predicate].append(value)
-
-    def __add_to_metadata_only(self, predicate, value):
-        self.__metadata.add((self.__id, predicate, value))
+        self._add_value(predicate, value)
+        self._version += 1
+        if predicate not in self._added_triplets:
+            self._added_triplets[predicate] = []
+        self._added_triplets[predicate].append(value)
 
     def add_type(self, a_type):
         """
@@ -91,33 +120,13 @@ class RDFMetadata:
         """
         self.add(RDF.type, a_type)
 
-    def clone_for(self, uri):
-        """
-        Extract all triplets with subject equal to the given uri and return instance
-        of RDFMetadata(uri, selected_triplets)
-
-        :param uri: uri to search for in subjects
-        :return:    new RDFMetadata
-        """
-        uriref = rdflib.term.URIRef(uri)
-        ret = RDFMetadata(uri, None) # TODO: add metadata from self
-        for fact in self.__metadata[uriref:]:
-            ret.__add_to_metadata_only(*fact)
-        # the parent uri is not present, so add it ...
-        ret.add(FEDORA.hasParent, self.id)
-        return ret
-
     def has_type(self, a_type):
         """
         Checks if this metadata contain the given rdf type
         :param a_type: rdflib.URIRef with the type
         :return: True if the metadata contain the type
         """
-        types = self.__metadata.objects(self.__id, RDF.type)
-        for t in types:
-            if a_type == t:
-                return True
-        return False
+        return a_type in self._values(RDF.type)
 
     def __getitem__(self, predicate):
         """
@@ -129,7 +138,7 @@ class RDFMetadata:
         if not isinstance(predicate, rdflib.term.URIRef):
             raise TypeError('Predicate must be an instance of URiRef')
 
-        return list(self.__metadata.objects(self.__id, predicate))
+        return list(self._values(predicate))
 
     def __setitem__(self, predicate, value):
         """
@@ -151,49 +160,245 @@ class RDFMetadata:
             elif not isinstance(it, rdflib.URIRef):
                 raise Exception("Expected only Literal or URIRef or a list of these types")
 
-        self.__delete_predicate(predicate,set(value))
-        existing_values = set(self[predicate])
+        self.__delete_predicate(predicate, set(value))
+        existing_values = set(self._values(predicate))
         added = []
         for v in value:
             if v not in existing_values:
-                self.__metadata.add((self.__id, predicate, v))
+                self._add_value(predicate, v)
+                existing_values.add(v)
                 added.append(v)
+        self._version += 1
         if added:
-            self.__added_triplets[predicate] = added
+            self._added_triplets[predicate] = added
 
     def __delitem__(self, predicate):
         self.__delete_predicate(predicate)
 
-    def __delete_predicate(self, predicate, ignored_values = None):
+    def __delete_predicate(self, predicate, ignored_values=None):
         removed = []
         if ignored_values is None:
             ignored_values = set()
         for val in self[predicate]:
             if val not in ignored_values:
                 removed.append(val)
-                self.__metadata.remove((self.__id, predicate, val))
-        if predicate not in self.__removed_triplets:
-            self.__removed_triplets[predicate] = removed
-        if predicate in self.__added_triplets:
-            self.__added_triplets[predicate]=[x for x in self.__added_triplets[predicate] if x not in ignored_values]
-            if not self.__added_triplets[predicate]:
-                del self.__added_triplets[predicate]
+                self._remove_value(predicate, val)
+        self._version += 1
+        if predicate not in self._removed_triplets:
+            self._removed_triplets[predicate] = removed
+        if predicate in self._added_triplets:
+            self._added_triplets[predicate]=[x for x in self._added_triplets[predicate] if x not in ignored_values]
+            if not self._added_triplets[predicate]:
+                del self._added_triplets[predicate]
 
     def __contains__(self, predicate):
-        return len(self[predicate]) > 0        # TODO: optimize this
+        return len(self._values(predicate)) > 0
 
     def __str__(self):
-        return self.__metadata.serialize(format='turtle').decode('utf-8')
+        return self.rdf_metadata.serialize(format='turtle').decode('utf-8')
 
     def serialize_sparql(self):
         stream = BytesIO()
-        serializer = SparqlSerializer(self.__metadata, self.__removed_triplets, self.__added_triplets)
+        serializer = SparqlSerializer(self.rdf_metadata, self._removed_triplets, self._added_triplets)
         serializer.serialize(stream)
         return stream.getvalue()
 
+    def copy(self):
+        """
+        :return: new metadata of the same class with the same triplets, tracked changes and etag. Changes made
+                 to the copy do not affect this instance and vice versa
+        """
+        ret = self._copy_triplets()
+        ret._added_triplets = {k: list(v) for k, v in self._added_triplets.items()}
+        ret._removed_triplets = {k: list(v) for k, v in self._removed_triplets.items()}
+        ret._etag = self._etag
+        return ret
+
+    @property
+    def rdf_metadata(self):
+        """
+        rdflib.Graph with the metadata
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def _copy_triplets(self):
+        """
+        :return: new instance with a copy of the stored triplets
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def _values(self, predicate):
+        """
+        :param predicate:   the predicate
+        :return:            iterable of values of the predicate (with subject=id)
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def _add_value(self, predicate, value):
+        """
+        Stores the triplet (id, predicate, value) without tracking it as a change
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def _remove_value(self, predicate, value):
+        """
+        Removes the triplet (id, predicate, value) without tracking it as a change
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+    def _change_subject(self, id):
+        """
+        Moves all triplets with subject=id to the new id
+
+        :param id: the new id, rdflib.URIRef
+        """
+        raise Exception("Please reimplement this method in inherited classes")
+
+
+class RDFMetadata(BaseRDFMetadata):
+    """
+    Represents a rdf:Description within a rdf:RDF
+    """
+
+    def __init__(self, self_id, metadata=None):
+        """
+        the metadata element might contains descriptions about more elements than this.
+         self_id is used to filter out the triplets with subject=self_id
+
+        :param self_id:     will look for rdf:about with this id
+        :param metadata:    instance of rdflib.Graph
+        """
+        super().__init__(self_id)
+
+        if metadata is None:
+            metadata = _new_graph()
+        else:
+            if not len(list(metadata[self._id])):
+                if self_id.endswith('/'):
+                    test_id = self_id[:-1]
+                else:
+                    test_id = self_id + '/'
+                test_id = rdflib.term.URIRef(test_id)
+
+                if len(list(metadata[test_id])):
+                    self._id = test_id
+                else:
+                    log.warning('Strange thing happened - REST call did not return metadata for %s', self.id)
+
+            for k, v in NAMESPACES.items():
+                metadata.bind(k, rdflib.URIRef(v), override=False)
+
+        self.__metadata = metadata
+
+    def clone_for(self, uri):
+        """
+        Extract all triplets with subject equal to the given uri and return instance
+        of RDFMetadata(uri, selected_triplets)
+
+        :param uri: uri to search for in subjects
+        :return:    new RDFMetadata
+        """
+        uriref = rdflib.term.URIRef(uri)
+        ret = RDFMetadata(uri, None) # TODO: add metadata from self
+        for fact in self.__metadata[uriref:]:
+            ret._add_value(*fact)
+        # the parent uri is not present, so add it ...
+        ret.add(FEDORA.hasParent, self.id)
+        return ret
 
     @property
     def rdf_metadata(self):
         return self.__metadata
 
+    def _copy_triplets(self):
+        ret = RDFMetadata(self._id)
+        ret.__metadata += self.__metadata
+        return ret
+
+    def _values(self, predicate):
+        return list(self.__metadata.objects(self._id, predicate))
+
+    def _add_value(self, predicate, value):
+        self.__metadata.add((self._id, predicate, value))
+
+    def _remove_value(self, predicate, value):
+        self.__metadata.remove((self._id, predicate, value))
+
+    def _change_subject(self, id):
+        for p, o in self.__metadata[self._id]:
+            # change the subject of the triplet
+            self.__metadata.remove((self._id, p, o))
+            self.__metadata.add((id, p, o))
+
+
+class CompactRDFMetadata(BaseRDFMetadata):
+    """
+    Metadata of a single resource (triplets with subject=id only) backed by a dictionary predicate -> values.
+    Has the same interface as RDFMetadata, but predicate lookups are O(1) and rdflib.Graph is created only
+    when rdf_metadata (or serialization) is requested. Use it for resources constructed from the indexer,
+    where there is no need to keep metadata of other subjects (such as embedded children).
+    """
+
+    __slots__ = ('__data', '__graph')
+
+    def __init__(self, self_id, data=None):
+        """
+        :param self_id:     id (URL) of the resource
+        :param data:        dictionary predicate -> list of values (rdflib.URIRef or rdflib.Literal)
+        """
+        super().__init__(self_id)
+        self.__data = {}
+        self.__graph = None
+        if data:
+            for predicate, values in data.items():
+                for value in values:
+                    self._add_value(predicate, value)
+
+    def clone_for(self, uri):
+        """
+        Compact metadata contain only triplets of this resource, so the returned metadata have only
+        FEDORA.hasParent set to this resource
+
+        :param uri: uri of the new resource
+        :return:    new CompactRDFMetadata
+        """
+        ret = CompactRDFMetadata(uri)
+        ret.add(FEDORA.hasParent, self.id)
+        return ret
+
+    @property
+    def rdf_metadata(self):
+        if self.__graph is None:
+            graph = _new_graph()
+            for predicate, values in self.__data.items():
+                for value in values:
+                    graph.add((self._id, predicate, value))
+            self.__graph = graph
+        return self.__graph
+
+    def _copy_triplets(self):
+        ret = CompactRDFMetadata(self._id)
+        ret.__data = {k: list(v) for k, v in self.__data.items()}
+        return ret
 
+    def _values(self, predicate):
+        return self.__data.get(predicate, ())
+
+    def _add_value(self, predicate, value):
+        values = self.__data.setdefault(predicate, [])
+        if value not in values:
+            values.append(value)
+            if self.__graph is not None:
+                self.__graph.add((self._id, predicate, value))
+
+    def _remove_value(self, predicate, value):
+        values = self.__data.get(predicate)
+        if values and value in values:
+            values.remove(value)
+            if not values:
+                del self.__data[predicate]
+            if self.__graph is not None:
+                self.__graph.remove((self._id, predicate, value))
+
+    def _change_subject(self, id):
+        self.__graph = None
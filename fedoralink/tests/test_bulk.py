@@ -0,0 +1,105 @@
+import django
+import rdflib
+from rdflib import Literal, URIRef
+from rdflib.namespace import XSD
+
+from unittest import TestCase
+
+from fedoralink.fedorans import FEDORA, LDP, RDF
+from fedoralink.indexer.bulk import BulkReindexer
+from fedoralink.rdfmetadata import RDFMetadata
+
+django.setup()
+
+BASE = 'http://localhost:8080/rest/'
+
+
+class FakeObject:
+    def __init__(self, metadata):
+        self.metadata = metadata
+        self.id = str(metadata.id)
+
+    def __getitem__(self, predicate):
+        return self.metadata[predicate]
+
+
+class FakeManager:
+    """
+    Repository of resources: id -> (last modified, list of children, is binary)
+    """
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.fetched = []
+
+    def fetch_child_metadata(self, fetch_child_metadata):
+        assert fetch_child_metadata
+        return self
+
+    def get(self, pk):
+        self.fetched.append(pk)
+        graph = rdflib.Graph()
+        self._describe(graph, pk)
+        for child in self.resources[pk][1]:
+            self._describe(graph, child)
+        return FakeObject(RDFMetadata(pk, graph))
+
+    def construct(self, metadata):
+        return FakeObject(metadata)
+
+    def _describe(self, graph, object_id):
+        last_modified, children, binary = self.resources[object_id]
+        subject = URIRef(object_id)
+        graph.add((subject, FEDORA.lastModified, Literal(last_modified, datatype=XSD.dateTime)))
+        if binary:
+            graph.add((subject, RDF.type, FEDORA.Binary))
+        for child in children:
+            graph.add((subject, LDP.contains, URIRef(child)))
+
+
+class FakeIndexer:
+    def __init__(self, changed=None):
+        self.indexed = []
+        self.changed = changed
+        self.compared = {}
+
+    def diff_children(self, parent_id, children_last_modified):
+        self.compared.update(children_last_modified)
+        return [x for x in children_last_modified if x in self.changed], []
+
+    def reindex_bulk(self, objects):
+        self.indexed.extend(obj.id for obj in objects)
+        return []
+
+
+class BulkReindexerTestCase(TestCase):
+
+    def setUp(self):
+        self.manager = FakeManager({
+            BASE + 'root': ('2016-01-01T00:00:00Z', [BASE + 'root/a', BASE + 'root/b', BASE + 'root/d'], False),
+            BASE + 'root/a': ('2016-01-01T00:00:00Z', [], False),
+            BASE + 'root/b': ('2016-01-01T00:00:00Z', [BASE + 'root/b/c'], False),
+            BASE + 'root/b/c': ('2016-01-01T00:00:00Z', [], False),
+            BASE + 'root/d': ('2016-01-01T00:00:00Z', [], True),
+        })
+        self.indexer = FakeIndexer()
+
+    def test_leaves_are_built_from_embedded_metadata(self):
+        reindexer = BulkReindexer(self.manager, self.indexer, batch_size=2, concurrency=2)
+        self.assertEqual(reindexer.reindex(BASE + 'root'), (5, 0))
+
+        # root/a and root/b/c are leaves, root/b is a container and root/d a binary
+        self.assertEqual(sorted(self.manager.fetched), [BASE + 'root', BASE + 'root/b', BASE + 'root/d'])
+        self.assertEqual(sorted(self.indexer.indexed), sorted(self.manager.resources))
+
+    def test_incremental_skips_unchanged_leaves(self):
+        self.indexer.changed = {BASE + 'root/b/c', BASE + 'root/d'}
+        reindexer = BulkReindexer(self.manager, self.indexer, batch_size=2, concurrency=2, incremental=True)
+        self.assertEqual(reindexer.reindex(BASE + 'root'), (3, 0))
+
+        # unchanged root/b is still fetched to find its modified child
+        self.assertEqual(sorted(self.manager.fetched), [BASE + 'root', BASE + 'root/b', BASE + 'root/d'])
+        self.assertEqual(sorted(self.indexer.indexed), [BASE + 'root', BASE + 'root/b/c', BASE + 'root/d'])
+        self.assertEqual(reindexer.skipped, 2)
+        self.assertEqual(self.indexer.compared[BASE + 'root/a'],
+                         [Literal('2016-01-01T00:00:00Z', datatype=XSD.dateTime)])
@@ -0,0 +1,248 @@
+import io
+import threading
+import time
+
+import django
+import rdflib
+from rdflib import Literal, URIRef
+from rdflib.namespace import DC, XSD
+
+from unittest import TestCase, mock
+
+from fedoralink.connection import RDF_FORMATS, FedoraConnection, StaleObjectException, BulkWriteException, VERSIONING_NEVER, VERSIONING_COALESCE, \
+    coalesced_versions
+from fedoralink.authentication.Credentials import Credentials
+from fedoralink.authentication.as_user import as_user, as_delegated_user, fedora_auth_local
+from fedoralink.common_namespaces.dc import DCObject
+from fedoralink.fedorans import FEDORA
+from fedoralink.identity_map import identity_map, get_identity_map
+from fedoralink.indexer.elastic import ElasticIndexer
+from fedoralink.manager import FedoraManager
+from fedoralink.middleware import FedoraUserDelegationMiddleware
+from fedoralink.rdfmetadata import RDFMetadata
+from fedoralink.type_manager import FedoraTypeManager
+
+django.setup()
+
+
+def response(status_code, headers=None):
+    return mock.Mock(status_code=status_code, headers=headers or {}, content=b'')
+
+
+class ConnectionWriteTestCase(TestCase):
+
+    def setUp(self):
+        self.connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER)
+        self.metadata = RDFMetadata('http://localhost:8080/rest/a')
+        self.metadata.add(FEDORA.lastModified, Literal('2016-01-01T00:00:00.123Z', datatype=XSD.dateTime))
+        self.metadata.mark_as_saved('W/"1234"')
+        self.metadata[DC.title] = Literal('title', datatype=XSD.string)
+
+    def test_update_sends_if_match(self):
+        with mock.patch('fedoralink.connection.requests.patch',
+                        return_value=response(204, {'ETag': 'W/"5678"',
+                                                    'Last-Modified': 'Wed, 01 Jun 2016 10:00:00 GMT'})) as patch:
+            written = self.connection.update_objects([{'metadata': self.metadata, 'bitstream': None}])[0]
+
+        self.assertEqual(patch.call_args[1]['headers']['If-Match'], '"1234"')
+        self.assertIs(written, self.metadata)
+        self.assertEqual(written.etag, 'W/"5678"')
+        self.assertEqual(written[FEDORA.lastModified],
+                         [Literal('2016-06-01T10:00:00+00:00', datatype=XSD.dateTime)])
+        self.assertEqual(written[DC.title], [Literal('title', datatype=XSD.string)])
+
+    def test_created_object_is_indexed_with_server_managed_values(self):
+        metadata = RDFMetadata('')
+        metadata.add_type(DC.Object)
+        resp = mock.Mock(status_code=201, text='http://localhost:8080/rest/b',
+                         headers={'ETag': 'W/"1"', 'Last-Modified': 'Wed, 01 Jun 2016 10:00:00 GMT'})
+        with mock.patch('fedoralink.connection.requests.post', return_value=resp):
+            written = self.connection.create_objects([{'metadata': metadata, 'bitstream': None, 'slug': None,
+                                                       'parent': None}])[0]
+
+        obj = FedoraTypeManager.get_object_class(written, DCObject)(__metadata=written,
+                                                                    __connection=self.connection)
+        document = ElasticIndexer.__new__(ElasticIndexer)._build_document(obj)[2]
+        self.assertEqual(document['_fedora_created'], ['2016-06-01T10:00:00'])
+        self.assertEqual(document['_fedora_last_modified'], ['2016-06-01T10:00:00'])
+
+    def test_stale_etag_is_not_overwritten(self):
+        current = RDFMetadata('http://localhost:8080/rest/a')
+        with mock.patch('fedoralink.connection.requests.patch', return_value=response(412)) as patch, \
+                mock.patch.object(self.connection, 'get_object', return_value=iter([current])):
+            with self.assertRaises(StaleObjectException) as ctx:
+                self.connection.update_objects([{'metadata': self.metadata, 'bitstream': None}])
+
+        self.assertEqual(patch.call_count, 1)
+        self.assertIs(ctx.exception.current_metadata, current)
+        # local changes are kept so that they can be applied again
+        self.assertIn(b'title', self.metadata.serialize_sparql())
+
+
+class ConnectionVersioningTestCase(TestCase):
+
+    def test_unknown_versioning_policy(self):
+        with self.assertRaises(ValueError):
+            FedoraConnection('http://localhost:8080/rest', versioning='sometimes')
+
+    def test_coalesced_version_is_made_once_after_writes(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_COALESCE,
+                                      versioning_window=3600)
+        with mock.patch.object(connection, 'make_version') as make_version:
+            connection._version_after_write('http://localhost:8080/rest/a')
+            connection._version_after_write('http://localhost:8080/rest/a')
+            self.assertEqual(make_version.call_count, 0)
+
+            coalesced_versions.flush()
+            self.assertEqual(make_version.call_count, 1)
+            self.assertEqual(make_version.call_args[0][0], 'http://localhost:8080/rest/a')
+
+    def test_coalesced_version_is_made_at_end_of_window(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_COALESCE,
+                                      versioning_window=0.05)
+        made = threading.Event()
+        with mock.patch.object(connection, 'make_version', side_effect=lambda *args: made.set()) as make_version:
+            connection._version_after_write('http://localhost:8080/rest/b')
+            self.assertTrue(made.wait(5))
+        self.assertEqual(make_version.call_count, 1)
+
+    def test_coalesced_version_is_made_on_behalf_of_writer(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_COALESCE,
+                                      versioning_window=3600)
+        made_as = []
+
+        def make_version(*args):
+            made_as.append((fedora_auth_local.Credentials.username,
+                            FedoraUserDelegationMiddleware.get_on_behalf_of(), get_identity_map()))
+
+        with mock.patch.object(connection, 'make_version', side_effect=make_version):
+            with identity_map(), as_user(Credentials('writer', 'secret')), as_delegated_user(['user'], ['group']):
+                connection._version_after_write('http://localhost:8080/rest/c')
+
+            # flushed from another thread (as at exit), after the writing request has ended
+            flush = threading.Thread(target=coalesced_versions.flush)
+            flush.start()
+            flush.join()
+
+        self.assertEqual(made_as, [('writer', ['user'], None)])
+        self.assertIsNone(coalesced_versions._thread)
+
+
+class ConnectionBulkWriteTestCase(TestCase):
+
+    def setUp(self):
+        self.failing = set()
+
+    def write(self, item):
+        # later items finish first when written concurrently
+        time.sleep(0.01 * (3 - item))
+        if item in self.failing:
+            raise ValueError('item %s' % item)
+        return item * 10
+
+    def test_results_keep_order(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER, write_parallelism=3)
+        try:
+            self.assertEqual(connection._write_all(self.write, [0, 1, 2]), [0, 10, 20])
+        finally:
+            connection.close()
+
+    def test_failed_item_raises_bulk_exception(self):
+        self.failing.add(1)
+        for parallelism in (1, 3):
+            connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER,
+                                          write_parallelism=parallelism)
+            try:
+                with self.assertRaises(BulkWriteException) as ctx:
+                    connection._write_all(self.write, [0, 1, 2])
+            finally:
+                connection.close()
+
+            # the other items are written anyway
+            self.assertEqual(ctx.exception.results, [0, None, 20])
+            self.assertEqual([index for index, e in ctx.exception.errors], [1])
+            self.assertIsInstance(ctx.exception.errors[0][1], ValueError)
+
+    def test_single_item_raises_original_exception(self):
+        self.failing.add(1)
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER, write_parallelism=3)
+        with self.assertRaises(ValueError):
+            connection._write_all(self.write, [1])
+
+
+class ConnectionCloseTestCase(TestCase):
+
+    def test_close_shuts_down_executor(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER, write_parallelism=2)
+        self.assertEqual(connection._write_all(lambda x: x, [1, 2]), [1, 2])
+        executor = connection._executor
+        connection.close()
+        self.assertIsNone(connection._executor)
+        self.assertTrue(executor._shutdown)
+
+
+class ConnectionReadTestCase(TestCase):
+
+    def test_metadata_are_parsed_from_stream(self):
+        graph = rdflib.Graph()
+        graph.add((URIRef('http://localhost:8080/rest/a'), DC.title, Literal('title', lang='en')))
+
+        for rdf_format, (mimetype, parser_format) in RDF_FORMATS.items():
+            connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER,
+                                          rdf_format=rdf_format)
+            resp = response(200, {'ETag': 'W/"1"'})
+            resp.raw = io.BytesIO(graph.serialize(format=parser_format))
+            # the payload must not be read into memory
+            type(resp).content = mock.PropertyMock(side_effect=AssertionError('content read'))
+
+            with mock.patch('fedoralink.connection.requests.get', return_value=resp) as get:
+                metadata = list(connection.get_object('a', fetch_child_metadata=False))[0]
+
+            self.assertEqual(get.call_args[1]['headers']['Accept'], mimetype)
+            self.assertTrue(get.call_args[1]['stream'])
+            self.assertEqual(metadata[DC.title], [Literal('title', lang='en')])
+            self.assertEqual(metadata.etag, 'W/"1"')
+
+
+class ConnectionIdentityMapTestCase(TestCase):
+
+    def test_identity_map_returns_copies(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER, rdf_format='nt')
+        data = b'<http://localhost:8080/rest/a> <http://purl.org/dc/elements/1.1/title> "title" .\n'
+
+        def get(*args, **kwargs):
+            resp = response(200, {'ETag': 'W/"1"'})
+            resp.raw = io.BytesIO(data)
+            return resp
+
+        with identity_map(), mock.patch('fedoralink.connection.requests.get', side_effect=get) as get_mock:
+            first = list(connection.get_object('a'))[0]
+            first[DC.title] = Literal('changed', datatype=XSD.string)
+            second = list(connection.get_object('a'))[0]
+
+        self.assertEqual(get_mock.call_count, 1)
+        self.assertIsNot(first, second)
+        self.assertEqual(second[DC.title], [Literal('title')])
+        self.assertEqual(second.etag, 'W/"1"')
+        self.assertNotIn(b'changed', second.serialize_sparql())
+
+    def test_get_returns_new_instances(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER, rdf_format='nt')
+        data = b'<http://localhost:8080/rest/a> <http://purl.org/dc/elements/1.1/title> "title" .\n'
+        manager = FedoraManager(DCObject)
+        manager._default_connection = connection
+
+        def get(*args, **kwargs):
+            resp = response(200, {'ETag': 'W/"1"'})
+            resp.raw = io.BytesIO(data)
+            return resp
+
+        with identity_map(), mock.patch('fedoralink.connection.requests.get', side_effect=get) as get_mock:
+            first = manager.get_query().get(pk='a')
+            first.title = 'changed'
+            second = manager.get_query().get(pk='a')
+
+        self.assertEqual(get_mock.call_count, 1)
+        self.assertIsNot(first, second)
+        self.assertIsNot(first.metadata, second.metadata)
+        self.assertEqual(second.metadata[DC.title], [Literal('title')])
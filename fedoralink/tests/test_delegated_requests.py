@@ -0,0 +1,75 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import django
+
+from unittest import TestCase, mock
+
+from fedoralink.engine import delegated_requests
+from fedoralink.engine.delegated_requests import SessionPool
+from fedoralink.middleware import FedoraUserDelegationMiddleware
+
+django.setup()
+
+
+class CookieHandler(BaseHTTPRequestHandler):
+    """
+    Sets a cookie and remembers the Cookie and On-Behalf-Of headers of each request
+    """
+    received = []
+
+    def do_GET(self):
+        CookieHandler.received.append((self.headers.get('On-Behalf-Of'), self.headers.get('Cookie')))
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'JSESSIONID=%s; Path=/' % self.headers.get('On-Behalf-Of'))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class SessionPoolTestCase(TestCase):
+
+    def test_session_per_thread_and_host(self):
+        pool = SessionPool()
+        session, options = pool.get_session('http://localhost:8080/rest/a')
+        self.assertIs(pool.get_session('http://localhost:8080/rest/b')[0], session)
+        self.assertIsNot(pool.get_session('http://otherhost:8080/rest/a')[0], session)
+
+        other_thread_sessions = []
+        thread = threading.Thread(
+            target=lambda: other_thread_sessions.append(pool.get_session('http://localhost:8080/rest/a')[0]))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other_thread_sessions[0], session)
+
+    def test_timeout_is_injected(self):
+        delegated_requests.configure('http://timeouthost:8080/rest', timeout=[3, 10])
+        with mock.patch('requests.Session.get') as get:
+            delegated_requests.get('http://timeouthost:8080/rest/a')
+            delegated_requests.get(url='http://timeouthost:8080/rest/b', timeout=1)
+        self.assertEqual(get.call_args_list[0][1]['timeout'], (3, 10))
+        self.assertEqual(get.call_args_list[1][1], {'url': 'http://timeouthost:8080/rest/b', 'timeout': 1,
+                                                    'headers': {}})
+
+    def test_cookies_are_not_shared_between_users(self):
+        server = HTTPServer(('127.0.0.1', 0), CookieHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = 'http://127.0.0.1:%s/rest/a' % server.server_port
+        CookieHandler.received = []
+
+        storage = FedoraUserDelegationMiddleware.thread_local_storage
+        storage.fedora_on_behalf_of_groups = []
+        try:
+            for user in ('urn:first', 'urn:second'):
+                storage.fedora_on_behalf_of = [user]
+                delegated_requests.get(url).close()
+        finally:
+            del storage.fedora_on_behalf_of
+            del storage.fedora_on_behalf_of_groups
+
+        self.assertEqual(CookieHandler.received, [('urn:first', None), ('urn:second', None)])
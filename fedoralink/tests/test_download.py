@@ -0,0 +1,40 @@
+import django
+
+from unittest import TestCase, mock
+
+from django.test import RequestFactory, override_settings
+from django.conf import settings
+
+from fedoralink.download import bitstream_response
+from fedoralink.middleware import FedoraUserDelegationMiddleware
+
+django.setup()
+
+
+class OffloadedDownloadTestCase(TestCase):
+
+    def setUp(self):
+        repository = dict(settings.DATABASES['repository'],
+                          DOWNLOAD_OFFLOAD_HEADER='X-Accel-Redirect', DOWNLOAD_OFFLOAD_PREFIX='/fedora-internal/')
+        self.settings = override_settings(DATABASES=dict(settings.DATABASES, repository=repository))
+        self.settings.enable()
+        self.obj = mock.Mock(local_id='a/b')
+        FedoraUserDelegationMiddleware.thread_local_storage.fedora_on_behalf_of = ['urn:example.com/john']
+        FedoraUserDelegationMiddleware.thread_local_storage.fedora_on_behalf_of_groups = \
+            ['urn:django:authenticated', 'urn:django:a+b']
+
+    def tearDown(self):
+        self.settings.disable()
+        del FedoraUserDelegationMiddleware.thread_local_storage.fedora_on_behalf_of
+        del FedoraUserDelegationMiddleware.thread_local_storage.fedora_on_behalf_of_groups
+
+    def test_identity_is_passed_only_in_internal_location(self):
+        with mock.patch('fedoralink.download.get_bitstream_filename', return_value='a.txt'), \
+                mock.patch('fedoralink.download.get_bitstream_mimetype', return_value='text/plain'):
+            resp = bitstream_response(RequestFactory().get('/'), self.obj)
+
+        self.assertEqual(resp['X-Accel-Redirect'],
+                         '/fedora-internal/a/b?on_behalf_of=urn:example.com/john'
+                         '&on_behalf_of_groups=urn:django:authenticated,urn:django:a+b')
+        for header, value in resp.items():
+            self.assertNotIn('On-Behalf-Of', header)
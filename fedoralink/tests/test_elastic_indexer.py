@@ -0,0 +1,149 @@
+import django
+
+from django.db.models import Q
+from django.test.utils import override_settings
+from unittest import TestCase, mock
+
+from fedoralink.common_namespaces.dc import DCObject
+from fedoralink.indexer.elastic import ElasticIndexer
+from fedoralink.utils import url2id, id2url
+
+django.setup()
+
+
+class ElasticValuesTestCase(TestCase):
+
+    def test_build_values(self):
+        fld2id = {'title': '_dc_title', 'title.cs': '_dc_title.cs', 'creator': '_dc_creator'}
+        source_fields = ElasticIndexer._get_source_fields(('pk', 'title', 'title@cs', 'creator'), fld2id)
+        self.assertEqual(list(source_fields.values()), ['_fedora_id', '_dc_title', '_dc_title.cs', '_dc_creator'])
+
+        doc = {
+            '_source': {
+                '_fedora_id': 'http://localhost/a',
+                '_dc_title': {'cs': 'Nazev', 'null': 'Title', 'all': ['Nazev', 'Title']}
+            }
+        }
+        self.assertEqual(ElasticIndexer._build_values(doc, source_fields), {
+            'pk': 'http://localhost/a',
+            'title': {'cs': 'Nazev', None: 'Title'},
+            'title@cs': 'Nazev',
+            'creator': None
+        })
+
+
+class ElasticQueryPlanTestCase(TestCase):
+
+    def setUp(self):
+        self.indexer = ElasticIndexer.__new__(ElasticIndexer)
+        self.model_restriction = {'bool': {'must': [{'bool': {'filter': {'term': {'_fedoralink_model': 'm'}}}}]}}
+
+    def test_terms_are_merged(self):
+        fld2id = {'a': 'f_a'}
+        before = self.indexer._build_query(Q(a='x') | Q(a='y'), fld2id, None)
+        self.assertEqual(before, {'bool': {'should': [
+            {'bool': {'filter': {'term': {'f_a': 'x'}}}},
+            {'bool': {'filter': {'term': {'f_a': 'y'}}}}
+        ]}})
+        self.assertEqual(self.indexer._plan_query(before), {
+            'constant_score': {'filter': {'bool': {'should': [{'terms': {'f_a': ['x', 'y']}}]}}}
+        })
+
+    def test_filters_are_separated_from_fulltext(self):
+        before = {'bool': {'must': [
+            {'bool': {'must': [
+                {'match': {'f_text__fulltext': 'hello'}},
+                {'bool': {'filter': {'term': {'f_b': 'z'}}}},
+                {'range': {'f_a': {'gte': 3}}},
+            ]}},
+            self.model_restriction
+        ]}}
+        self.assertEqual(self.indexer._plan_query(before), {'bool': {
+            'must': [{'bool': {
+                'must': [{'match': {'f_text__fulltext': 'hello'}}],
+                'filter': [{'term': {'f_b': 'z'}}, {'range': {'f_a': {'gte': 3}}}]
+            }}],
+            'filter': [{'term': {'_fedoralink_model': 'm'}}]
+        }})
+
+    def test_match_all_is_constant_score(self):
+        before = {'bool': {'must': [
+            {'bool': {'must': {'match_all': {}}}},
+            self.model_restriction
+        ]}}
+        self.assertEqual(self.indexer._plan_query(before), {
+            'constant_score': {'filter': {'term': {'_fedoralink_model': 'm'}}}
+        })
+
+    def test_negated_fulltext_does_not_score(self):
+        before = {'bool': {'must': [
+            {'bool': {'must_not': {'match': {'f_text__fulltext': 'hello'}}}},
+            self.model_restriction
+        ]}}
+        self.assertEqual(self.indexer._plan_query(before), {'constant_score': {'filter': {'bool': {'filter': [
+            {'bool': {'must_not': {'match': {'f_text__fulltext': 'hello'}}}},
+            {'term': {'_fedoralink_model': 'm'}}
+        ]}}}})
+
+
+class ElasticIterateTestCase(TestCase):
+
+    @staticmethod
+    def hit(index):
+        return {
+            '_source': {'_fedora_id': 'http://localhost/%s' % index, '_fedora_parent': 'http://localhost',
+                        '_fedora_type': []},
+            'sort': ['http://localhost/%s' % index]
+        }
+
+    def test_chunks_are_fetched_with_search_after(self):
+        indexer = ElasticIndexer.__new__(ElasticIndexer)
+        indexer.index_name = 'test'
+        indexer.es = mock.Mock()
+        bodies = []
+
+        def search(index, body):
+            bodies.append(dict(body))
+            start = int(body['search_after'][0].rsplit('/', 1)[1]) + 1 if 'search_after' in body else 0
+            return {'hits': {'hits': [self.hit(i) for i in range(start, min(start + body['size'], 5))]}}
+
+        indexer.es.search.side_effect = search
+        with mock.patch.object(indexer, '_get_field_mappings', return_value=({}, {}, {})), \
+                mock.patch.object(indexer, '_build_search_query', return_value=({'match_all': {}}, [])):
+            chunks = list(indexer.iterate(None, None, None, 2))
+
+        self.assertEqual([[str(metadata.id) for metadata, highlight in chunk] for chunk in chunks],
+                         [['http://localhost/0', 'http://localhost/1'], ['http://localhost/2', 'http://localhost/3'],
+                          ['http://localhost/4']])
+        self.assertNotIn('search_after', bodies[0])
+        self.assertNotIn('from', bodies[0])
+        self.assertEqual([body.get('search_after') for body in bodies[1:]],
+                         [['http://localhost/1'], ['http://localhost/3']])
+        self.assertEqual(bodies[0]['sort'], [{'_fedora_id': {'order': 'asc'}}])
+
+
+class ElasticFieldMappingsTestCase(TestCase):
+
+    def test_ids_are_cached(self):
+        url = 'http://purl.org/dc/elements/1.1/title'
+        url2id.cache_clear()
+        id2url.cache_clear()
+        self.assertEqual(id2url(url2id(url)), url)
+        self.assertEqual(id2url(url2id(url)), url)
+        self.assertEqual(url2id.cache_info().hits, 1)
+        self.assertEqual(id2url.cache_info().hits, 1)
+
+    def test_mappings_are_computed_once_per_model(self):
+        with override_settings(LANGUAGES=(('en', 'English'),)):
+            with mock.patch.object(ElasticIndexer, '_compute_field_mappings',
+                                   wraps=ElasticIndexer._compute_field_mappings) as compute:
+                mappings = ElasticIndexer._get_field_mappings(DCObject)
+                self.assertIs(ElasticIndexer._get_field_mappings(DCObject), mappings)
+                self.assertEqual(compute.call_count, 1)
+                self.assertIn('title@en', mappings[2].values())
+
+        # changed languages invalidate the mappings
+        with override_settings(LANGUAGES=(('cs', 'Czech'),)):
+            mappings = ElasticIndexer._get_field_mappings(DCObject)
+            self.assertIn('title@cs', mappings[2].values())
+            self.assertNotIn('title@en', mappings[2].values())
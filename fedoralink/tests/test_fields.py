@@ -0,0 +1,149 @@
+import django
+from rdflib import Literal, URIRef
+from rdflib.namespace import DC, XSD
+
+from unittest import TestCase, mock
+
+from fedoralink.indexer.fields import IndexedLanguageField, IndexedTextField, IndexedLinkedField, prefetch_linked
+from fedoralink.rdfmetadata import RDFMetadata
+
+django.setup()
+
+
+class Resource:
+    title = IndexedLanguageField(DC.title)
+    subject = IndexedTextField(DC.subject)
+
+    def __init__(self):
+        self.metadata = RDFMetadata('http://localhost/a')
+
+
+Resource.title.instrument(Resource, 'title')
+Resource.subject.instrument(Resource, 'subject')
+
+
+class CachedGetterTestCase(TestCase):
+
+    def setUp(self):
+        self.resource = Resource()
+        self.resource.metadata[DC.title] = Literal('title', lang='en')
+        self.resource.metadata[DC.subject] = Literal('subject', datatype=XSD.string)
+
+    def test_value_is_converted_once(self):
+        with mock.patch.object(IndexedTextField, 'convert_from_rdf', return_value='subject') as convert:
+            self.assertEqual(self.resource.subject, 'subject')
+            self.assertEqual(self.resource.subject, 'subject')
+        self.assertEqual(convert.call_count, 1)
+
+    def test_metadata_change_invalidates_value(self):
+        self.assertEqual(self.resource.subject, 'subject')
+        self.resource.metadata[DC.subject] = Literal('other', datatype=XSD.string)
+        self.assertEqual(self.resource.subject, 'other')
+
+        self.assertEqual(self.resource.title, [Literal('title', lang='en')])
+        self.resource.metadata.add(DC.title, Literal('titul', lang='cs'))
+        self.assertEqual(len(self.resource.title), 2)
+
+    def test_returned_list_is_not_shared(self):
+        title = self.resource.title
+        title.append(Literal('titul', lang='cs'))
+        self.assertEqual(self.resource.title, [Literal('title', lang='en')])
+        self.assertIsNot(self.resource.title, self.resource.title)
+
+
+class Linked:
+
+    def __init__(self, id):
+        self.id = id
+        self.is_incomplete = False
+
+
+class LinkedManager:
+    """
+    Fake manager of the linked model: objects in 'indexed' are returned by the indexer, those in 'stored'
+    only by Fedora
+    """
+
+    def __init__(self):
+        self.indexed = {}
+        self.stored = {}
+        self.indexer_lookups = []
+        self.fetched = []
+
+    def filter(self, pk__in):
+        self.indexer_lookups.append(sorted(pk__in))
+        return [self.indexed[pk] for pk in pk__in if pk in self.indexed]
+
+    def fetch_child_metadata(self, fetch):
+        return self
+
+    def get(self, pk):
+        self.fetched.append(str(pk))
+        return self.stored[str(pk)]
+
+
+class LinkedModel:
+    objects = None
+
+
+link_field = IndexedLinkedField(DC.relation, LinkedModel)
+
+
+class Referencing:
+
+    def __init__(self, *links):
+        self.metadata = RDFMetadata('http://localhost/a')
+        self.metadata[DC.relation] = [URIRef(x) for x in links]
+
+
+link_field.instrument(Referencing, 'link')
+
+
+class PrefetchLinkedTestCase(TestCase):
+
+    def setUp(self):
+        LinkedModel.objects = self.manager = LinkedManager()
+
+    def test_references_are_resolved_in_one_indexer_lookup(self):
+        for url in ('http://localhost/1', 'http://localhost/2'):
+            self.manager.indexed[url] = Linked(url)
+        instances = [Referencing('http://localhost/1'), Referencing('http://localhost/2'),
+                     Referencing('http://localhost/1')]
+
+        prefetch_linked(instances, [link_field])
+
+        self.assertEqual(self.manager.indexer_lookups, [['http://localhost/1', 'http://localhost/2']])
+        self.assertEqual(self.manager.fetched, [])
+        self.assertIs(instances[0].link, self.manager.indexed['http://localhost/1'])
+        self.assertIs(instances[2].link, self.manager.indexed['http://localhost/1'])
+        self.assertIs(instances[1].link, self.manager.indexed['http://localhost/2'])
+        self.assertEqual(self.manager.fetched, [])
+        # objects built from the indexer contain only indexed metadata
+        self.assertTrue(instances[0].link.is_incomplete)
+
+    def test_references_missing_in_indexer_are_fetched(self):
+        self.manager.indexed['http://localhost/1'] = Linked('http://localhost/1')
+        self.manager.stored['http://localhost/2'] = Linked('http://localhost/2')
+        instances = [Referencing('http://localhost/1'), Referencing('http://localhost/2')]
+
+        prefetch_linked(instances, [link_field])
+
+        self.assertEqual(self.manager.fetched, ['http://localhost/2'])
+        self.assertIs(instances[1].link, self.manager.stored['http://localhost/2'])
+        self.assertFalse(instances[1].link.is_incomplete)
+        self.assertEqual(self.manager.fetched, ['http://localhost/2'])
+
+    def test_failed_prefetch_is_retried_on_access(self):
+        instance = Referencing('http://localhost/1')
+        with self.assertLogs('fedoralink.indexer.fields', 'ERROR'):
+            prefetch_linked([instance], [link_field])
+
+        self.manager.stored['http://localhost/1'] = Linked('http://localhost/1')
+        self.assertIs(instance.link, self.manager.stored['http://localhost/1'])
+        self.assertEqual(self.manager.fetched, ['http://localhost/1', 'http://localhost/1'])
+
+    def test_accessor_fetches_object_once_without_prefetch(self):
+        self.manager.stored['http://localhost/1'] = Linked('http://localhost/1')
+        instance = Referencing('http://localhost/1')
+        self.assertIs(instance.link, instance.link)
+        self.assertEqual(self.manager.fetched, ['http://localhost/1'])
@@ -0,0 +1,34 @@
+import django
+
+from unittest import TestCase
+
+from fedoralink.identity_map import IdentityMap, identity_map, get_identity_map
+
+django.setup()
+
+
+class IdentityMapTestCase(TestCase):
+
+    def test_invalidate(self):
+        imap = IdentityMap()
+        imap.put('http://localhost/a', 'key', 'a')
+        imap.put('http://localhost/a/b/', 'key', 'b')
+        imap.put('http://localhost/a/b/c', 'key', 'c')
+        self.assertEqual(imap.get('http://localhost/a/b', 'key'), 'b')
+        self.assertIsNone(imap.get('http://localhost/a/b', 'other key'))
+
+        # parent is forgotten as well, children are kept
+        imap.invalidate('http://localhost/a/b')
+        self.assertIsNone(imap.get('http://localhost/a', 'key'))
+        self.assertEqual(imap.get('http://localhost/a/b/c', 'key'), 'c')
+
+        imap.invalidate('http://localhost/a', subtree=True)
+        self.assertIsNone(imap.get('http://localhost/a/b/c', 'key'))
+
+    def test_nested_blocks_share_map(self):
+        self.assertIsNone(get_identity_map())
+        with identity_map() as outer:
+            with identity_map() as inner:
+                self.assertIs(outer, inner)
+            self.assertIs(get_identity_map(), outer)
+        self.assertIsNone(get_identity_map())
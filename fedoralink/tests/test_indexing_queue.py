@@ -0,0 +1,126 @@
+import os
+import tempfile
+
+import django
+
+from unittest import TestCase, mock
+
+from fedoralink.connection import RepositoryException
+from fedoralink.engine import base
+from fedoralink.indexer.indexing_queue import IndexingQueue, OPERATION_DELETE, OPERATION_DELETE_SUBTREE
+from fedoralink.query import DoesNotExist
+
+django.setup()
+
+
+class FakeIndexer:
+    def __init__(self):
+        self.deleted = []
+        self.deleted_subtrees = []
+        self.indexed = []
+        self.fail = False
+
+    def delete_documents(self, ids):
+        if self.fail:
+            raise Exception('index is down')
+        self.deleted.extend(ids)
+
+    def delete_subtrees(self, ids):
+        if self.fail:
+            raise Exception('index is down')
+        self.deleted_subtrees.extend(ids)
+
+    def reindex_bulk(self, objects):
+        self.indexed.extend(obj.id for obj in objects)
+        return []
+
+
+class FakeManager:
+    """
+    Returns objects whose ids are in `existing`, other objects are not found
+    """
+    def __init__(self):
+        self.existing = set()
+
+    def fetch_child_metadata(self, fetch_child_metadata):
+        return self
+
+    def get(self, pk):
+        if pk not in self.existing:
+            raise DoesNotExist(RepositoryException(url=pk, code=404, msg='Not found', hdrs={}, fp=None))
+        return mock.Mock(id=pk)
+
+
+class FakeIndexingQueue(IndexingQueue):
+    fake_indexer = None
+
+    @property
+    def indexer(self):
+        return self.fake_indexer
+
+
+class IndexingQueueTestCase(TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.queue = FakeIndexingQueue(self.path, manager=FakeManager(), backoff=0)
+        self.queue.fake_indexer = FakeIndexer()
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_deduplicates(self):
+        self.queue.enqueue('http://localhost/a', OPERATION_DELETE)
+        self.queue.enqueue('http://localhost/a', OPERATION_DELETE)
+        self.queue.enqueue('http://localhost/b', OPERATION_DELETE)
+        self.assertEqual(self.queue.depth, 2)
+
+        self.assertEqual(self.queue.process_batch(), 2)
+        self.assertEqual(self.queue.depth, 0)
+        self.assertEqual(sorted(self.queue.fake_indexer.deleted), ['http://localhost/a', 'http://localhost/b'])
+
+    def test_failed_are_retried(self):
+        self.queue.enqueue('http://localhost/a', OPERATION_DELETE)
+        self.queue.fake_indexer.fail = True
+        self.queue.process_batch()
+        self.assertEqual(self.queue.depth, 1)
+
+        self.queue.fake_indexer.fail = False
+        self.queue.process_batch()
+        self.assertEqual(self.queue.depth, 0)
+        self.assertEqual(self.queue.fake_indexer.deleted, ['http://localhost/a'])
+
+    def test_subtree_is_deleted_only_on_request(self):
+        self.queue.enqueue('http://localhost/a', OPERATION_DELETE)
+        self.queue.enqueue('http://localhost/b', OPERATION_DELETE_SUBTREE)
+        self.queue.process_batch()
+        self.assertEqual(self.queue.fake_indexer.deleted, ['http://localhost/a'])
+        self.assertEqual(self.queue.fake_indexer.deleted_subtrees, ['http://localhost/b'])
+
+    def test_not_found_object_is_retried(self):
+        # for example saved in a transaction that has not been committed yet
+        self.queue.enqueue('http://localhost/a')
+        self.queue.process_batch()
+        self.assertEqual(self.queue.depth, 1)
+        self.assertEqual(self.queue.fake_indexer.deleted, [])
+        self.assertEqual(self.queue.fake_indexer.deleted_subtrees, [])
+
+        self.queue.manager.existing.add('http://localhost/a')
+        self.queue.process_batch()
+        self.assertEqual(self.queue.depth, 0)
+        self.assertEqual(self.queue.fake_indexer.indexed, ['http://localhost/a'])
+
+    def test_settings_change_stops_queue(self):
+        self.queue.poll_interval = 0.01
+        self.queue.start()
+        worker = self.queue._worker
+        self.assertTrue(worker.is_alive())
+
+        with mock.patch.dict(base._indexing_queues, {'repository': self.queue}), \
+                mock.patch.dict(base._indexers, {'repository': self.queue.fake_indexer}):
+            base._reinitialize_indexers('DATABASES')
+            self.assertEqual(base._indexing_queues, {})
+            self.assertEqual(base._indexers, {})
+
+        self.assertFalse(worker.is_alive())
@@ -0,0 +1,103 @@
+import io
+
+import django
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import DC
+
+from unittest import TestCase, mock
+
+from fedoralink.connection import FedoraConnection, VERSIONING_NEVER
+from fedoralink.metadata_cache import DjangoMetadataCache, LocalMetadataCache
+
+django.setup()
+
+
+class LocalMetadataCacheTestCase(TestCase):
+
+    def graph(self, url, title):
+        graph = Graph()
+        graph.add((URIRef(url), DC.title, Literal(title)))
+        return graph
+
+    def test_returns_copy(self):
+        cache = LocalMetadataCache()
+        graph = self.graph('http://localhost/a', 'a')
+        cache.put('http://localhost/a', 'key', 'W/"1"', None, graph)
+        graph.add((URIRef('http://localhost/a'), DC.creator, Literal('me')))
+
+        cached = cache.get('http://localhost/a/', 'key')
+        self.assertEqual(cached.etag, 'W/"1"')
+        cached_graph = cached.to_graph()
+        self.assertEqual(len(cached_graph), 1)
+        cached_graph.remove((None, None, None))
+        self.assertEqual(len(cache.get('http://localhost/a', 'key').to_graph()), 1)
+
+    def test_lru_eviction(self):
+        cache = LocalMetadataCache(max_size=2)
+        for name in ('a', 'b'):
+            cache.put('http://localhost/' + name, 'key', name, None, self.graph('http://localhost/' + name, name))
+        cache.get('http://localhost/a', 'key')
+        cache.put('http://localhost/c', 'key', 'c', None, self.graph('http://localhost/c', 'c'))
+        self.assertIsNotNone(cache.get('http://localhost/a', 'key'))
+        self.assertIsNone(cache.get('http://localhost/b', 'key'))
+        self.assertIsNotNone(cache.get('http://localhost/c', 'key'))
+
+    def test_invalidate_parent(self):
+        cache = LocalMetadataCache()
+        cache.put('http://localhost/a', 'key', 'a', None, self.graph('http://localhost/a', 'a'))
+        cache.put('http://localhost/a/b', 'key', 'b', None, self.graph('http://localhost/a/b', 'b'))
+        cache.invalidate('http://localhost/a/b')
+        self.assertIsNone(cache.get('http://localhost/a', 'key'))
+        self.assertIsNone(cache.get('http://localhost/a/b', 'key'))
+
+
+class DjangoMetadataCacheTestCase(TestCase):
+
+    def test_invalidate_all_principals(self):
+        cache = DjangoMetadataCache('default')
+        graph = Graph()
+        graph.add((URIRef('http://localhost/a/b'), DC.title, Literal('b')))
+        for key in (('user1', None, None, False), ('user2', None, None, False)):
+            cache.put('http://localhost/a/b', key, 'W/"1"', None, graph)
+            cache.put('http://localhost/a', key, 'W/"1"', None, graph)
+        self.assertEqual(len(cache.get('http://localhost/a/b', ('user2', None, None, False)).to_graph()), 1)
+
+        cache.invalidate('http://localhost/a/b')
+        for key in (('user1', None, None, False), ('user2', None, None, False)):
+            self.assertIsNone(cache.get('http://localhost/a/b', key))
+            self.assertIsNone(cache.get('http://localhost/a', key))
+
+
+class ConnectionMetadataCacheTestCase(TestCase):
+
+    def test_child_metadata_are_not_cached(self):
+        cache = mock.Mock(spec=LocalMetadataCache)
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER, rdf_format='nt',
+                                      metadata_cache=cache)
+        resp = mock.Mock(status_code=200, headers={'ETag': 'W/"1"'}, raw=io.BytesIO(b''))
+        with mock.patch('fedoralink.connection.requests.get', return_value=resp) as get:
+            list(connection.get_object('a', fetch_child_metadata=True))
+
+        self.assertNotIn('If-None-Match', get.call_args[1]['headers'])
+        self.assertFalse(cache.get.called)
+        self.assertFalse(cache.put.called)
+
+    def test_not_modified_metadata_are_reused(self):
+        connection = FedoraConnection('http://localhost:8080/rest', versioning=VERSIONING_NEVER, rdf_format='nt',
+                                      metadata_cache=LocalMetadataCache())
+        data = b'<http://localhost:8080/rest/a> <http://purl.org/dc/elements/1.1/title> "title" .\n'
+        modified = mock.Mock(status_code=200,
+                             headers={'ETag': 'W/"1"', 'Last-Modified': 'Wed, 01 Jun 2016 10:00:00 GMT'},
+                             raw=io.BytesIO(data))
+        not_modified = mock.Mock(status_code=304, headers={'ETag': 'W/"1"'}, raw=io.BytesIO(b''))
+
+        with mock.patch('fedoralink.connection.requests.get', side_effect=[modified, not_modified]) as get:
+            list(connection.get_object('a', fetch_child_metadata=False))
+            with mock.patch('rdflib.Graph.parse', side_effect=AssertionError('metadata must not be parsed')):
+                metadata = list(connection.get_object('a', fetch_child_metadata=False))[0]
+
+        headers = get.call_args_list[1][1]['headers']
+        self.assertEqual(headers['If-None-Match'], 'W/"1"')
+        self.assertEqual(headers['If-Modified-Since'], 'Wed, 01 Jun 2016 10:00:00 GMT')
+        self.assertEqual(metadata.etag, 'W/"1"')
+        self.assertEqual(metadata[DC.title], [Literal('title')])
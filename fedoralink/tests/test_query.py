@@ -0,0 +1,106 @@
+import django
+from rdflib import Literal
+from rdflib.namespace import DC, XSD
+
+from unittest import TestCase
+
+from fedoralink.common_namespaces.dc import DCObject
+from fedoralink.connection import FedoraConnection, VERSIONING_NEVER
+from fedoralink.manager import FedoraManager
+from fedoralink.paginator import FedoraPaginator
+from fedoralink.rdfmetadata import RDFMetadata
+
+django.setup()
+
+BASE = 'http://localhost:8080/rest/'
+
+
+def make_metadata(index):
+    metadata = RDFMetadata(BASE + str(index))
+    metadata.add_type(DC.Object)
+    metadata[DC.title] = Literal('title %s' % index, datatype=XSD.string)
+    return metadata
+
+
+class FakeIndexer:
+    """
+    Indexer with `total` objects, records the (start, end) of each search
+    """
+
+    def __init__(self, total):
+        self.total = total
+        self.searches = []
+
+    def search(self, filter_set, model, start, end, facets, orderby, values):
+        self.searches.append((start, end))
+        end = self.total if end is None else min(end, self.total)
+        if values is not None:
+            data = [{'pk': BASE + str(i), 'title': 'title %s' % i} for i in range(start, end)]
+        else:
+            data = [(make_metadata(i), {}) for i in range(start, end)]
+        return {
+            'count': self.total,
+            'facets': {'title': [('title', self.total)]},
+            'data': data,
+        }
+
+    def iterate(self, filter_set, model, orderby, chunk_size):
+        for start in range(0, self.total, chunk_size):
+            self.searches.append((start, start + chunk_size))
+            yield [(make_metadata(i), {}) for i in range(start, min(start + chunk_size, self.total))]
+
+
+class QueryTestCase(TestCase):
+
+    def setUp(self):
+        self.indexer = FakeIndexer(25)
+        self.manager = FedoraManager(DCObject)
+        self.manager._default_connection = FedoraConnection(BASE, versioning=VERSIONING_NEVER)
+        self.manager.get_indexer = lambda using='repository': self.indexer
+
+    def test_paginator_page_calls_indexer_once(self):
+        query = self.manager.get_query().request_facets('title')
+        page = FedoraPaginator(query, 10).page(3)
+
+        self.assertEqual([str(obj.id) for obj in page], [BASE + str(i) for i in range(20, 25)])
+        self.assertEqual(page.paginator.count, 25)
+        self.assertEqual(page.paginator.num_pages, 3)
+        self.assertTrue(page.has_previous())
+        self.assertFalse(page.has_next())
+        self.assertEqual(query.facets, {'title': [('title', 25)]})
+        self.assertEqual(self.indexer.searches, [(20, 30)])
+
+    def test_objects_are_constructed_when_accessed(self):
+        constructed = []
+        construct = self.manager.construct
+        self.manager.construct = lambda metadata: constructed.append(str(metadata.id)) or construct(metadata)
+
+        data = self.manager.get_query()[0:10].execute()
+        self.assertEqual(len(data), 10)
+        self.assertEqual(data.count(), 25)
+        self.assertEqual(constructed, [])
+
+        obj = data[3]
+        self.assertEqual(str(obj.id), BASE + '3')
+        self.assertTrue(obj.is_incomplete)
+        self.assertIs(data[3], obj)
+        self.assertEqual(constructed, [BASE + '3'])
+
+        self.assertEqual(len(list(data)), 10)
+        self.assertEqual(len(constructed), 10)
+
+    def test_values_list(self):
+        query = self.manager.get_query()[0:2]
+        self.assertEqual(list(query.values_list('pk', flat=True)), [BASE + '0', BASE + '1'])
+        self.assertEqual(list(query.values_list('pk', 'title')),
+                         [(BASE + '0', 'title 0'), (BASE + '1', 'title 1')])
+        with self.assertRaises(TypeError):
+            query.values_list('pk', 'title', flat=True)
+
+    def test_iterator_fetches_chunks(self):
+        iterator = self.manager.get_query().iterator(chunk_size=10)
+        self.assertEqual(str(next(iterator).id), BASE + '0')
+        self.assertEqual(self.indexer.searches, [(0, 10)])
+
+        self.assertEqual([str(obj.id) for obj in iterator], [BASE + str(i) for i in range(1, 25)])
+        self.assertEqual(self.indexer.searches, [(0, 10), (10, 20), (20, 30)])
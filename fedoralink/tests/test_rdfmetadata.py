@@ -0,0 +1,93 @@
+import django
+from rdflib import Literal, URIRef
+from rdflib.namespace import DC, RDF, XSD
+
+from unittest import TestCase
+
+from fedoralink.fedorans import FEDORA
+from fedoralink.rdfmetadata import CompactRDFMetadata, RDFMetadata
+
+django.setup()
+
+
+class CompactRDFMetadataTestCase(TestCase):
+
+    def test_lookup(self):
+        metadata = CompactRDFMetadata('http://localhost/a', {
+            RDF.type: [DC.Object],
+            DC.title: [Literal('title', lang='en'), Literal('titul', lang='cs')]
+        })
+        self.assertTrue(metadata.has_type(DC.Object))
+        self.assertEqual(len(metadata[DC.title]), 2)
+        self.assertEqual(metadata[DC.creator], [])
+        self.assertIn(DC.title, metadata)
+        self.assertRaises(TypeError, lambda: metadata['title'])
+
+    def test_graph_is_kept_in_sync(self):
+        metadata = CompactRDFMetadata('http://localhost/a', {DC.title: [Literal('title', lang='en')]})
+        graph = metadata.rdf_metadata
+        self.assertEqual(len(graph), 1)
+
+        metadata[DC.title] = Literal('other', datatype=XSD.string)
+        metadata.add(DC.subject, URIRef('http://localhost/subject'))
+        self.assertEqual(len(graph), 2)
+        self.assertEqual(list(graph.objects(metadata.id, DC.title)), [Literal('other', datatype=XSD.string)])
+
+        del metadata[DC.subject]
+        self.assertEqual(len(graph), 1)
+        self.assertIn(b'other', metadata.serialize_sparql())
+
+    def test_version_changes_on_modification(self):
+        metadata = CompactRDFMetadata('http://localhost/a', {DC.title: [Literal('title', lang='en')]})
+        version = metadata.version
+        self.assertEqual(metadata[DC.title], [Literal('title', lang='en')])
+        self.assertEqual(metadata.version, version)
+
+        metadata[DC.title] = Literal('other', datatype=XSD.string)
+        self.assertGreater(metadata.version, version)
+
+        version = metadata.version
+        del metadata[DC.title]
+        self.assertGreater(metadata.version, version)
+
+    def test_mark_as_saved_replaces_server_managed(self):
+        metadata = CompactRDFMetadata('http://localhost/a', {
+            FEDORA.lastModified: [Literal('2016-01-01T00:00:00Z', datatype=XSD.dateTime),
+                                  Literal('2016-01-02T00:00:00Z', datatype=XSD.dateTime)]
+        })
+        metadata.mark_as_saved('W/"1"', {FEDORA.lastModified: []})
+        self.assertEqual(metadata[FEDORA.lastModified], [])
+        self.assertNotIn(FEDORA.lastModified, metadata)
+
+    def test_graphs_do_not_share_namespaces(self):
+        first = CompactRDFMetadata('http://localhost/a', {URIRef('http://example.com/unknown#p'): [URIRef('x')]})
+        second = CompactRDFMetadata('http://localhost/b')
+        str(first)
+        self.assertNotIn(URIRef('http://example.com/unknown#'),
+                         [namespace for prefix, namespace in second.rdf_metadata.namespaces()])
+        self.assertIn('dc', [prefix for prefix, namespace in second.rdf_metadata.namespaces()])
+
+
+class RDFMetadataTestCase(TestCase):
+
+    def test_mark_as_saved(self):
+        metadata = RDFMetadata('http://localhost/a')
+        metadata[DC.title] = Literal('title', datatype=XSD.string)
+        metadata.add(FEDORA.lastModified, Literal('2016-01-01T00:00:00Z', datatype=XSD.dateTime))
+        self.assertIn(b'title', metadata.serialize_sparql())
+
+        metadata.mark_as_saved('W/"1"', {FEDORA.lastModified: [], FEDORA.hasParent: [URIRef('http://localhost')]})
+        self.assertEqual(metadata.etag, 'W/"1"')
+        self.assertNotIn(b'title', metadata.serialize_sparql())
+        self.assertEqual(metadata[DC.title], [Literal('title', datatype=XSD.string)])
+        self.assertEqual(metadata[FEDORA.lastModified], [])
+        self.assertEqual(metadata[FEDORA.hasParent], [URIRef('http://localhost')])
+
+    def test_copy(self):
+        metadata = RDFMetadata('http://localhost/a')
+        metadata[DC.title] = Literal('title', datatype=XSD.string)
+        copy = metadata.copy()
+        copy[DC.title] = Literal('other', datatype=XSD.string)
+        self.assertEqual(metadata[DC.title], [Literal('title', datatype=XSD.string)])
+        self.assertNotIn(b'other', metadata.serialize_sparql())
+        self.assertIn(b'other', copy.serialize_sparql())
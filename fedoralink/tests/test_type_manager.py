@@ -0,0 +1,36 @@
+import django
+from rdflib.namespace import DC, RDF
+
+from unittest import TestCase
+
+from fedoralink.common_namespaces.dc import DCObject, DCObjectCollection
+from fedoralink.fedorans import CESNET
+from fedoralink.models import FedoraObject
+from fedoralink.rdfmetadata import RDFMetadata
+from fedoralink.type_manager import FedoraTypeManager
+
+django.setup()
+
+
+class TypeManagerTestCase(TestCase):
+
+    def test_generate_class_is_cached(self):
+        clz1 = FedoraTypeManager.generate_class([DCObject, FedoraObject])
+        clz2 = FedoraTypeManager.generate_class([DCObject, FedoraObject])
+        self.assertIs(clz1, clz2)
+        self.assertIsNot(clz1, FedoraTypeManager.generate_class([FedoraObject]))
+
+    def test_get_object_class(self):
+        metadata = RDFMetadata('http://localhost/a')
+        metadata.add(RDF.type, DC.Object)
+        clz = FedoraTypeManager.get_object_class(metadata)
+        self.assertTrue(issubclass(clz, DCObject))
+        self.assertFalse(issubclass(clz, DCObjectCollection))
+        self.assertIs(clz, FedoraTypeManager.get_object_class(metadata))
+
+        metadata.add(RDF.type, CESNET.DCTermsCollection)
+        self.assertTrue(issubclass(FedoraTypeManager.get_object_class(metadata), DCObjectCollection))
+
+    def test_get_object_class_without_types(self):
+        clz = FedoraTypeManager.get_object_class(RDFMetadata('http://localhost/b'))
+        self.assertEqual(clz._type, [FedoraObject])
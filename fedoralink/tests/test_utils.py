@@ -0,0 +1,30 @@
+import io
+
+import django
+import requests
+
+from unittest import TestCase, mock
+
+from fedoralink.utils import TypedStream, UploadBody
+
+django.setup()
+
+
+class UploadBodyTestCase(TestCase):
+
+    @staticmethod
+    def prepare(stream):
+        return requests.Request('POST', 'http://localhost:8080/rest/a', data=UploadBody(stream).body).prepare()
+
+    def test_known_size_is_sent_as_content_length(self):
+        request = self.prepare(TypedStream(io.BytesIO(b'0123456789'), 'text/plain', size=10))
+        self.assertEqual(request.headers['Content-Length'], '10')
+        self.assertNotIn('Transfer-Encoding', request.headers)
+        self.assertEqual(request.body.read(), b'0123456789')
+
+    def test_unknown_size_is_sent_chunked(self):
+        with mock.patch.object(UploadBody, 'CHUNK_SIZE', 4):
+            request = self.prepare(TypedStream(io.BytesIO(b'0123456789'), 'text/plain'))
+            self.assertEqual(request.headers['Transfer-Encoding'], 'chunked')
+            self.assertNotIn('Content-Length', request.headers)
+            self.assertEqual(list(request.body), [b'0123', b'4567', b'89'])
@@ -1,4 +1,7 @@
 import inspect
+import threading
+from collections import OrderedDict
+
 from fedoralink.fedorans import RDF
 from fedoralink.utils import fullname
 
@@ -10,13 +13,6 @@ def _type_matches(types_from_metadata, types_being_matched):
     return True
 
 
-def _has_predicates(metadata, predicates):
-    for predicate in predicates:
-        if not metadata[predicate]:
-            return False
-    return True
-
-
 class FedoraTypeManager:
     """
     A singleton responsible for creating instance of FedoraObject (and subclasses) out of RDFMetadata
@@ -30,6 +26,15 @@ class FedoraTypeManager:
     # clazz -> (rdf_predicates, priority)
     on_rdf_predicates = {}
 
+    # tuple of superclasses -> generated class, kept in LRU order
+    class_cache = OrderedDict()
+    class_cache_size = 1024
+    class_cache_lock = threading.RLock()
+
+    # see _get_dispatch_index
+    dispatch_index = None
+    dispatch_memo_size = 4096
+
     @staticmethod
     def register_model(model_class, on_rdf_type=(), on_has_predicate=(), priority=1.0):
         """
@@ -45,12 +50,15 @@ class FedoraTypeManager:
         if model_class in FedoraTypeManager.models:
             return                              # already registered
 
-        FedoraTypeManager.models.add(model_class)
-        if on_rdf_type:
-            FedoraTypeManager.on_rdf_types[model_class] = (on_rdf_type, priority)
+        with FedoraTypeManager.class_cache_lock:
+            FedoraTypeManager.models.add(model_class)
+            if on_rdf_type:
+                FedoraTypeManager.on_rdf_types[model_class] = (on_rdf_type, priority)
 
-        if on_has_predicate:
-            FedoraTypeManager.on_rdf_predicates[model_class] = (on_has_predicate, priority)
+            if on_has_predicate:
+                FedoraTypeManager.on_rdf_predicates[model_class] = (on_has_predicate, priority)
+
+            FedoraTypeManager.dispatch_index = None
 
     @staticmethod
     def get_model_class(classname):
@@ -75,29 +83,57 @@ class FedoraTypeManager:
         :return:            python class which fits the metadata
         """
 
-        from .models import FedoraObject
+        index = FedoraTypeManager._get_dispatch_index()
 
-        types = metadata[RDF.type]
+        types = frozenset(metadata[RDF.type])
+        present_predicates = frozenset(p for p in index['predicates'] if metadata[p])
+
+        # call class method handles_metadata on classes that override it and if it returns a priority,
+        # the class is added as well
+        handled = []
+        for clz in index['handles_metadata']:
+            priority = getattr(clz, 'handles_metadata')(metadata)
+            if priority is not None and priority >= 0:
+                handled.append((clz, priority))
+
+        key = (types, present_predicates, model_class, tuple(handled))
+        ret = index['memo'].get(key)
+        if ret is None:
+            ret = FedoraTypeManager._resolve_object_class(index, types, present_predicates, model_class, handled)
+            if len(index['memo']) >= FedoraTypeManager.dispatch_memo_size:
+                index['memo'].clear()
+            index['memo'][key] = ret
+        return ret
+
+    @staticmethod
+    def _resolve_object_class(index, types, present_predicates, model_class, handled):
+        from .models import FedoraObject
 
         possible_classes = {FedoraObject: 0}
         if model_class:
             possible_classes[model_class] = 1
 
         # look at classes registered on rdf types and if the class match, add it to the dict of possible classes
-        for clz, rdf_and_priority in FedoraTypeManager.on_rdf_types.items():
-            if _type_matches(types, rdf_and_priority[0]):
-                possible_classes[clz] = max(possible_classes.get(clz, 0), rdf_and_priority[1])
+        # (in registration order so that classes with the same priority are always sorted the same way)
+        matched = set()
+        for a_type in types:
+            for registration in index['rdf_types'].get(a_type, ()):
+                if _type_matches(types, registration[2]):
+                    matched.add(registration)
+        for _, clz, _, priority in sorted(matched, key=lambda x: x[0]):
+            possible_classes[clz] = max(possible_classes.get(clz, 0), priority)
 
         # look at classes registered on rdf predicates and if the class match, add it to the dict of possible classes
-        for clz, rdf_and_priority in FedoraTypeManager.on_rdf_predicates.items():
-            if _has_predicates(metadata, rdf_and_priority[0]):
-                possible_classes[clz] = max(possible_classes.get(clz, 0), rdf_and_priority[1])
+        matched = set()
+        for predicate in present_predicates:
+            for registration in index['rdf_predicates'].get(predicate, ()):
+                if _type_matches(present_predicates, registration[2]):
+                    matched.add(registration)
+        for _, clz, _, priority in sorted(matched, key=lambda x: x[0]):
+            possible_classes[clz] = max(possible_classes.get(clz, 0), priority)
 
-        # call class method handles_metadata and if it returns a priority, add the class as well
-        for clz in FedoraTypeManager.models:
-            priority = getattr(clz, 'handles_metadata')(metadata)
-            if priority is not None and priority >= 0:
-                possible_classes[clz] = max(possible_classes.get(clz, 0), priority)
+        for clz, priority in handled:
+            possible_classes[clz] = max(possible_classes.get(clz, 0), priority)
 
         # convert to a list, add priorities from superclasses as well
         # (i.e. 2 * current_priority + sum of priorities of superclasses)
@@ -105,7 +141,7 @@ class FedoraTypeManager:
 
         for clazz, priority in possible_classes.items():
 
-            for clz in inspect.getmro(clazz):
+            for clz in FedoraTypeManager._get_mro(clazz):
                 if clz in possible_classes:
                     priority += possible_classes[clz]
 
@@ -123,23 +159,92 @@ class FedoraTypeManager:
 
             classes.append(clazz)
 
-            for clz in inspect.getmro(clazz):
-                seen_classes.add(clz)
+            seen_classes.update(FedoraTypeManager._get_mro(clazz))
 
         # got a list of classes, create a new type (or use a cached one ...)
         return FedoraTypeManager.generate_class(classes)
 
+    @staticmethod
+    def _get_mro(clazz):
+        index = FedoraTypeManager._get_dispatch_index()
+        mro = index['mro'].get(clazz)
+        if mro is None:
+            mro = index['mro'][clazz] = inspect.getmro(clazz)
+        return mro
+
+    @staticmethod
+    def _get_dispatch_index():
+        """
+        Returns the dispatch index built from registered models. The index is dropped whenever a model is registered
+        and rebuilt on the next call.
+
+        :return:    dict with keys
+                        rdf_types:          rdf type -> list of (ordinal, clazz, required rdf types, priority)
+                        rdf_predicates:     predicate -> list of (ordinal, clazz, required predicates, priority)
+                        predicates:         all predicates used in registrations
+                        handles_metadata:   list of classes that override handles_metadata
+                        mro:                clazz -> mro of the clazz
+                        memo:               metadata signature -> resolved class
+        """
+        index = FedoraTypeManager.dispatch_index
+        if index is not None:
+            return index
+
+        from .models import FedoraObject
+
+        with FedoraTypeManager.class_cache_lock:
+            index = FedoraTypeManager.dispatch_index
+            if index is not None:
+                return index
+
+            index = {
+                'rdf_types': {},
+                'rdf_predicates': {},
+                'predicates': set(),
+                'handles_metadata': [],
+                'mro': {},
+                'memo': {}
+            }
+            for ordinal, (clz, (rdf_types, priority)) in enumerate(FedoraTypeManager.on_rdf_types.items()):
+                registration = (ordinal, clz, tuple(rdf_types), priority)
+                for rdf_type in set(rdf_types):
+                    index['rdf_types'].setdefault(rdf_type, []).append(registration)
+
+            for ordinal, (clz, (predicates, priority)) in enumerate(FedoraTypeManager.on_rdf_predicates.items()):
+                registration = (ordinal, clz, tuple(predicates), priority)
+                index['predicates'].update(predicates)
+                for predicate in set(predicates):
+                    index['rdf_predicates'].setdefault(predicate, []).append(registration)
+
+            default_handles_metadata = FedoraObject.handles_metadata.__func__
+            for clz in FedoraTypeManager.models:
+                if getattr(clz, 'handles_metadata').__func__ is not default_handles_metadata:
+                    index['handles_metadata'].append(clz)
+
+            FedoraTypeManager.dispatch_index = index
+            return index
+
     @staticmethod
     def generate_class(classes):
         """
         generates a class which has the passed classes as superclasses
 
         :param classes: list of superclasses
-        :return:    dynamically generated class
+        :return:    dynamically generated class, the same class is returned for the same list of superclasses
         """
-        # TODO: class cache
-        return type('_'.join([x.__name__ for x in classes]) + "_bound", tuple(classes), {'_is_bound':True,
-                                                                                         '_type' : classes})
+        key = tuple(classes)
+        with FedoraTypeManager.class_cache_lock:
+            clz = FedoraTypeManager.class_cache.get(key)
+            if clz is not None:
+                FedoraTypeManager.class_cache.move_to_end(key)
+                return clz
+
+            clz = type('_'.join([x.__name__ for x in classes]) + "_bound", key, {'_is_bound':True,
+                                                                               '_type' : list(classes)})
+            FedoraTypeManager.class_cache[key] = clz
+            while len(FedoraTypeManager.class_cache) > FedoraTypeManager.class_cache_size:
+                FedoraTypeManager.class_cache.popitem(last=False)
+            return clz
 
     @staticmethod
     def populate():
@@ -1,5 +1,7 @@
 import binascii
+import functools
 import logging
+import os
 
 from rdflib import Literal
 
@@ -57,7 +59,7 @@ class StringLikeList(list):
 
 
 class TypedStream:
-    def __init__(self, stream_or_filepath, mimetype=None, filename=None):
+    def __init__(self, stream_or_filepath, mimetype=None, filename=None, size=None):
         """
         Creates a new instance of stream with optional mimetype and filename
 
@@ -65,11 +67,16 @@ class TypedStream:
         :param mimetype:            mimetype. If not provided will be guessed
                                     (only if stream_or_filepath points to local file)
         :param filename:            filename in case stream_or_filepath is an input stream
+        :param size:                size of the data in bytes if known. If not provided, it is taken from the file
+                                    (if stream_or_filepath points to local file) or from stream's size attribute
         :return:
         """
+        self.__size = size
+        self.__filepath = None
         if isinstance(stream_or_filepath, str):
             self.__stream = None
             self.__filename = stream_or_filepath
+            self.__filepath = stream_or_filepath
             if mimetype is None:
                 self.__mimetype = self.__guess_mimetype_from_filename(stream_or_filepath)
             else:
@@ -101,6 +108,18 @@ class TypedStream:
         """
         return self.__mimetype
 
+    @property
+    def size(self):
+        """
+        Return the size of the data in bytes or None if it is not known
+        """
+        if self.__size is None:
+            if self.__filepath is not None:
+                self.__size = os.path.getsize(self.__filepath)
+            elif self.__stream is not None:
+                self.__size = getattr(self.__stream, 'size', None)
+        return self.__size
+
     @property
     def filename(self):
         """
@@ -118,6 +137,42 @@ class TypedStream:
             return 'application/binary'
 
 
+class UploadBody:
+    """
+    Request body that streams a TypedStream to the server without reading it into memory. If size of the stream
+    is known, it is sent as Content-Length, otherwise requests falls back to chunked transfer encoding.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, typed_stream):
+        self.stream = typed_stream.stream
+        self.size   = typed_stream.size
+
+    def read(self, size=-1):
+        return self.stream.read(size)
+
+    def __iter__(self):
+        while True:
+            chunk = self.stream.read(UploadBody.CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    @property
+    def body(self):
+        """
+        Returns the object that should be passed as data to requests
+        """
+        if self.size is not None:
+            return self
+        # requests sends generators with chunked transfer encoding
+        return iter(self)
+
+    def __len__(self):
+        return self.size
+
+
 class OrderableModelList(list):
 
     def __init__(self, lst, model):
@@ -195,6 +250,8 @@ known_prefixes = {
 known_prefixes_reversed = { v:k for k, v in known_prefixes.items() }
 
 
+# field ids are computed on every search and (re)index, the set of predicates is small so keep them cached
+@functools.lru_cache(maxsize=4096)
 def url2id(url):
     ret = []
     for p, val in known_prefixes.items():
@@ -213,6 +270,7 @@ def url2id(url):
     return ''.join(ret)
 
 
+@functools.lru_cache(maxsize=4096)
 def id2url(id):
     ret = []
     tok = iter(id)
@@ -1,17 +1,19 @@
 import inspect
 import requests
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.core.paginator import PageNotAnInteger, EmptyPage
 from django.core.urlresolvers import reverse
 from django.db.models import Q
-from django.http import HttpResponseRedirect, FileResponse, Http404, HttpResponse
+from django.http import HttpResponseRedirect, Http404, HttpResponse
 from django.shortcuts import render
 from django.template import Template, RequestContext
 from django.utils.translation import ugettext as _
 from django.views.generic import View, CreateView, DetailView, UpdateView
 
+from fedoralink.download import bitstream_response
 from fedoralink.forms import FedoraForm
 from fedoralink.indexer.models import IndexableFedoraObject
 from fedoralink.models import FedoraObject
+from fedoralink.paginator import FedoraPaginator
 from fedoralink_ui.templatetags.fedoralink_tags import id_from_path
 from fedoralink_ui.models import ResourceType
 from .utils import get_class, fullname
@@ -63,10 +65,7 @@ class GenericDownloadView(View):
 
     def get(self, request, bitstream_id):
         attachment = self.model.objects.get(pk=bitstream_id.replace('_', '/'))
-        bitstream = attachment.get_bitstream()
-        resp = FileResponse(bitstream.stream, content_type=bitstream.mimetype)
-        resp['Content-Disposition'] = 'inline; filename="' + attachment.filename
-        return resp
+        return bitstream_response(request, attachment, filename=getattr(attachment, 'filename', None))
 
 
 class GenericChangeStateView(View):
@@ -123,7 +122,7 @@ class GenericIndexerView(View):
         if sort:
             data = data.order_by(*[x.strip() for x in sort.split(',')])
         page = request.GET.get('page')
-        paginator = Paginator(data, 10)
+        paginator = FedoraPaginator(data, 10)
 
         try:
             page = paginator.page(page)
@@ -211,7 +210,7 @@ class GenericLinkView(View):
         if sort:
             data = data.order_by(*[x.strip() for x in sort.split(',')])
         page = request.GET.get('page')
-        paginator = Paginator(data, 10)
+        paginator = FedoraPaginator(data, 10)
 
         try:
             page = paginator.page(page)
@@ -3,6 +3,15 @@ from django.apps import AppConfig
 from django.utils.translation import ugettext_lazy as _
 
 
+def invalidate_template_cache(sender, **kwargs):
+
+    from fedoralink_ui.models import Template
+    from fedoralink_ui.template_cache import invalidate_templates
+
+    if isinstance(kwargs['instance'], Template):
+        invalidate_templates()
+
+
 class ApplicationConfig(AppConfig):
     name = 'fedoralink_ui'
     verbose_name = _("User interface module for fedoralink")
@@ -21,4 +30,9 @@ class ApplicationConfig(AppConfig):
             ])
             context_processors.append('fedoralink_ui.views.appname')
 
-        print(settings.TEMPLATES)
\ No newline at end of file
+        print(settings.TEMPLATES)
+
+        from django.db.models.signals import post_save, post_delete
+
+        post_save.connect(invalidate_template_cache, dispatch_uid='fedoralink_ui_templates', weak=False)
+        post_delete.connect(invalidate_template_cache, dispatch_uid='fedoralink_ui_templates_delete', weak=False)
\ No newline at end of file
@@ -113,7 +113,7 @@ def repository_patterns(app_name, fedora_prefix='', custom_patterns=None,
                     idd = id
                     if fedora_prefix:
                         idd = fedora_prefix + '/' + idd
-                    return rdf2lang(FedoraObject.objects.get(pk=idd).title, lang=lang)
+                    return rdf2lang(FedoraObject.objects.fetch_child_metadata(False).get(pk=idd).title, lang=lang)
                 except:
                     import traceback
                     traceback.print_exc()
@@ -1,16 +1,33 @@
+import threading
+from collections import OrderedDict
+
 from django.core.cache import cache
 from django.db.models import Q
+from django.template import Template
 
+from fedoralink.fedorans import FEDORA
 from fedoralink.utils import fullname
 from fedoralink_ui.models import ResourceType, ResourceFieldType, ResourceCollectionType
 
 NONE_CACHE_VALUE = "this is a placeholder that is used instead of None"
 
+# incremented when a Template is saved, so that values cached by simple_cache are not used any more
+GENERATION_CACHE_KEY = 'fedoralink_ui.template_cache.generation'
+
+# max number of compiled templates kept in memory of the process
+COMPILED_TEMPLATES_CACHE_SIZE = 256
+
+# (rdf types, view type or field, id and last modification of the template object, extended template)
+#     -> django Template
+_compiled_templates = OrderedDict()
+_compiled_templates_lock = threading.Lock()
+
+
 def simple_cache(func, timeout=3600):
     def wrapper(*args, **kwargs):
         kwargs_sorted = list(kwargs.items())
         kwargs_sorted.sort()
-        key = repr(args) + '##' + repr(kwargs_sorted)
+        key = repr(cache.get(GENERATION_CACHE_KEY, 0)) + '##' + repr(args) + '##' + repr(kwargs_sorted)
         # print("cache key:")
         # print(key)
         ret = cache.get(key, None)
@@ -26,6 +43,42 @@ def simple_cache(func, timeout=3600):
     return wrapper
 
 
+def _get_compiled_template(key, source):
+    """
+    Returns the compiled template for the given key, compiling the source only if it is not cached yet
+
+    :param key:     key of the template, must change whenever the source changes
+    :param source:  source of the template
+    :return:        django.template.Template
+    """
+    with _compiled_templates_lock:
+        compiled = _compiled_templates.get(key)
+        if compiled is not None:
+            _compiled_templates.move_to_end(key)
+            return compiled
+
+    compiled = Template(source)
+
+    with _compiled_templates_lock:
+        _compiled_templates[key] = compiled
+        while len(_compiled_templates) > COMPILED_TEMPLATES_CACHE_SIZE:
+            _compiled_templates.popitem(last=False)
+    return compiled
+
+
+def invalidate_templates():
+    """
+    Forgets compiled templates and makes simple_cache forget templates loaded from the repository.
+    Called when a fedoralink_ui.models.Template is saved.
+    """
+    with _compiled_templates_lock:
+        _compiled_templates.clear()
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, timeout=None)
+
+
 class FedoraTemplateCache:
 
     @staticmethod
@@ -120,9 +173,38 @@ class FedoraTemplateCache:
             return None
 
     @staticmethod
-    @simple_cache
+    def get_template(fedora_object, view_type, extends=None):
+        """
+        Returns the compiled template stored in the repository for the given object and view type. Compiled
+        templates are kept in memory, so the template is parsed only after it has been modified.
+
+        :param fedora_object:   the object (or its model) to be rendered
+        :param view_type:       'view', 'edit', 'create', 'search', 'search_row'
+        :param extends:         name of the template that the repository template extends, None if it does not
+        :return:                django.template.Template or None if there is no template in the repository
+        """
+        if not hasattr(fedora_object, '_meta'):
+            return None
+        # noinspection PyProtectedMember
+        rdf_types = fedora_object._meta.rdf_types
+        template = FedoraTemplateCache._get_template_internal(rdf_types, view_type)
+        if not template:
+            return None
+        template_id, last_modified, source = template
+        if extends:
+            source = "{% extends '" + extends + "' %}" + source
+        return _get_compiled_template((tuple(rdf_types), view_type, template_id, last_modified, extends), source)
+
+    @staticmethod
     def _get_template_string_internal(rdf_types, view_type):
-        return FedoraTemplateCache._load_template(FedoraTemplateCache.get_template_object(rdf_types, view_type))
+        template = FedoraTemplateCache._get_template_internal(rdf_types, view_type)
+        return template[2] if template else None
+
+    @staticmethod
+    @simple_cache
+    def _get_template_internal(rdf_types, view_type):
+        return FedoraTemplateCache._load_template_with_timestamp(
+            FedoraTemplateCache.get_template_object(rdf_types, view_type))
 
     @staticmethod
     def _load_template(template_object):
@@ -130,6 +212,17 @@ class FedoraTemplateCache:
             return template_object.get_bitstream().stream.read().decode("utf-8")
         return None
 
+    @staticmethod
+    def _load_template_with_timestamp(template_object):
+        """
+        :return: tuple (id of the template object, its last modification, source of the template) or None
+        """
+        source = FedoraTemplateCache._load_template(template_object)
+        if source is None:
+            return None
+        last_modified = template_object.metadata[FEDORA.lastModified]
+        return str(template_object.id), str(last_modified[0]) if last_modified else None, source
+
     @staticmethod
     def get_field_template_string(fedora_object, field_name):
         if hasattr(fedora_object, '_meta'):
@@ -142,8 +235,33 @@ class FedoraTemplateCache:
             return None
 
     @staticmethod
-    @simple_cache
+    def get_field_template(fedora_object, field_name):
+        """
+        Returns the compiled template stored in the repository for the field of the given object, see get_template
+
+        :return: django.template.Template or None if there is no template in the repository
+        """
+        if not hasattr(fedora_object, '_meta'):
+            return None
+        field_fedoralink_type = fullname(fedora_object._meta.fields_by_name[field_name].__class__)
+
+        # noinspection PyProtectedMember
+        rdf_types = fedora_object._meta.rdf_types
+        template = FedoraTemplateCache._get_field_template_internal(field_name, rdf_types, field_fedoralink_type)
+        if not template:
+            return None
+        template_id, last_modified, source = template
+        return _get_compiled_template((tuple(rdf_types), (field_name, field_fedoralink_type), template_id,
+                                       last_modified, None), source)
+
+    @staticmethod
     def _get_field_template_string_internal(field_name, rdf_types, field_fedoralink_type):
+        template = FedoraTemplateCache._get_field_template_internal(field_name, rdf_types, field_fedoralink_type)
+        return template[2] if template else None
+
+    @staticmethod
+    @simple_cache
+    def _get_field_template_internal(field_name, rdf_types, field_fedoralink_type):
         # print(locals())
         retrieved_type = FedoraTemplateCache.get_resource_type(rdf_types)
         query = FedoraTemplateCache.get_query(field_fedoralink_type, field_name, retrieved_type)
@@ -158,7 +276,7 @@ class FedoraTemplateCache:
             return -value
 
         retrieved_field_types.sort(key=sort_field_types)
-        return FedoraTemplateCache._load_template(retrieved_field_types[0].template_field_detail_view)
+        return FedoraTemplateCache._load_template_with_timestamp(retrieved_field_types[0].template_field_detail_view)
 
     @staticmethod
     def get_query(field_fedoralink_type, field_name, retrieved_type):
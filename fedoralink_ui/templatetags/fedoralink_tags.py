@@ -13,7 +13,6 @@ from django.conf import settings
 from django.core.signing import TimestampSigner
 from django.core.urlresolvers import reverse
 from django.template import Context
-from django.template import Template
 from django.template.loader import select_template, get_template
 from rdflib import Literal
 
@@ -225,7 +224,7 @@ def check_group(obj, user):
             parent_id = obj.fedora_parent_uri
             if parent_id:
                 try:
-                    obj = FedoraObject.objects.get(pk=parent_id)
+                    obj = FedoraObject.objects.fetch_child_metadata(False).get(pk=parent_id)
                 except:
                     # do not have rights
                     break
@@ -280,11 +279,9 @@ def fedora_user_classes(inst):
 def render_field_view(context, containing_object, meta_name):
     context = Context(context)
     context['field'] = containing_object._meta.fields_by_name[meta_name]
-    template = FedoraTemplateCache.get_field_template_string(containing_object, meta_name)
+    template = FedoraTemplateCache.get_field_template(containing_object, meta_name)
     if not template:
         template=get_template('fedoralink_ui/detail_field.html')
-    else:
-        template = Template(template)
     return template.render(context)
 
 
@@ -441,11 +438,11 @@ def render_search_row(context, item):
         template_name = context['item_template']
     else:
         template_name = 'fedoralink_ui/search_result_row.html'
-    template_from_fedora = FedoraTemplateCache.get_template_string(item, 'search_row')
+    template_from_fedora = FedoraTemplateCache.get_template(item, 'search_row')
     context = Context(context)
     context['item'] = item
     if template_from_fedora:
-        return Template(template_from_fedora).render(context)
+        return template_from_fedora.render(context)
     chosen_template = select_template([template_name])
     return chosen_template.template.render(context)
 
@@ -1,3 +1,59 @@
-from django.test import TestCase
+import django
+from rdflib import URIRef
 
-# Create your tests here.
+from unittest import TestCase, mock
+
+django.setup()
+
+from django.template import Context, Template as DjangoTemplate
+
+from fedoralink_ui.apps import invalidate_template_cache
+from fedoralink_ui.models import Template
+from fedoralink_ui.template_cache import FedoraTemplateCache, invalidate_templates
+
+
+class FedoraTemplateCacheTestCase(TestCase):
+
+    def setUp(self):
+        invalidate_templates()
+        # rdf types of models are usually lists
+        self.fedora_object = mock.Mock()
+        self.fedora_object._meta.rdf_types = [URIRef('http://example.com/Type')]
+        self.fedora_object._meta.fields_by_name = {'title': mock.Mock()}
+        template = ('http://localhost/templates/a', '2016-01-01T00:00:00Z', 'Hello {{ name }}')
+        for method in ('_get_template_internal', '_get_field_template_internal'):
+            patcher = mock.patch.object(FedoraTemplateCache, method, return_value=template)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_compiled_template_is_reused(self):
+        first = FedoraTemplateCache.get_template(self.fedora_object, 'view')
+        second = FedoraTemplateCache.get_template(self.fedora_object, 'view')
+        self.assertIs(first, second)
+        self.assertEqual(first.render(Context({'name': 'world'})), 'Hello world')
+        self.assertEqual(second.render(Context({'name': 'again'})), 'Hello again')
+
+    def test_saved_template_invalidates_cache(self):
+        first = FedoraTemplateCache.get_template(self.fedora_object, 'view')
+        # receiver of post_save
+        invalidate_template_cache(sender=Template, instance=mock.Mock(spec=Template), using='repository')
+        self.assertIsNot(FedoraTemplateCache.get_template(self.fedora_object, 'view'), first)
+
+    def test_other_template_object_is_compiled(self):
+        first = FedoraTemplateCache.get_template(self.fedora_object, 'view')
+        # a different template with the same modification time, e.g. the resource type now points to it
+        FedoraTemplateCache._get_template_internal.return_value = \
+            ('http://localhost/templates/b', '2016-01-01T00:00:00Z', 'Bye {{ name }}')
+        second = FedoraTemplateCache.get_template(self.fedora_object, 'view')
+        self.assertIsNot(first, second)
+        self.assertEqual(second.render(Context({'name': 'world'})), 'Bye world')
+
+    def test_compiled_field_template_is_reused(self):
+        with mock.patch('fedoralink_ui.template_cache.Template', wraps=DjangoTemplate) as compile_template:
+            first = FedoraTemplateCache.get_field_template(self.fedora_object, 'title')
+            second = FedoraTemplateCache.get_field_template(self.fedora_object, 'title')
+        self.assertIs(first, second)
+        self.assertEqual(compile_template.call_count, 1)
+        self.assertEqual(first.render(Context({'name': 'world'})), 'Hello world')
+        # field templates do not share the cache with view templates
+        self.assertIsNot(FedoraTemplateCache.get_template(self.fedora_object, 'view'), first)
@@ -2,14 +2,13 @@ import traceback
 
 import django
 from django.conf import settings
-from django.core.paginator import Paginator, PageNotAnInteger, EmptyPage
+from django.core.paginator import PageNotAnInteger, EmptyPage
 from django.core.urlresolvers import resolve
 from django.core.urlresolvers import reverse
 from django.db.models import Q
-from django.http import FileResponse
 from django.http import HttpResponseRedirect, Http404, HttpResponse
 from django.shortcuts import render
-from django.template import Template, RequestContext
+from django.template import RequestContext
 from django.template.loader import get_template
 from django.template.response import TemplateResponse
 from django.utils.decorators import classonlymethod
@@ -19,10 +18,12 @@ from django.views.generic import View, CreateView, DetailView, UpdateView
 
 from fedoralink.authentication.Credentials import Credentials
 from fedoralink.authentication.as_user import as_user
+from fedoralink.download import bitstream_response
 from fedoralink.fedorans import FEDORA
 from fedoralink.forms import FedoraForm
 from fedoralink.indexer.models import IndexableFedoraObject
 from fedoralink.models import FedoraObject
+from fedoralink.paginator import FedoraPaginator
 from fedoralink.type_manager import FedoraTypeManager
 from fedoralink_ui.template_cache import FedoraTemplateCache
 from fedoralink_ui.templatetags.fedoralink_tags import id_from_path, rdf2lang
@@ -44,7 +45,8 @@ def get_model(collection_id, fedora_prefix = None):
             collection_id = fedora_prefix + '/' + collection_id
         else:
             collection_id = fedora_prefix
-    model = FedoraTemplateCache.get_collection_model(FedoraObject.objects.get(pk=collection_id))
+    model = FedoraTemplateCache.get_collection_model(
+        FedoraObject.objects.fetch_child_metadata(False).get(pk=collection_id))
     if model is None:
         return None
     model = FedoraTypeManager.get_model_class_from_fullname(model)
@@ -62,7 +64,8 @@ def get_model_from_object(obj):
 def get_subcollection_model(collection_id, fedora_prefix = None):
     if fedora_prefix:
         collection_id = fedora_prefix + '/' + collection_id
-    model = FedoraTemplateCache.get_subcollection_model(FedoraObject.objects.get(pk=collection_id))
+    model = FedoraTemplateCache.get_subcollection_model(
+        FedoraObject.objects.fetch_child_metadata(False).get(pk=collection_id))
     if model is None:
         return None
     model = FedoraTypeManager.get_model_class_from_fullname(model)
@@ -149,7 +152,7 @@ class GenericSearchView(View):
 
         within_collection = None
         if 'path' in kwargs:
-            within_collection = FedoraObject.objects.get(pk=kwargs['path'])
+            within_collection = FedoraObject.objects.fetch_child_metadata(False).get(pk=kwargs['path'])
 
         requested_facet_ids = [x[0] for x in requested_facets]
 
@@ -204,7 +207,7 @@ class GenericSearchView(View):
             sort = ''
 
         page = request.GET.get('page', )
-        paginator = Paginator(data, 10)
+        paginator = FedoraPaginator(data, 10)
 
         try:
             page = paginator.page(page)
@@ -311,17 +314,12 @@ class GenericDetailView(DetailView):
         self.object = self.get_object()
 
         if (FEDORA.Binary in self.object.types):
-            bitstream = self.object.get_bitstream()
-            resp = FileResponse(bitstream.stream, content_type=bitstream.mimetype)
-            resp['Content-Disposition'] = 'inline; filename="%s"' % bitstream.filename
-            return resp
+            return bitstream_response(request, self.object)
         # noinspection PyTypeChecker
-        template = FedoraTemplateCache.get_template_string(self.object, view_type='view')
+        template = FedoraTemplateCache.get_template(self.object, view_type='view', extends=self.template_name)
         if template:
             context = self.get_context_data(object=self.object)
-            return HttpResponse(
-                Template("{% extends '" + self.template_name + "' %}" + template).render(
-                    RequestContext(request, context)))
+            return HttpResponse(template.render(RequestContext(request, context)))
         return super(GenericDetailView, self).get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
@@ -415,12 +413,10 @@ class GenericCreateView(CreateView):
         passed to the constructor of the response class.
         """
         model = get_model(self.kwargs.get('id'), fedora_prefix=self.fedora_prefix)
-        template = FedoraTemplateCache.get_template_string(self.object if self.object else model,
-                                                           view_type='create')
+        template = FedoraTemplateCache.get_template(self.object if self.object else model,
+                                                    view_type='create', extends=self.template_name)
         if template:
-            return HttpResponse(
-                Template("{% extends '" + self.template_name + "' %}" + template).render(
-                    RequestContext(self.request, context)))
+            return HttpResponse(template.render(RequestContext(self.request, context)))
         return super().render_to_response(context, **response_kwargs)
 
     def get_success_url(self):
@@ -507,12 +503,10 @@ class GenericSubcollectionCreateView(CreateView):
         passed to the constructor of the response class.
         """
         model = get_subcollection_model(self.kwargs.get('id'), fedora_prefix=self.fedora_prefix)
-        template = FedoraTemplateCache.get_template_string(self.object if self.object else model,
-                                                           view_type='create')
+        template = FedoraTemplateCache.get_template(self.object if self.object else model,
+                                                    view_type='create', extends=self.template_name)
         if template:
-            return HttpResponse(
-                Template("{% extends '" + self.template_name + "' %}" + template).render(
-                    RequestContext(self.request, context)))
+            return HttpResponse(template.render(RequestContext(self.request, context)))
         return super().render_to_response(context, **response_kwargs)
 
     def get_success_url(self):
@@ -569,12 +563,10 @@ class GenericEditView(UpdateView):
         # print("media", form.media)
         context = self.get_context_data(object=self.object, form=form, **response_kwargs)
         # noinspection PyTypeChecker
-        template = FedoraTemplateCache.get_template_string(self.object, view_type='edit')
+        template = FedoraTemplateCache.get_template(self.object, view_type='edit', extends=self.template_name)
 
         if template:
-            return HttpResponse(
-                Template("{% extends '" + self.template_name + "' %}" + template).render(
-                    RequestContext(self.request, context)))
+            return HttpResponse(template.render(RequestContext(self.request, context)))
         return super().render_to_response(context, **response_kwargs)
 
     def get_success_url(self):
@@ -593,7 +585,7 @@ def link_choose(request, model_name):
     data = model.objects.all()
 
     page = request.GET.get('page', )
-    paginator = Paginator(data, 10)
+    paginator = FedoraPaginator(data, 10)
 
     try:
         page = paginator.page(page)